@@ -0,0 +1,74 @@
+"""
+并发预览基准测试
+对比旧的阻塞式轮询（requests + time.sleep）与异步 MeshyClient 在同一事件循环上
+处理 N 个并发预览任务的总耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_async_client -n 20 --task-duration 2
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from benchmarks.fake_meshy import FakeMeshyServer
+from meshy_client import MeshyClient
+
+
+def blocking_preview(base_url: str, prompt: str, check_interval: float) -> dict:
+    """旧实现：同步请求 + time.sleep 轮询"""
+    url = f"{base_url}/openapi/v2/text-to-3d"
+    task_id = requests.post(url, json={"mode": "preview", "prompt": prompt}).json()["result"]
+    while True:
+        info = requests.get(f"{url}/{task_id}").json()
+        if info["status"] == "SUCCEEDED":
+            return info
+        time.sleep(check_interval)
+
+
+async def run_blocking(base_url: str, n: int, check_interval: float) -> float:
+    """在 async 处理函数中直接调用阻塞客户端（与旧版 main.py 行为一致）"""
+    async def handler(i):
+        return blocking_preview(base_url, f"prompt {i}", check_interval)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+async def run_async(base_url: str, n: int, check_interval: float) -> float:
+    client = MeshyClient(api_key="bench", base_url=base_url,
+                         poll_min_interval=check_interval, poll_max_interval=check_interval)
+
+    async def handler(i):
+        response = await client.create_preview_task(prompt=f"prompt {i}")
+        return await client.wait_for_task_completion(response["result"])
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(handler(i) for i in range(n)))
+    finally:
+        await client.aclose()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发预览基准测试")
+    parser.add_argument("-n", "--concurrency", type=int, default=10)
+    parser.add_argument("--task-duration", type=float, default=2.0)
+    parser.add_argument("--check-interval", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeMeshyServer(port=args.port, task_duration=args.task_duration) as server:
+        blocking = asyncio.run(run_blocking(server.base_url, args.concurrency, args.check_interval))
+        non_blocking = asyncio.run(run_async(server.base_url, args.concurrency, args.check_interval))
+
+    print(f"并发数: {args.concurrency}, 单任务耗时: {args.task_duration}s")
+    print(f"阻塞客户端: {blocking:.2f}s ({blocking / args.task_duration:.1f}x 单任务耗时)")
+    print(f"异步客户端: {non_blocking:.2f}s ({non_blocking / args.task_duration:.1f}x 单任务耗时)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+分层缓存基准测试
+测量各层命中时单次查找的延迟（进程内LRU / Redis / SQLite / 全部未命中），
+工作集大于进程内容量时的各层命中分布与淘汰次数，以及清理大量过期记录的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_cache --entries 100000 --lookups 20000
+    python -m benchmarks.bench_cache --redis-url redis://localhost:6379/15   # 同时测量Redis层
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import database
+from cache import TieredCache
+from redis_pool import RedisPool
+
+
+async def connect_redis(url: str) -> Optional[RedisPool]:
+    if not url:
+        return None
+    parsed = urlparse(url)
+    pool = RedisPool(host=parsed.hostname, port=parsed.port or 6379,
+                     db=int(parsed.path.strip("/") or 0), password=parsed.password)
+    await pool.start()
+    if not pool.available:
+        print(f"Redis不可用（{pool.stats['last_error']}），跳过Redis层")
+        await pool.close()
+        return None
+    return pool
+
+
+async def latency(fn, keys, samples: int) -> tuple:
+    """返回 (p50 us, p99 us)"""
+    timings = []
+    for i in range(samples):
+        key = keys[i % len(keys)]
+        started = time.perf_counter()
+        await fn(key)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+def populate_db(entries: int, expires_at: float):
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    conn.executemany(
+        'INSERT INTO model_cache (cache_key, model_data, expires_at) VALUES (?, ?, ?)',
+        ((f"model_cache:{i}", '{"task_id": "%d"}' % i, expires_at) for i in range(entries))
+    )
+    conn.commit()
+    conn.close()
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="bench_cache_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    redis_pool = await connect_redis(args.redis_url)
+    try:
+        database.init_database()
+        populate_db(args.entries, time.time() + 3600)
+        keys = [f"model_cache:{i}" for i in range(args.entries)]
+        random.seed(42)
+
+        print(f"{'层':<22} {'p50':>9} {'p99':>9}")
+        hot = keys[:args.max_size]
+        cache = TieredCache(redis_pool, max_size=args.max_size)
+        for key in hot:
+            await cache.get(key)
+        p50, p99 = await latency(cache.get, hot, args.lookups)
+        print(f"{'进程内LRU命中':<20} {p50:>7.1f}us {p99:>7.1f}us")
+
+        if redis_pool is not None:
+            for key in keys[:args.lookups]:
+                await cache.get(key)  # SQLite命中后回填Redis
+            redis_only = TieredCache(redis_pool, max_size=0)
+            p50, p99 = await latency(redis_only.get, keys[:args.lookups], args.lookups)
+            print(f"{'Redis命中':<20} {p50:>7.1f}us {p99:>7.1f}us")
+
+        sqlite_only = TieredCache(None, max_size=0)
+        cold = random.sample(keys, min(args.lookups, len(keys)))
+        p50, p99 = await latency(sqlite_only.get, cold, args.lookups)
+        print(f"{'SQLite命中':<20} {p50:>7.1f}us {p99:>7.1f}us")
+
+        missing = [f"model_cache:missing_{i}" for i in range(args.lookups)]
+        p50, p99 = await latency(cache.get, missing, args.lookups)
+        print(f"{'全部未命中':<20} {p50:>7.1f}us {p99:>7.1f}us")
+
+        # Zipf 分布的访问：热点条目留在进程内，长尾落到下层
+        cache = TieredCache(redis_pool, max_size=args.max_size)
+        weights = [1 / (rank + 1) for rank in range(len(keys))]
+        for key in random.choices(keys, weights, k=args.lookups * 5):
+            await cache.get(key)
+        print(f"Zipf访问 {args.lookups * 5} 次: {cache.get_stats()}")
+
+        # 清理过期记录
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        conn.execute('UPDATE model_cache SET expires_at = ?', (time.time() - 1,))
+        conn.commit()
+        conn.close()
+        started = time.perf_counter()
+        deleted = TieredCache(None).sweep()
+        print(f"清理 {deleted} 条过期记录耗时 {time.perf_counter() - started:.2f}s")
+        started = time.perf_counter()
+        TieredCache(None).sweep()
+        print(f"无过期记录时的清理耗时 {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        if redis_pool is not None:
+            await redis_pool.run(lambda client: client.delete(*keys[:args.lookups]))
+            await redis_pool.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分层缓存基准测试")
+    parser.add_argument("--entries", type=int, default=100000, help="SQLite中的缓存条目数")
+    parser.add_argument("--lookups", type=int, default=20000, help="每项测量的查找次数")
+    parser.add_argument("--max-size", type=int, default=1000, help="进程内LRU容量")
+    parser.add_argument("--redis-url", default="", help="用于测量Redis层的Redis地址（会写入测试键）")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+按需格式转换基准测试
+对比两种入库方式（模拟Meshy服务按真实大小提供各格式文件，单连接限速 --bandwidth-mb）：
+- 立即下载：旧实现，模型文件和 glb/fbx/obj/mtl/usdz 全部格式在生成时并行下载
+- 按需转换：只下载GLB，obj/stl/ply 在第一次请求时从GLB转换
+统计入库耗时和磁盘占用，以及按需转换的首次请求耗时、缓存命中耗时和并发请求的合并情况。
+glb/obj/mtl 的大小取自对模型的实际转换；trimesh 无法生成 fbx/usdz，
+按GLB大小乘以 --fbx-ratio / --usdz-ratio 估算（默认值来自 storage/models 中Meshy返回的文件）
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_conversion
+    python -m benchmarks.bench_conversion storage/models/model_xxx.glb --bandwidth-mb 5 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+# 在导入项目模块之前指向临时存储目录，避免写入实际的数据库和文件
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="bench_conversion_")
+
+import blob_store  # noqa: E402
+import database  # noqa: E402
+import file_manager  # noqa: E402
+from benchmarks.bench_glb_optimize import collect  # noqa: E402
+from benchmarks.bench_lod import make_model  # noqa: E402
+from benchmarks.fake_meshy import FakeMeshyProcess  # noqa: E402
+from format_converter import CONVERSION_FORMATS, convert_model, format_converter  # noqa: E402
+from http_transport import http_transport  # noqa: E402
+from process_pool import shutdown_process_pool  # noqa: E402
+
+EAGER_FORMATS = ["glb", "fbx", "obj", "mtl", "usdz"]
+
+
+def format_sizes(path: str, workdir: str, fbx_ratio: float, usdz_ratio: float) -> dict:
+    """Meshy 各格式文件的大小：glb/obj/mtl 实际转换得到，fbx/usdz 按比例估算"""
+    import zipfile
+
+    archive = os.path.join(workdir, "sizes.obj.zip")
+    convert_model(path, archive, "obj")
+    with zipfile.ZipFile(archive) as f:
+        members = {info.filename: info.file_size for info in f.infolist()}
+    os.remove(archive)
+    glb = os.path.getsize(path)
+    return {
+        "glb": glb,
+        "fbx": int(glb * fbx_ratio),
+        "obj": members.get("model.obj", 0),
+        "mtl": members.get("material.mtl", 0),
+        "usdz": int(glb * usdz_ratio),
+    }
+
+
+def footprint(local_paths) -> int:
+    """逻辑路径实际占用的磁盘字节数（内容相同的文件只计一次）"""
+    blobs = {file_manager.get_physical_path(path) for path in local_paths if path}
+    return sum(os.path.getsize(blob) for blob in blobs if blob)
+
+
+async def ingest(base_url: str, sizes: dict, model_id: str, eager: bool) -> tuple:
+    """按生成流程下载文件，返回 (耗时, 磁盘占用)"""
+    urls = {name: f"{base_url}/assets/{model_id}.{name}?size={size}" for name, size in sizes.items()}
+    started = time.perf_counter()
+    downloads = [file_manager.download_model_file(urls["glb"], model_id)]
+    if eager:
+        downloads.append(file_manager.download_all_formats(urls, model_id))
+    results = await asyncio.gather(*downloads)
+    elapsed = time.perf_counter() - started
+    paths = [results[0]] + (list(results[1].values()) if eager else [])
+    return elapsed, footprint(paths)
+
+
+async def convert_requests(path: str, model_id: str, concurrency: int) -> dict:
+    """把真实模型存入存储后按需转换各格式，返回首次、缓存命中耗时和合并统计"""
+    staging = os.path.join(file_manager.STAGING_DIR, f"{model_id}.glb")
+    shutil.copy(path, staging)
+    source = await asyncio.to_thread(blob_store.ingest_file, staging, f"models/{model_id}.glb")
+    result = {}
+    for file_format in CONVERSION_FORMATS:
+        before = dict(format_converter.flight.stats)
+        started = time.perf_counter()
+        outputs = await asyncio.gather(*(format_converter.get(source, file_format) for _ in range(concurrency)))
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        await format_converter.get(source, file_format)
+        cached = time.perf_counter() - started
+        result[file_format] = {
+            "first": first,
+            "cached": cached,
+            "bytes": os.path.getsize(outputs[0]),
+            "conversions": format_converter.flight.stats["leaders"] - before["leaders"],
+        }
+    return result
+
+
+async def run(files: list, args, workdir: str):
+    bandwidth = args.bandwidth_mb * 1024 * 1024 if args.bandwidth_mb else None
+    totals = {"eager_seconds": 0.0, "eager_bytes": 0, "lazy_seconds": 0.0, "lazy_bytes": 0, "converted_bytes": 0}
+    with FakeMeshyProcess(port=args.port, bandwidth=bandwidth) as server:
+        print(f"{'模型':<24} {'立即下载':>18} {'只下载GLB':>18} "
+              + " ".join(f"{name + ' 首次/缓存':>20}" for name in CONVERSION_FORMATS))
+        for index, path in enumerate(files):
+            sizes = format_sizes(path, workdir, args.fbx_ratio, args.usdz_ratio)
+            eager_seconds, eager_bytes = await ingest(server.base_url, sizes, f"eager{index}", eager=True)
+            lazy_seconds, lazy_bytes = await ingest(server.base_url, sizes, f"lazy{index}", eager=False)
+            conversions = await convert_requests(path, f"convert{index}", args.concurrency)
+
+            totals["eager_seconds"] += eager_seconds
+            totals["eager_bytes"] += eager_bytes
+            totals["lazy_seconds"] += lazy_seconds
+            totals["lazy_bytes"] += lazy_bytes
+            totals["converted_bytes"] += sum(item["bytes"] for item in conversions.values())
+            print(f"{os.path.basename(path)[:24]:<24} "
+                  f"{eager_seconds:>6.2f}s {eager_bytes / 1e6:>8.2f}MB {lazy_seconds:>6.2f}s {lazy_bytes / 1e6:>8.2f}MB "
+                  + " ".join(f"{item['first'] * 1000:>9.0f}/{item['cached'] * 1000:.1f}ms"
+                             + ("" if item["conversions"] == 1 else f"(x{item['conversions']})")
+                             for item in conversions.values()))
+    await http_transport.aclose()
+
+    print(f"\n入库耗时: 立即下载 {totals['eager_seconds']:.2f}s，只下载GLB {totals['lazy_seconds']:.2f}s"
+          f"（{1 - totals['lazy_seconds'] / totals['eager_seconds']:.0%} 更快）")
+    print(f"磁盘占用: 立即下载 {totals['eager_bytes'] / 1e6:.2f}MB，只下载GLB {totals['lazy_bytes'] / 1e6:.2f}MB"
+          f"（{totals['lazy_bytes'] / totals['eager_bytes']:.0%}）；"
+          f"三种格式都被请求过后另有 {totals['converted_bytes'] / 1e6:.2f}MB 转换缓存（受 CONVERTED_STORAGE_QUOTA 限制）")
+    stats = format_converter.flight.stats
+    print(f"并发请求: 每种格式 {args.concurrency} 个同时到达的首次请求，"
+          f"共转换 {stats['leaders']} 次，合并 {stats['coalesced']} 个请求")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按需格式转换基准测试")
+    parser.add_argument("paths", nargs="*", help="GLB文件或目录（默认生成合成模型）")
+    parser.add_argument("--synthetic", default="5,6", help="合成模型的细分级数")
+    parser.add_argument("--texture", type=int, default=1024, help="合成模型的纹理边长")
+    parser.add_argument("--bandwidth-mb", type=float, default=20.0, help="单连接带宽上限（MB/s），0 表示不限速")
+    parser.add_argument("--fbx-ratio", type=float, default=4.7, help="FBX 相对GLB的大小")
+    parser.add_argument("--usdz-ratio", type=float, default=1.0, help="USDZ 相对GLB的大小")
+    parser.add_argument("--concurrency", type=int, default=8, help="同一转换同时到达的请求数")
+    parser.add_argument("--port", type=int, default=8773)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_conversion_models_")
+    try:
+        database.init_database()
+        file_manager.init_storage()
+        files = collect(args.paths) if args.paths else [
+            make_model(os.path.join(workdir, f"synthetic_{level}.glb"), level, args.texture, seed=level)
+            for level in (int(x) for x in args.synthetic.split(","))]
+        asyncio.run(run(files, args, workdir))
+    finally:
+        shutdown_process_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(os.environ["STORAGE_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
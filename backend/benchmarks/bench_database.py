@@ -0,0 +1,164 @@
+"""
+SQLite并发写入基准测试
+50个写线程同时写入历史记录，另有读线程持续读取缓存和历史记录，
+对比旧实现（每次操作新建连接、回滚日志模式）与连接复用 + WAL + 批量提交的写入吞吐、
+失败次数（database is locked）和读延迟
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_database --writers 50 --writes 200 --readers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import database
+
+
+def legacy_save_history(record: dict) -> bool:
+    """旧实现：每次写入新建连接，默认回滚日志模式"""
+    try:
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO model_history
+            (id, input_type, input_content, stage, model_url, preview_url,
+             download_urls, quality_score, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (record['id'], record['input_type'], record['input_content'], record['stage'],
+              record['model_url'], record['preview_url'], json.dumps(record['download_urls']),
+              record['quality_score'], datetime.now().isoformat()))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception:
+        return False
+
+
+def legacy_get_cache(cache_key: str):
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT model_data FROM model_cache WHERE cache_key = ?', (cache_key,))
+    row = cursor.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def legacy_get_history(limit: int):
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM model_history ORDER BY created_at DESC LIMIT ?', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def make_record(writer: int, index: int) -> dict:
+    return {
+        'id': uuid.uuid4().hex,
+        'input_type': 'text',
+        'input_content': f'writer {writer} prompt {index}',
+        'stage': 'preview',
+        'model_url': f'/api/files/models/model_{writer}_{index}.glb',
+        'preview_url': f'/api/files/previews/preview_{writer}_{index}.png',
+        'download_urls': {'glb': f'/api/files/models/model_{writer}_{index}.glb'},
+        'quality_score': 0.8,
+    }
+
+
+def run(mode: str, writers: int, writes: int, readers: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_db_{mode}_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    database.init_database()
+    if mode == "legacy":
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+    for i in range(100):
+        database.save_to_cache_db(f"key_{i}", {"task_id": i})
+
+    save = legacy_save_history if mode == "legacy" else database.save_model_to_history
+    get_cache = legacy_get_cache if mode == "legacy" else database.get_from_cache_db
+    get_history = legacy_get_history if mode == "legacy" else database.get_model_history
+
+    failures = [0]
+    lock = threading.Lock()
+    read_latencies = []
+    stop = threading.Event()
+
+    def writer(n: int):
+        for i in range(writes):
+            if not save(make_record(n, i)):
+                with lock:
+                    failures[0] += 1
+
+    def reader(n: int):
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    get_cache(f"key_{i % 100}")
+                else:
+                    get_history(20)
+            except Exception:
+                with lock:
+                    failures[0] += 1
+            read_latencies.append(time.perf_counter() - started)
+            i += 1
+
+    reader_threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in reader_threads:
+        t.start()
+    started = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in reader_threads:
+        t.join()
+
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    stored = conn.execute('SELECT COUNT(*) FROM model_history').fetchone()[0]
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    read_latencies.sort()
+    return {
+        "mode": mode,
+        "elapsed_s": round(elapsed, 2),
+        "inserts_per_s": round(stored / elapsed),
+        "stored": stored,
+        "failures": failures[0],
+        "reads": len(read_latencies),
+        "read_p50_ms": round(statistics.median(read_latencies) * 1000, 2),
+        "read_p99_ms": round(read_latencies[int(len(read_latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite并发写入基准测试")
+    parser.add_argument("--writers", type=int, default=50, help="并发写线程数")
+    parser.add_argument("--writes", type=int, default=200, help="每个写线程的写入次数")
+    parser.add_argument("--readers", type=int, default=4, help="并发读线程数")
+    args = parser.parse_args()
+
+    print(f"{args.writers} 个写线程 x {args.writes} 次写入，{args.readers} 个读线程")
+    for mode in ("legacy", "pooled"):
+        result = run(mode, args.writers, args.writes, args.readers)
+        print(json.dumps(result, ensure_ascii=False))
+    print(f"写线程统计: {database.get_writer_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+模型文件下载基准测试
+对比旧实现（逐个格式顺序下载、8 KiB 块）与并行流式下载器
+下载一组大小不同的多格式文件所需时间
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_downloader --sizes-mb 300,200,100,50,1 --bandwidth-mb 50 --drop-rate 0.2
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import requests
+
+import database
+import file_manager
+from benchmarks.fake_meshy import FakeMeshyProcess
+from http_transport import http_transport
+
+FORMATS = ["glb", "fbx", "obj", "usdz", "mtl"]
+
+
+def sequential_download(download_urls: dict, target_dir: str) -> dict:
+    """旧实现：requests 顺序下载，8 KiB 块，直接写入目标文件"""
+    local_paths = {}
+    for format_name, url in download_urls.items():
+        local_path = os.path.join(target_dir, f"{format_name}_seq.{format_name}")
+        try:
+            response = requests.get(url, stream=True, timeout=30)
+            response.raise_for_status()
+            with open(local_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+            local_paths[format_name] = local_path
+        except Exception as e:
+            print(f"  顺序下载失败 {format_name}: {e}（残留文件 {os.path.getsize(local_path)} 字节）")
+    return local_paths
+
+
+async def parallel_download(download_urls: dict, target_dir: str) -> dict:
+    file_manager.MODELS_DIR = target_dir
+    try:
+        return await file_manager.download_all_formats(download_urls, "bench")
+    finally:
+        await http_transport.aclose()
+
+
+def check(local_paths: dict, sizes: dict) -> str:
+    complete = sum(1 for f, p in local_paths.items() if os.path.getsize(p) == sizes[f])
+    return f"完整文件 {complete}/{len(sizes)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型文件下载基准测试")
+    parser.add_argument("--sizes-mb", default="300,200,100,50,1", help="各格式文件大小（MB），逗号分隔")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="下载中途断开的概率")
+    parser.add_argument("--bandwidth-mb", type=float, default=50.0, help="单连接带宽上限（MB/s），0 表示不限速")
+    parser.add_argument("--port", type=int, default=8771)
+    args = parser.parse_args()
+
+    sizes_mb = [float(x) for x in args.sizes_mb.split(",")]
+    sizes = {fmt: int(mb * 1024 * 1024) for fmt, mb in zip(FORMATS, sizes_mb)}
+
+    bandwidth = args.bandwidth_mb * 1024 * 1024 if args.bandwidth_mb else None
+    database.init_database()
+    file_manager.init_storage()
+    with FakeMeshyProcess(port=args.port, drop_rate=args.drop_rate, bandwidth=bandwidth) as server:
+        download_urls = {
+            fmt: f"{server.base_url}/assets/bench.{fmt}?size={size}" for fmt, size in sizes.items()
+        }
+        total_mb = sum(sizes.values()) / 1024 / 1024
+        for label, runner in (("顺序下载", "sequential"), ("并行下载", "parallel")):
+            target_dir = tempfile.mkdtemp(prefix="bench_dl_")
+            try:
+                start = time.perf_counter()
+                if runner == "sequential":
+                    local_paths = sequential_download(download_urls, target_dir)
+                else:
+                    local_paths = asyncio.run(parallel_download(download_urls, target_dir))
+                elapsed = time.perf_counter() - start
+                print(f"[{label}] {total_mb:.0f} MB 用时 {elapsed:.2f}s "
+                      f"({total_mb / elapsed:.0f} MB/s), {check(local_paths, sizes)}")
+            finally:
+                shutil.rmtree(target_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
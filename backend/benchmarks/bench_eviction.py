@@ -0,0 +1,135 @@
+"""
+存储淘汰压力测试
+生成大量合成文件及其引用记录（部分被历史记录引用或固定），设置为总量一半的配额，
+测量每轮淘汰耗时和淘汰到配额以下的总耗时，并与旧版 cleanup_old_files
+式的全目录扫描（listdir + getmtime）对比
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_eviction --files 100000 --batch 1000
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import blob_store
+import database
+from storage_manager import StorageManager
+
+
+def populate(count: int, history_ratio: float, pinned_ratio: float) -> int:
+    """写入合成文件和引用记录，返回引用总大小（记录的大小为模拟值，磁盘上只写入少量字节）"""
+    now = time.time()
+    rows, blobs = [], []
+    total = 0
+    for i in range(count):
+        sha256 = hashlib.sha256(str(i).encode()).hexdigest()
+        size = random.randint(1024, 4 * 1024 * 1024)
+        category = 'models' if i % 4 else 'previews'
+        roll = random.random()
+        rows.append((
+            f"{category}/asset_{i}.glb", sha256, category, size,
+            now - random.uniform(0, 30 * 86400), random.randint(0, 50),
+            int(roll < pinned_ratio), int(roll >= 1 - history_ratio)
+        ))
+        blobs.append((sha256, size))
+        total += size
+
+        path = blob_store.blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(sha256.encode())
+
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    conn.executemany('INSERT INTO asset_blobs (sha256, size, refcount) VALUES (?, ?, 1)', blobs)
+    conn.executemany('''
+        INSERT INTO asset_refs (ref, sha256, category, size, last_access, hits, pinned, in_history)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return total
+
+
+def legacy_scan(root: str) -> float:
+    """旧实现的做法：遍历目录并逐个读取修改时间（不删除），返回耗时"""
+    started = time.perf_counter()
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            os.path.getmtime(os.path.join(directory, filename))
+    return time.perf_counter() - started
+
+
+def count_protected_lost(count: int) -> int:
+    """检查是否有固定或被历史记录引用的文件被淘汰（应为0）"""
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    kept = conn.execute(
+        'SELECT COUNT(*) FROM asset_refs WHERE pinned = 1 OR in_history = 1'
+    ).fetchone()[0]
+    conn.close()
+    return count - kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存储淘汰压力测试")
+    parser.add_argument("--files", type=int, default=100000, help="合成文件数")
+    parser.add_argument("--batch", type=int, default=1000, help="每轮最多淘汰的文件数")
+    parser.add_argument("--policy", default="lru", choices=["lru", "lfu"])
+    parser.add_argument("--history-ratio", type=float, default=0.1, help="被历史记录引用的比例")
+    parser.add_argument("--pinned-ratio", type=float, default=0.01, help="固定文件的比例")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_eviction_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    blob_store.BLOBS_DIR = os.path.join(workdir, "blobs")
+    try:
+        database.init_database()
+        random.seed(42)
+        started = time.perf_counter()
+        total = populate(args.files, args.history_ratio, args.pinned_ratio)
+        print(f"生成 {args.files} 个文件，共 {total / 2**30:.1f} GiB（模拟大小），耗时 {time.perf_counter() - started:.1f}s")
+
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        protected = conn.execute(
+            'SELECT COUNT(*) FROM asset_refs WHERE pinned = 1 OR in_history = 1'
+        ).fetchone()[0]
+        conn.close()
+
+        print(f"旧版全目录扫描: {legacy_scan(blob_store.BLOBS_DIR) * 1000:.0f} ms")
+
+        usage = database.get_storage_usage()
+        quotas = {category: info['bytes'] // 2 for category, info in usage.items()}
+        manager = StorageManager(quotas=quotas, policy=args.policy, batch_size=args.batch)
+
+        pass_times = []
+        started = time.perf_counter()
+        while True:
+            pass_started = time.perf_counter()
+            pending = manager.run_pass()
+            pass_times.append(time.perf_counter() - pass_started)
+            if not pending:
+                break
+        elapsed = time.perf_counter() - started
+
+        usage = database.get_storage_usage()
+        print(f"淘汰轮数: {len(pass_times)}，淘汰文件: {manager.stats['evicted_refs']}，"
+              f"释放: {manager.stats['freed_bytes'] / 2**30:.1f} GiB")
+        print(f"每轮耗时: 中位数 {statistics.median(pass_times) * 1000:.1f} ms，"
+              f"最大 {max(pass_times) * 1000:.1f} ms；总耗时 {elapsed:.2f}s")
+        idle_started = time.perf_counter()
+        manager.run_pass()
+        print(f"已达标时单轮检查耗时: {(time.perf_counter() - idle_started) * 1000:.2f} ms")
+        for category, quota in quotas.items():
+            print(f"  {category}: {usage[category]['bytes'] / 2**30:.2f} / {quota / 2**30:.2f} GiB")
+        print(f"被淘汰的受保护文件: {count_protected_lost(protected)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
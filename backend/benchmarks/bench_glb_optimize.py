@@ -0,0 +1,183 @@
+"""
+GLB传输优化效果测试
+对一组GLB（默认取 STORAGE_DIR 中已存储的模型，不含LOD和优化版本；也可指定文件或目录，
+都没有时生成带纹理的合成模型）执行 optimize_glb，逐个统计：
+- 大小：原始、原始gzip（通用gzip中间件的效果）、优化后、优化后gzip
+- 优化耗时（服务端，每个模型只执行一次）
+- 客户端解码耗时：gzip解压 + 解析GLB并读出所有顶点属性和索引（量化数据在CPU上反量化为浮点数，
+  是最坏情况；WebGL可直接使用量化数据，无需此步骤）
+- 按 --bandwidth-mbps 估算的传输 + 解码总耗时
+- 顶点缓存命中：32项FIFO缓存的平均每个三角形未命中次数（ACMR，越低越好）
+- 量化引起的总表面积相对变化
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_glb_optimize
+    python -m benchmarks.bench_glb_optimize storage/some_models/ --bandwidth-mbps 50
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.bench_lod import make_model
+from blob_store import blob_path
+from database import DATABASE_PATH
+from file_manager import MODELS_DIR
+from glb_optimizer import optimize_glb, read_accessor, read_glb
+
+CACHE_SIZE = 32
+ACMR_MAX_INDICES = 300_000
+
+
+def stored_models() -> List[str]:
+    """已存储的原始GLB模型（内容寻址存储中的和旧版直接存放在 models 目录中的，跳过LOD和优化版本）"""
+    rows = []
+    if os.path.exists(DATABASE_PATH):
+        conn = sqlite3.connect(f"file:{DATABASE_PATH}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT ref, sha256 FROM asset_refs WHERE ref LIKE 'models/%.glb'").fetchall()
+        except sqlite3.OperationalError:  # 尚未初始化内容寻址存储的旧数据库
+            pass
+        finally:
+            conn.close()
+    paths = collect([MODELS_DIR]) if os.path.isdir(MODELS_DIR) else []
+    for ref, sha256 in rows:
+        if '.lod' in ref or ref.endswith('.opt.glb'):
+            continue
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def collect(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.endswith('.glb') and '.lod' not in name and not name.endswith('.opt.glb'))
+        else:
+            files.append(path)
+    return files
+
+
+def decode(content: bytes, compressed: bool) -> tuple:
+    """模拟客户端：解压、解析GLB并读出所有图元数据，返回 (耗时, 各图元的世界空间位置和索引)"""
+    started = time.perf_counter()
+    if compressed:
+        content = gzip.decompress(content)
+    with tempfile.NamedTemporaryFile(suffix='.glb') as f:
+        f.write(content)
+        f.flush()
+        gltf, binary = read_glb(f.name)
+    # 找到每个网格所在节点的反量化变换（只处理本工具生成的平移+统一缩放子节点）
+    transforms = {node['mesh']: (np.array(node.get('translation', [0, 0, 0])), node.get('scale', [1, 1, 1])[0])
+                  for node in gltf.get('nodes', []) if 'mesh' in node}
+    primitives = []
+    for mesh_index, mesh in enumerate(gltf.get('meshes', [])):
+        offset, scale = transforms.get(mesh_index, (np.zeros(3), 1.0))
+        for primitive in mesh['primitives']:
+            values = {name: read_accessor(gltf, binary, accessor).astype(np.float32)
+                      for name, accessor in primitive['attributes'].items()}
+            indices = read_accessor(gltf, binary, primitive['indices']).reshape(-1) if 'indices' in primitive else None
+            primitives.append((values['POSITION'] * scale + offset, indices))
+    return time.perf_counter() - started, primitives
+
+
+def acmr(indices: np.ndarray) -> float:
+    """FIFO顶点缓存的平均每三角形未命中次数"""
+    indices = indices[:ACMR_MAX_INDICES - ACMR_MAX_INDICES % 3]
+    cache, members, misses = [], set(), 0
+    for index in indices.tolist():
+        if index in members:
+            continue
+        misses += 1
+        cache.append(index)
+        members.add(index)
+        if len(cache) > CACHE_SIZE:
+            members.discard(cache.pop(0))
+    return misses / max(1, len(indices) // 3)
+
+
+def area_error(original: list, optimized: list) -> float:
+    """量化后总表面积的相对变化（与三角形和顶点的顺序无关）"""
+    def area(primitives):
+        total = 0.0
+        for positions, indices in primitives:
+            triangles = (positions[indices] if indices is not None else positions).reshape(-1, 3, 3).astype(np.float64)
+            total += 0.5 * np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0],
+                                                   triangles[:, 2] - triangles[:, 0]), axis=1).sum()
+        return total
+    before = area(original)
+    return abs(area(optimized) - before) / before if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GLB传输优化效果测试")
+    parser.add_argument("paths", nargs="*", help="GLB文件或目录（默认使用已存储的模型）")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20, help="估算传输耗时使用的带宽（Mbit/s）")
+    parser.add_argument("--synthetic", default="5,6,7", help="没有模型时生成的合成模型细分级数")
+    parser.add_argument("--texture", type=int, default=1024, help="合成模型的纹理边长")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_glb_")
+    try:
+        files = collect(args.paths) if args.paths else stored_models()
+        if not files:
+            print("没有已存储的模型，使用合成模型")
+            files = [make_model(os.path.join(workdir, f"synthetic_{level}.glb"), level, args.texture, seed=level)
+                     for level in (int(x) for x in args.synthetic.split(","))]
+
+        bytes_per_second = args.bandwidth_mbps * 1e6 / 8
+        totals = {"original": 0, "original_gzip": 0, "optimized": 0, "optimized_gzip": 0}
+        print(f"{'模型':<24} {'原始':>9} {'原始gzip':>9} {'优化':>9} {'优化gzip':>9} {'优化耗时':>8} "
+              f"{'解码 原始/优化':>16} {'传输+解码':>18} {'ACMR':>11} {'面积误差':>9}")
+        for path in files:
+            with open(path, 'rb') as f:
+                original = f.read()
+            target = os.path.join(workdir, "optimized.glb")
+            started = time.perf_counter()
+            result = optimize_glb(path, target)
+            optimize_seconds = time.perf_counter() - started
+            name = os.path.basename(path)[:24]
+            if not result:
+                print(f"{name:<24} 无法优化")
+                continue
+            with open(target + '.gz', 'rb') as f:
+                compressed = f.read()
+            original_gzip = len(gzip.compress(original, compresslevel=6))
+
+            original_decode, original_data = decode(original, False)
+            optimized_decode, optimized_data = decode(compressed, True)
+            before = original_decode + len(original) / bytes_per_second
+            after = optimized_decode + len(compressed) / bytes_per_second
+            original_indices = next((i for _, i in original_data if i is not None), None)
+            optimized_indices = next((i for _, i in optimized_data if i is not None), None)
+            cache = (f"{acmr(original_indices):.2f}/{acmr(optimized_indices):.2f}"
+                     if original_indices is not None and optimized_indices is not None else "-")
+
+            totals["original"] += len(original)
+            totals["original_gzip"] += original_gzip
+            totals["optimized"] += result["bytes"]
+            totals["optimized_gzip"] += result["gzip_bytes"]
+            print(f"{name:<24} {len(original) / 1e6:>7.2f}MB {original_gzip / 1e6:>7.2f}MB "
+                  f"{result['bytes'] / 1e6:>7.2f}MB {result['gzip_bytes'] / 1e6:>7.2f}MB {optimize_seconds:>7.2f}s "
+                  f"{original_decode * 1000:>9.0f}/{optimized_decode * 1000:.0f}ms "
+                  f"{before:>9.2f}s->{after:.2f}s {cache:>11} {area_error(original_data, optimized_data):>9.1e}")
+
+        if totals["original"]:
+            print(f"\n合计: 原始 {totals['original'] / 1e6:.2f}MB，原始gzip {totals['original_gzip'] / 1e6:.2f}MB，"
+                  f"优化后gzip {totals['optimized_gzip'] / 1e6:.2f}MB"
+                  f"（为原始的 {totals['optimized_gzip'] / totals['original']:.1%}）")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+历史记录分页基准测试
+生成百万行合成历史记录，对比：
+- 旧实现：无索引的 ORDER BY created_at DESC LIMIT 50（全表扫描 + 排序）
+- OFFSET 分页：翻页越深越慢
+- 游标分页（query_model_history）：任意深度的单页耗时基本不变，含筛选条件时同样走索引
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_history --rows 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import database
+
+PAGE_SIZE = 50
+INDEXES = ('idx_history_created', 'idx_history_stage', 'idx_history_input_type')
+
+
+def populate(rows: int):
+    """写入合成历史记录（时间均匀分布在过去一年内）"""
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    start = datetime.now() - timedelta(days=365)
+    step = 365 * 86400 / rows
+    batch = []
+    for i in range(rows):
+        created_at = (start + timedelta(seconds=i * step)).isoformat()
+        batch.append((
+            uuid.uuid4().hex,
+            'image' if i % 5 == 0 else 'text',
+            f'synthetic prompt {i}',
+            'refined' if i % 3 == 0 else 'preview',
+            f'/api/files/models/model_{i}.glb',
+            f'/api/files/previews/preview_{i}.png',
+            '{"glb": "/api/files/models/model_%d.glb"}' % i,
+            round(random.uniform(0.5, 1.0), 3),
+            created_at,
+        ))
+        if len(batch) == 50000:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.close()
+
+
+def _insert(conn, batch):
+    conn.executemany('''
+        INSERT INTO model_history (id, input_type, input_content, stage, model_url,
+                                   preview_url, download_urls, quality_score, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+    conn.commit()
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def legacy_page():
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    conn.execute('''
+        SELECT id, input_type, input_content, complexity, format, stage,
+               model_url, preview_url, download_urls, quality_score,
+               created_at, local_model_path, local_preview_path
+        FROM model_history ORDER BY created_at DESC LIMIT ?
+    ''', (PAGE_SIZE,)).fetchall()
+    conn.close()
+
+
+def offset_page(offset: int):
+    database.get_connection().execute('''
+        SELECT id, input_type, input_content, stage, model_url, preview_url, quality_score, created_at
+        FROM model_history ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+    ''', (PAGE_SIZE, offset)).fetchall()
+
+
+def cursor_at(depth: int, **filters) -> str:
+    """翻到第 depth 页，返回该页的游标"""
+    cursor = None
+    for _ in range(depth):
+        _, cursor = database.query_model_history(PAGE_SIZE, cursor, summary=True, **filters)
+    return cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史记录分页基准测试")
+    parser.add_argument("--rows", type=int, default=1000000, help="合成记录数")
+    parser.add_argument("--depths", default="1,100,1000,10000", help="测量的翻页深度")
+    args = parser.parse_args()
+    depths = [int(d) for d in args.depths.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="bench_history_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    try:
+        database.init_database()
+        conn = sqlite3.connect(database.DATABASE_PATH)
+        for index in INDEXES:
+            conn.execute(f'DROP INDEX {index}')
+        conn.close()
+
+        random.seed(42)
+        started = time.perf_counter()
+        populate(args.rows)
+        print(f"生成 {args.rows} 条记录，耗时 {time.perf_counter() - started:.1f}s")
+
+        print(f"旧实现（无索引）首页: {timed(legacy_page, 3):.1f} ms")
+
+        started = time.perf_counter()
+        database.init_database()
+        print(f"建立索引耗时 {time.perf_counter() - started:.1f}s")
+        print(f"旧查询（有索引）首页: {timed(legacy_page):.2f} ms")
+
+        print(f"{'深度':>8} {'OFFSET':>10} {'游标':>10} {'游标+stage':>12} {'游标+日期+质量':>16}")
+        date_filters = {
+            'created_after': (datetime.now() - timedelta(days=180)).isoformat(),
+            'min_quality': 0.9,
+        }
+        for depth in depths:
+            offset_ms = timed(lambda: offset_page((depth - 1) * PAGE_SIZE), 3)
+            cursor = cursor_at(depth - 1)
+            keyset_ms = timed(lambda: database.query_model_history(PAGE_SIZE, cursor, summary=True))
+            stage_cursor = cursor_at(depth - 1, stage='refined')
+            stage_ms = timed(lambda: database.query_model_history(
+                PAGE_SIZE, stage_cursor, stage='refined', summary=True))
+            filtered_cursor = cursor_at(min(depth - 1, 1000), **date_filters)
+            filtered_ms = timed(lambda: database.query_model_history(
+                PAGE_SIZE, filtered_cursor, summary=True, **date_filters))
+            print(f"{depth:>8} {offset_ms:>9.2f}ms {keyset_ms:>9.2f}ms {stage_ms:>11.2f}ms {filtered_ms:>15.2f}ms")
+        print("（日期+质量筛选的深度上限为1000页：半年内质量≥0.9的记录约10万条，共约2000页）")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
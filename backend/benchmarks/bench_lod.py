@@ -0,0 +1,91 @@
+"""
+LOD生成耗时与每次查看传输字节数测试
+生成不同面数的带纹理球体（随机噪声纹理，接近真实贴图的压缩率），测量：
+- 各级LOD的生成耗时（单个模型）以及多个模型并发提交到进程池时的吞吐量
+- 各级别的面数和文件大小
+- 按 --view-mix 给出的各级别查看比例（例如列表缩略视图多、详情页少），
+  平均每次查看传输的字节数与始终返回原始模型相比的节省
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_lod --subdivisions 5,6,7 --texture 1024 --view-mix 0.1,0.3,0.6
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+from PIL import Image
+from trimesh.visual import TextureVisuals
+from trimesh.visual.material import PBRMaterial
+
+from mesh_lod import build_lods, parse_ratios
+from process_pool import run_in_process, shutdown_process_pool
+
+
+def make_model(path: str, subdivisions: int, texture_size: int, seed: int = 0) -> str:
+    """带球面UV和噪声纹理的球体GLB"""
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    vertices = mesh.vertices
+    uv = np.stack([np.arctan2(vertices[:, 1], vertices[:, 0]) / (2 * np.pi) + 0.5,
+                   np.arccos(np.clip(vertices[:, 2], -1, 1)) / np.pi], axis=1)
+    pixels = np.random.default_rng(seed).integers(0, 256, (texture_size, texture_size, 3), dtype=np.uint8)
+    mesh.visual = TextureVisuals(uv=uv, material=PBRMaterial(baseColorTexture=Image.fromarray(pixels)))
+    mesh.export(path)
+    return path
+
+
+async def build_concurrently(sources: list, workdir: str, ratios: list) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(run_in_process(build_lods, source, os.path.join(workdir, f"pool_{i}"), ratios)
+                           for i, source in enumerate(sources)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOD生成耗时与传输字节数测试")
+    parser.add_argument("--subdivisions", default="5,6,7", help="icosphere细分级数，逗号分隔（6约8万面，7约33万面）")
+    parser.add_argument("--texture", type=int, default=1024, help="纹理边长（像素）")
+    parser.add_argument("--ratios", default="1.0,0.25,0.05", help="各级LOD的面数比例")
+    parser.add_argument("--view-mix", default="0.1,0.3,0.6", help="各级别的查看比例（与级别一一对应）")
+    parser.add_argument("--pool-models", type=int, default=4, help="并发提交到进程池的模型数")
+    args = parser.parse_args()
+
+    ratios = parse_ratios(args.ratios)
+    mix = [float(x) for x in args.view_mix.split(",")]
+    if len(mix) != len(ratios):
+        parser.error("--view-mix 的数量需与LOD级别数相同")
+    mix = [x / sum(mix) for x in mix]
+
+    workdir = tempfile.mkdtemp(prefix="bench_lod_")
+    try:
+        print(f"LOD比例 {ratios}，查看比例 {[round(x, 2) for x in mix]}，纹理 {args.texture}px")
+        print(f"{'原始面数':>10} {'生成耗时':>9}  {'各级 面数/大小':<52} {'每次查看':>10} {'原始':>10} {'节省':>6}")
+        for subdivisions in (int(x) for x in args.subdivisions.split(",")):
+            source = make_model(os.path.join(workdir, f"model_{subdivisions}.glb"), subdivisions, args.texture)
+            started = time.perf_counter()
+            levels = build_lods(source, os.path.join(workdir, f"model_{subdivisions}"), ratios)
+            elapsed = time.perf_counter() - started
+            # 未生成的级别（面数太少不再简化）按服务端的回退规则返回更高精度的级别
+            sizes = [levels[min(level, len(levels) - 1)]["bytes"] for level in range(len(ratios))]
+            per_view = sum(share * size for share, size in zip(mix, sizes))
+            original = levels[0]["bytes"]
+            detail = "  ".join(f"{lod['faces']}/{lod['bytes'] / 1e6:.2f}MB" for lod in levels)
+            print(f"{levels[0]['faces']:>10} {elapsed:>8.2f}s  {detail:<52} "
+                  f"{per_view / 1e6:>8.2f}MB {original / 1e6:>8.2f}MB {1 - per_view / original:>6.1%}")
+
+        sources = [make_model(os.path.join(workdir, f"pool_source_{i}.glb"), 6, args.texture, seed=i)
+                   for i in range(args.pool_models)]
+        elapsed = asyncio.run(build_concurrently(sources, workdir, ratios))
+        print(f"\n进程池（{os.cpu_count()} 核）并发处理 {len(sources)} 个模型: {elapsed:.2f}s，"
+              f"{len(sources) / elapsed:.2f} 个/秒")
+    finally:
+        shutdown_process_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
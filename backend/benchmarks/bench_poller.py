@@ -0,0 +1,89 @@
+"""
+任务轮询基准测试
+对比旧的每任务固定间隔轮询与共享自适应轮询器在大量并发任务下的
+上游状态查询次数和完成检测延迟（任务实际完成到被发现的时间差）
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_poller -n 200 --task-duration 5 --spread 2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_meshy import FakeMeshyServer
+from meshy_client import MeshyClient
+
+
+async def fixed_interval_wait(client: MeshyClient, task_id: str, check_interval: float) -> dict:
+    """旧实现：每个任务独立的固定间隔轮询循环"""
+    while True:
+        try:
+            task_info = await client.get_task_status(task_id)
+        except Exception:
+            await asyncio.sleep(check_interval)
+            continue
+        if task_info.get("status") == "SUCCEEDED":
+            return task_info
+        await asyncio.sleep(check_interval)
+
+
+async def run(server: FakeMeshyServer, n: int, mode: str, check_interval: float) -> dict:
+    client = MeshyClient(api_key="bench", base_url=server.base_url)
+    detected = {}
+
+    async def one(i: int):
+        response = await client.create_preview_task(prompt=f"prompt {i}")
+        task_id = response["result"]
+        if mode == "fixed":
+            await fixed_interval_wait(client, task_id, check_interval)
+        else:
+            await client.wait_for_task_completion(task_id, max_wait_time=3600)
+        detected[task_id] = time.monotonic()
+
+    status_calls_before = server.stats["status_calls"]
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(n)))
+    finally:
+        await client.aclose()
+
+    latencies = [detected[t] - server.app.state.tasks[t]["done_at"] for t in detected]
+    latencies.sort()
+    return {
+        "elapsed": time.perf_counter() - start,
+        "status_calls": server.stats["status_calls"] - status_calls_before,
+        "latency_mean": statistics.mean(latencies),
+        "latency_p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务轮询基准测试")
+    parser.add_argument("-n", "--tasks", type=int, default=200)
+    parser.add_argument("--task-duration", type=float, default=5.0)
+    parser.add_argument("--spread", type=float, default=2.0, help="任务耗时浮动比例")
+    parser.add_argument("--check-interval", type=float, default=10.0, help="旧实现的固定轮询间隔")
+    parser.add_argument("--fast-interval", type=float, default=1.0, help="对照组的短固定间隔")
+    parser.add_argument("--rate-limit", type=int, default=None, help="模拟服务每秒允许的状态查询数")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    with FakeMeshyServer(port=args.port, task_duration=args.task_duration,
+                         duration_spread=args.spread, rate_limit=args.rate_limit) as server:
+        # 固定间隔分别取旧默认值和与自适应最短间隔相同的值（同等检测延迟下的查询量）
+        scenarios = [
+            (f"fixed {args.check_interval:g}s", "fixed", args.check_interval),
+            (f"fixed {args.fast_interval:g}s", "fixed", args.fast_interval),
+            ("adaptive", "adaptive", None),
+        ]
+        for label, mode, interval in scenarios:
+            result = asyncio.run(run(server, args.tasks, mode, interval))
+            print(f"[{label:10}] 任务数: {args.tasks}, 总耗时: {result['elapsed']:.1f}s, "
+                  f"状态查询: {result['status_calls']}, "
+                  f"检测延迟 均值: {result['latency_mean']:.2f}s p95: {result['latency_p95']:.2f}s")
+        print(f"模拟服务限流次数: {server.stats['rate_limited']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+提示词近似重复缓存基准测试
+按时间顺序回放历史预览请求，统计三种缓存键的命中率：
+- 原始文本 MD5（旧实现）
+- 规范化文本（大小写、全半角、标点、空白不影响）
+- 规范化 + n-gram 相似度（不同阈值）
+每次未命中视为一次付费生成并登记到索引。真实历史表中重复提示词不多时，
+另用合成的改写流回放：每条改写都带有真实来源，据此统计误命中（复用了不同提示词的模型）；
+合成流中还混入只改动一个属性的"困难负例"（如 red -> blue），它们必须未命中。
+最后对比暴力检索与 HNSW（安装了 hnswlib 时）的单次查找延迟
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_prompt_cache --requests 20000 --sizes 20000,100000
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+from prompt_index import HNSW_AVAILABLE, PromptIndex, normalize_prompt
+
+COLORS = ["red", "blue", "green", "golden", "silver", "black", "white", "purple", "orange", "pink"]
+ADJECTIVES = ["cute", "shiny", "ancient", "futuristic", "wooden", "metallic", "tiny", "giant",
+              "low-poly", "realistic", "cartoon", "rusty", "crystal", "fluffy", "armored", "steampunk"]
+NOUNS = ["robot", "dragon", "chair", "castle", "hamster", "spaceship", "sword", "teapot", "mushroom",
+         "knight", "sports car", "tree", "lamp", "helmet", "cat", "dinosaur", "owl", "guitar"]
+EXTRAS = ["with wings", "on a rock", "game asset", "with glowing eyes", "for 3d printing",
+          "pbr textures", "standing pose", "holding a shield", "on a wooden base"]
+CN_ADJECTIVES = ["可爱的", "古老的", "未来感的", "木制的", "金属质感的", "小小的", "巨大的", "卡通风格的", "毛茸茸的"]
+CN_COLORS = ["红色", "蓝色", "绿色", "金色", "银色", "黑色", "白色", "紫色"]
+CN_NOUNS = ["仓鼠", "机器人", "城堡", "椅子", "宝剑", "茶壶", "蘑菇", "骑士", "恐龙", "飞船", "猫头鹰", "吉他"]
+CN_PUNCTUATION = str.maketrans({",": "，", ".": "。", "!": "！", " ": ""})
+
+
+def make_base(rng: random.Random) -> tuple:
+    """生成一条原始提示词，返回 (提示词, 属性元组)，属性元组用于构造困难负例"""
+    if rng.random() < 0.3:
+        parts = (rng.choice(CN_ADJECTIVES), rng.choice(CN_COLORS), rng.choice(CN_NOUNS))
+        return f"一只{parts[0]}{parts[1]}{parts[2]}", ('cn',) + parts
+    parts = (rng.choice(ADJECTIVES), rng.choice(COLORS), rng.choice(NOUNS),
+             rng.choice(EXTRAS) if rng.random() < 0.6 else "")
+    return f"a {parts[0]} {parts[1]} {parts[2]} {parts[3]}".strip(), ('en',) + parts
+
+
+def hard_negative(attrs: tuple, rng: random.Random) -> tuple:
+    """只替换颜色或名词，得到含义不同但字面相近的提示词"""
+    if attrs[0] == 'cn':
+        _, adjective, color, noun = attrs
+        if rng.random() < 0.5:
+            color = rng.choice([c for c in CN_COLORS if c != color])
+        else:
+            noun = rng.choice([n for n in CN_NOUNS if n != noun])
+        return f"一只{adjective}{color}{noun}", ('cn', adjective, color, noun)
+    _, adjective, color, noun, extra = attrs
+    if rng.random() < 0.5:
+        color = rng.choice([c for c in COLORS if c != color])
+    else:
+        noun = rng.choice([n for n in NOUNS if n != noun])
+    return f"a {adjective} {color} {noun} {extra}".strip(), ('en', adjective, color, noun, extra)
+
+
+def paraphrase(text: str, rng: random.Random) -> str:
+    """用户重复提交同一需求时常见的写法差异"""
+    variant = rng.choice(["case", "punct", "space", "article", "fullwidth", "plural", "combo"])
+    if text.startswith("一只"):
+        variant = rng.choice(["punct", "space", "fullwidth", "drop_yi"])
+    if variant == "case":
+        return text.title() if rng.random() < 0.5 else text.upper()
+    if variant == "punct":
+        return text + rng.choice([".", "!", "。", "！", "..."])
+    if variant == "space":
+        return "  " + text.replace(" ", "  ") + " "
+    if variant == "article":
+        return text[2:] if text.startswith("a ") else "the " + text
+    if variant == "fullwidth":
+        return ''.join(chr(ord(c) + 0xFEE0) if '!' <= c <= '~' else c for c in text)
+    if variant == "plural":
+        return text + "s"
+    if variant == "drop_yi":
+        return text[2:]
+    return (text[2:] if text.startswith("a ") else text).capitalize().replace(" with", ", with") + "."
+
+
+def synthetic_stream(requests: int, repeat_ratio: float, negative_ratio: float, seed: int):
+    """生成 (提示词, 来源编号) 序列；来源编号相同表示同一需求"""
+    rng = random.Random(seed)
+    bases = []  # (原始提示词, 属性)
+    seen_attrs = {}
+    stream = []
+    for _ in range(requests):
+        roll = rng.random()
+        if bases and roll < repeat_ratio:
+            source = rng.randrange(len(bases))
+            stream.append((paraphrase(bases[source][0], rng), source))
+            continue
+        if bases and roll < repeat_ratio + negative_ratio:
+            text, attrs = hard_negative(bases[rng.randrange(len(bases))][1], rng)
+        else:
+            text, attrs = make_base(rng)
+        source = seen_attrs.get(attrs)
+        if source is None:
+            source = seen_attrs[attrs] = len(bases)
+            bases.append((text, attrs))
+        stream.append((text, source))
+    return stream
+
+
+def history_stream(db_path: str):
+    """真实历史表中的文本预览，按生成时间排序；来源未知，按规范化提示词近似"""
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT input_content FROM model_history
+        WHERE input_type = 'text' AND stage = 'preview' ORDER BY created_at, rowid
+    ''').fetchall()
+    conn.close()
+    return [(text, normalize_prompt(text)) for (text,) in rows]
+
+
+def replay(stream, thresholds) -> dict:
+    """回放请求流，返回各策略的命中数和误命中数"""
+    results = {}
+
+    raw, hits = set(), 0
+    for text, _ in stream:
+        key = hashlib.md5(f"text_preview:{text}".encode()).hexdigest()
+        hits += key in raw
+        raw.add(key)
+    results["原始MD5"] = (hits, 0)
+
+    normalized, hits, wrong = {}, 0, 0
+    for text, source in stream:
+        key = normalize_prompt(text)
+        if key in normalized:
+            hits += 1
+            wrong += normalized[key] != source
+        else:
+            normalized[key] = source
+    results["规范化"] = (hits, wrong)
+
+    for threshold in thresholds:
+        index = PromptIndex(threshold=threshold, refresh_interval=float('inf'), ann_min_size=10**9)
+        hits, wrong = 0, 0
+        for i, (text, source) in enumerate(stream):
+            match = index.find(text)
+            if match:
+                hits += 1
+                wrong += match[0]['source'] != source
+            else:
+                index.add({'id': str(i), 'input_content': text, 'source': source})
+        results[f"相似度≥{threshold}"] = (hits, wrong)
+    return results
+
+
+def print_replay(title: str, stream, thresholds):
+    sources = [source for _, source in stream]
+    possible = len(sources) - len(set(sources))
+    print(f"\n{title}: {len(stream)} 次请求，其中 {possible} 次与之前的请求为同一需求")
+    if not stream:
+        return
+    print(f"{'策略':<12} {'命中':>7} {'命中率':>8} {'可复用的覆盖':>12} {'误命中':>7}")
+    for name, (hits, wrong) in replay(stream, thresholds).items():
+        coverage = f"{(hits - wrong) / possible:.1%}" if possible else "-"
+        print(f"{name:<12} {hits:>7} {hits / len(stream):>8.1%} {coverage:>12} {wrong:>7}")
+
+
+def measure_lookup(size: int, queries: int, ann: bool) -> tuple:
+    """建立 size 条不同提示词的索引，返回 (建立耗时s, 查找p50 ms, 查找p99 ms)"""
+    rng = random.Random(7)
+    index = PromptIndex(refresh_interval=float('inf'), ann_min_size=1 if ann else 10**9)
+    started = time.perf_counter()
+    for i in range(size):
+        index.add({'id': str(i), 'input_content': f"{make_base(rng)[0]} variant {i}"})
+    build = time.perf_counter() - started
+
+    samples = []
+    for i in range(queries):
+        text = paraphrase(f"{make_base(rng)[0]} variant {rng.randrange(size)}", rng)
+        started = time.perf_counter()
+        index.find(text)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return build, statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词近似重复缓存基准测试")
+    parser.add_argument("--db", default=os.path.join("storage", "models.db"), help="回放的历史数据库")
+    parser.add_argument("--requests", type=int, default=20000, help="合成请求数")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="合成流中重复需求（改写）的比例")
+    parser.add_argument("--negative-ratio", type=float, default=0.2, help="合成流中困难负例的比例")
+    parser.add_argument("--thresholds", default="0.85,0.9,0.95", help="对比的相似度阈值")
+    parser.add_argument("--sizes", default="20000,100000", help="测量查找延迟的索引规模")
+    parser.add_argument("--queries", type=int, default=500, help="每个规模的查找次数")
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    print_replay(f"真实历史回放（{args.db}）", history_stream(args.db), thresholds)
+    print_replay("合成改写流回放", synthetic_stream(
+        args.requests, args.repeat_ratio, args.negative_ratio, seed=42), thresholds)
+
+    print(f"\n{'索引规模':>8} {'检索方式':<8} {'建立耗时':>9} {'p50':>9} {'p99':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for ann in ((False, True) if HNSW_AVAILABLE else (False,)):
+            build, p50, p99 = measure_lookup(size, args.queries, ann)
+            print(f"{size:>8} {'HNSW' if ann else '暴力':<8} {build:>8.1f}s {p50:>7.2f}ms {p99:>7.2f}ms")
+    if not HNSW_AVAILABLE:
+        print("（未安装 hnswlib，仅测量暴力检索）")
+
+
+if __name__ == "__main__":
+    main()
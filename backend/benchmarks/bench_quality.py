@@ -0,0 +1,121 @@
+"""
+模型质量分析基准测试
+生成大型合成网格（icosphere，可选带纹理），按 --defects 比例注入已知数量的问题：
+退化面（顶点重合）、重复面、非流形边（在已有边上额外挂一个面）、孔洞（删除面产生边界边），
+导出为GLB后统计：
+- analyze_mesh 单次耗时（含读取GLB）及每秒处理的面数
+- 检测到的问题数是否与注入的数量一致
+- 多个模型同时提交到进程池时的总耗时
+另外对 storage 中已存储的模型各分析一次
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_quality
+    python -m benchmarks.bench_quality --subdivisions 7,8,9 --defects 0.001 --pool-models 4
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from benchmarks.bench_glb_optimize import stored_models
+from benchmarks.bench_lod import make_model
+from mesh_quality import analyze_mesh, quality_score
+from process_pool import run_in_process, shutdown_process_pool
+
+
+def make_defective_model(path: str, subdivisions: int, ratio: float, seed: int) -> dict:
+    """无纹理的icosphere，注入问题后导出GLB，返回注入的数量"""
+    rng = np.random.default_rng(seed)
+    sphere = trimesh.creation.icosphere(subdivisions=subdivisions)
+    vertices, faces = sphere.vertices, sphere.faces
+    count = max(1, int(len(faces) * ratio))
+    # 选取互不共用顶点的面，保证注入的问题互不影响，检测结果可以与注入数量精确比较
+    chosen, used = [], np.zeros(len(vertices), dtype=bool)
+    for face in rng.permutation(len(faces)):
+        if not used[faces[face]].any():
+            used[faces[face]] = True
+            chosen.append(face)
+            if len(chosen) == 3 * count:
+                break
+    chosen = np.array(chosen)
+    holes, duplicated, fins = chosen[:count], chosen[count:2 * count], chosen[2 * count:]
+
+    # 非流形边：在选中面的第一条边上挂一个新面（指向新增的顶点），该边被3个面共用
+    apex = vertices[faces[fins]].mean(axis=1) * 1.1
+    fin_faces = np.stack([faces[fins, 0], faces[fins, 1], len(vertices) + np.arange(count)], axis=1)
+    # 退化面：两个顶点相同
+    degenerate = np.stack([faces[duplicated, 0], faces[duplicated, 0], faces[duplicated, 1]], axis=1)
+    keep = np.ones(len(faces), dtype=bool)
+    keep[holes] = False
+    faces = np.concatenate([faces[keep], faces[duplicated], fin_faces, degenerate])
+    mesh = trimesh.Trimesh(np.concatenate([vertices, apex]), faces, process=False)
+    mesh.export(path, file_type='glb')
+    # 每个孔洞产生3条边界边；挂面本身的另外两条边也是边界边
+    return {'faces': len(faces), 'degenerate_faces': count, 'duplicate_faces': count,
+            'non_manifold_edges': count, 'boundary_edges': 3 * count + 2 * count}
+
+
+def check(metrics: dict, expected: dict) -> str:
+    mismatched = [f"{name} {metrics[name]}!={value}" for name, value in expected.items() if metrics[name] != value]
+    return "一致" if not mismatched else "不一致: " + ", ".join(mismatched)
+
+
+async def analyze_concurrently(paths: list) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(run_in_process(analyze_mesh, path, 'glb') for path in paths))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型质量分析基准测试")
+    parser.add_argument("--subdivisions", default="7,8", help="icosphere细分级数（7约33万面，8约131万面，9约524万面）")
+    parser.add_argument("--defects", type=float, default=0.001, help="每类问题注入的数量占面数的比例")
+    parser.add_argument("--texture", type=int, default=2048, help="带纹理模型的纹理边长")
+    parser.add_argument("--pool-models", type=int, default=4, help="同时提交到进程池的模型数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_quality_")
+    try:
+        print(f"{'模型':<28} {'面数':>9} {'耗时':>8} {'面/秒':>10} {'质量分':>6}  检测结果")
+        paths = []
+        for level in (int(x) for x in args.subdivisions.split(",")):
+            path = os.path.join(workdir, f"defective_{level}.glb")
+            expected = make_defective_model(path, level, args.defects, seed=level)
+            paths.append(path)
+            started = time.perf_counter()
+            metrics = analyze_mesh(path, 'glb')
+            elapsed = time.perf_counter() - started
+            print(f"{os.path.basename(path):<28} {metrics['faces']:>9} {elapsed:>7.2f}s "
+                  f"{metrics['faces'] / elapsed:>10.0f} {quality_score(metrics):>6.2f}  {check(metrics, expected)}")
+
+        textured = make_model(os.path.join(workdir, "textured_8.glb"), 8, args.texture, seed=8)
+        started = time.perf_counter()
+        metrics = analyze_mesh(textured, 'glb')
+        elapsed = time.perf_counter() - started
+        print(f"{os.path.basename(textured):<28} {metrics['faces']:>9} {elapsed:>7.2f}s "
+              f"{metrics['faces'] / elapsed:>10.0f} {quality_score(metrics):>6.2f}  "
+              f"水密 {metrics['watertight']}，纹理 {metrics['texture_size']}")
+
+        for path in stored_models():
+            started = time.perf_counter()
+            metrics = analyze_mesh(path, 'glb')
+            elapsed = time.perf_counter() - started
+            print(f"{os.path.basename(path)[:28]:<28} {metrics['faces']:>9} {elapsed:>7.2f}s "
+                  f"{metrics['faces'] / elapsed:>10.0f} {quality_score(metrics):>6.2f}  "
+                  f"水密 {metrics['watertight']}，纵横比p99 {metrics['aspect_ratio']['p99']}")
+
+        pool_paths = (paths * args.pool_models)[:args.pool_models]
+        elapsed = asyncio.run(analyze_concurrently(pool_paths))
+        print(f"\n进程池: {len(pool_paths)} 个模型同时提交，共 {elapsed:.2f}s")
+    finally:
+        shutdown_process_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Redis故障恢复与管道基准测试
+对独立进程中的模拟Redis（benchmarks.fake_redis）持续发起缓存读写，期间依次：正常 -> SIGKILL ->
+重启 -> SIGSTOP（接受连接但不响应） -> SIGCONT，统计每个阶段的请求失败数和延迟，对比：
+- 旧实现：同步 redis.Redis 单连接，出错即请求失败，卡死时无超时
+- 连接池 + 熔断：失败按未命中处理（回落到SQLite），熔断后不再等待超时，恢复后自动重连
+并对比逐个读取与管道批量读取多个键的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_redis --phase-seconds 2 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+import database
+from benchmarks.fake_redis import FakeRedisProcess
+from cache import TieredCache
+from redis_pool import RedisPool
+
+PHASES = ("正常", "已杀死", "已重启", "卡死", "已恢复")
+KEYS = [f"model_cache:{i}" for i in range(1000)]
+VALUE = {"task_id": "0199a1b2", "model_url": "/api/files/models/model_0199a1b2.glb"}
+
+
+def control_phases(server: FakeRedisProcess, current: list, phase_seconds: float, restarted_at: list):
+    """按阶段操作模拟Redis；current[0] 为当前阶段下标"""
+    for index in range(1, len(PHASES)):
+        time.sleep(phase_seconds)
+        if PHASES[index] == "已杀死":
+            server.kill()
+        elif PHASES[index] == "已重启":
+            server.start()
+            restarted_at[0] = time.perf_counter()
+        elif PHASES[index] == "卡死":
+            server.pause()
+        elif PHASES[index] == "已恢复":
+            server.resume()
+            restarted_at[0] = time.perf_counter()
+        current[0] = index
+    time.sleep(phase_seconds)
+    current[0] = len(PHASES)
+
+
+def summarize(samples: dict, failures: dict) -> None:
+    print(f"{'阶段':<8} {'请求数':>8} {'失败':>7} {'p50':>9} {'p99':>9} {'最大':>9}")
+    for index, name in enumerate(PHASES):
+        timings = sorted(samples[index])
+        if not timings:
+            print(f"{name:<8} {0:>8} {failures[index]:>7}   （全部阻塞，没有完成的请求）")
+            continue
+        p99 = timings[int(len(timings) * 0.99)]
+        print(f"{name:<8} {len(timings):>8} {failures[index]:>7} {statistics.median(timings) * 1000:>7.2f}ms "
+              f"{p99 * 1000:>7.2f}ms {timings[-1] * 1000:>7.0f}ms")
+
+
+def run_legacy(port: int, phase_seconds: float, concurrency: int):
+    """旧实现：同步客户端，异常即请求失败"""
+    server = FakeRedisProcess(port=port)
+    server.start()
+    client = redis.Redis(host="127.0.0.1", port=port, decode_responses=True, protocol=2)
+    current, restarted_at = [0], [0.0]
+    samples = {i: [] for i in range(len(PHASES))}
+    failures = {i: 0 for i in range(len(PHASES))}
+    lock = threading.Lock()
+
+    def worker():
+        while current[0] < len(PHASES):
+            phase = current[0]
+            key = random.choice(KEYS)
+            started = time.perf_counter()
+            try:
+                if client.get(key) is None:
+                    client.set(key, '{"task_id": "0199a1b2"}', ex=3600)
+                ok = True
+            except Exception:
+                ok = False
+            with lock:
+                if ok:
+                    samples[phase].append(time.perf_counter() - started)
+                else:
+                    failures[phase] += 1
+
+    controller = threading.Thread(target=control_phases, args=(server, current, phase_seconds, restarted_at))
+    controller.start()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    controller.join()
+    server.kill()
+    print("\n旧实现（同步单客户端，无超时、无熔断）")
+    summarize(samples, failures)
+
+
+async def run_pooled(port: int, phase_seconds: float, concurrency: int):
+    server = FakeRedisProcess(port=port)
+    server.start()
+    pool = RedisPool(host="127.0.0.1", port=port, socket_timeout=0.2, recovery_interval=0.2)
+    await pool.start()
+    cache = TieredCache(pool, max_size=0)  # 关闭进程内层，每次读取都经过Redis
+    current, restarted_at = [0], [0.0]
+    samples = {i: [] for i in range(len(PHASES))}
+    failures = {i: 0 for i in range(len(PHASES))}
+    recoveries = []
+
+    async def worker():
+        while current[0] < len(PHASES):
+            phase = current[0]
+            key = random.choice(KEYS)
+            started = time.perf_counter()
+            try:
+                if await cache.get(key) is None:
+                    await cache.set(key, VALUE)
+                samples[phase].append(time.perf_counter() - started)
+            except Exception:
+                failures[phase] += 1
+            # Redis熔断时缓存读写不会挂起，主动让出事件循环（真实请求在读写套接字时会让出）
+            await asyncio.sleep(0)
+
+    async def watch_recovery():
+        last = 0
+        while current[0] < len(PHASES):
+            if pool.stats["recoveries"] > last:
+                last = pool.stats["recoveries"]
+                recoveries.append((PHASES[current[0]], time.perf_counter() - restarted_at[0]))
+            await asyncio.sleep(0.01)
+
+    controller = threading.Thread(target=control_phases, args=(server, current, phase_seconds, restarted_at))
+    controller.start()
+    await asyncio.gather(watch_recovery(), *(worker() for _ in range(concurrency)))
+    controller.join()
+
+    print("\n连接池 + 熔断（Redis不可用时回落到SQLite）")
+    summarize(samples, failures)
+    for phase, seconds in recoveries:
+        print(f"  {phase}后 {seconds * 1000:.0f} ms 解除熔断")
+    print(f"  连接池统计: {pool.get_stats()}")
+    print(f"  缓存统计: {cache.get_stats()['redis']}")
+
+    # 管道批量读取与逐个读取对比
+    await cache.set_many({key: VALUE for key in KEYS[:100]})
+    for size in (10, 100):
+        keys = KEYS[:size]
+        started = time.perf_counter()
+        for _ in range(50):
+            for key in keys:
+                await cache.get(key)
+        sequential = (time.perf_counter() - started) / 50
+        started = time.perf_counter()
+        for _ in range(50):
+            await cache.get_many(keys)
+        pipelined = (time.perf_counter() - started) / 50
+        print(f"  读取 {size} 个键: 逐个 {sequential * 1000:.2f} ms，管道 {pipelined * 1000:.2f} ms")
+
+    await pool.close()
+    server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis故障恢复与管道基准测试")
+    parser.add_argument("--phase-seconds", type=float, default=2.0, help="每个阶段的持续时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发请求数")
+    parser.add_argument("--port", type=int, default=6390, help="模拟Redis端口")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_redis_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    try:
+        database.init_database()
+        random.seed(42)
+        run_legacy(args.port, args.phase_seconds, args.concurrency)
+        asyncio.run(run_pooled(args.port, args.phase_seconds, args.concurrency))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
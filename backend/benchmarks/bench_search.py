@@ -0,0 +1,134 @@
+"""
+历史提示词搜索基准测试
+生成百万条合成提示词（中英文混合），测量 search_model_history 各类查询的 p50/p99 延迟，
+并与旧的做法（LIKE '%词%' 按时间倒序扫描，常见词很快命中，罕见词需扫描全表）对比
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_search --rows 1000000 --p99-target-ms 50
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import database
+
+ADJECTIVES = ["cute", "shiny", "ancient", "futuristic", "wooden", "metallic", "tiny", "giant",
+              "low-poly", "realistic", "cartoon", "rusty", "golden", "crystal", "fluffy", "armored"]
+NOUNS = ["robot", "dragon", "chair", "castle", "hamster", "spaceship", "sword", "teapot",
+         "mushroom", "knight", "car", "tree", "lamp", "helmet", "cat", "dinosaur"]
+EXTRAS = ["with wings", "on a rock", "in the style of pixar", "game asset", "with glowing eyes",
+          "for 3d printing", "pbr textures", "standing pose"]
+CN_ADJECTIVES = ["可爱的", "古老的", "未来感的", "木制的", "金属质感的", "小小的", "巨大的", "卡通风格的"]
+CN_NOUNS = ["仓鼠", "机器人", "城堡", "椅子", "宝剑", "茶壶", "蘑菇", "骑士", "恐龙", "飞船"]
+
+QUERIES = {
+    "英文单词": ["dragon", "teapot", "helmet", "mushroom", "spaceship"],
+    "英文前缀": ["drag*", "mush*", "spac*", "helm*", "knig*"],
+    "多词": ["golden dragon", "wooden chair", "cute hamster", "rusty robot", "crystal sword"],
+    "罕见词": ["prompt_123456", "prompt_987654", "prompt_555555", "prompt_31415", "prompt_27182"],
+    "中文(≥3字)": ["金属质感", "可爱的仓鼠", "机器人", "卡通风格", "古老的城堡"],
+    "中文(2字,LIKE)": ["仓鼠", "城堡", "宝剑", "茶壶", "恐龙"],
+}
+
+
+def make_prompt(i: int) -> str:
+    if i % 3 == 0:
+        return f"一只{random.choice(CN_ADJECTIVES)}{random.choice(CN_NOUNS)}，{random.choice(CN_ADJECTIVES)}风格"
+    prompt = f"a {random.choice(ADJECTIVES)} {random.choice(ADJECTIVES)} {random.choice(NOUNS)}"
+    if random.random() < 0.5:
+        prompt += f" {random.choice(EXTRAS)}"
+    return f"{prompt} prompt_{i}"
+
+
+def populate(rows: int):
+    """通过正常的插入路径写入（触发器同步维护全文索引）"""
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    start = datetime.now() - timedelta(days=365)
+    batch = []
+    for i in range(rows):
+        batch.append((uuid.uuid4().hex, 'text', make_prompt(i), 'preview',
+                      (start + timedelta(seconds=i * 30)).isoformat(), round(random.uniform(0.5, 1), 3)))
+        if len(batch) == 50000:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.close()
+
+
+def _insert(conn, batch):
+    conn.executemany('''
+        INSERT INTO model_history (id, input_type, input_content, stage, created_at, quality_score)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', batch)
+    conn.commit()
+
+
+def percentile(samples, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+def measure(fn, queries, runs: int):
+    samples, hits = [], 0
+    for i in range(runs):
+        started = time.perf_counter()
+        results = fn(queries[i % len(queries)])
+        samples.append(time.perf_counter() - started)
+        hits += len(results)
+    return percentile(samples, 0.5), percentile(samples, 0.99), hits / runs
+
+
+def legacy_like(query: str):
+    term = query.split()[0].rstrip('*')
+    return database.get_connection().execute('''
+        SELECT id, input_content FROM model_history
+        WHERE input_content LIKE ? ORDER BY created_at DESC LIMIT 20
+    ''', (f'%{term}%',)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史提示词搜索基准测试")
+    parser.add_argument("--rows", type=int, default=1000000, help="合成提示词数")
+    parser.add_argument("--runs", type=int, default=200, help="每类查询的执行次数")
+    parser.add_argument("--p99-target-ms", type=float, default=50, help="索引查询的p99目标（毫秒）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    try:
+        database.init_database()
+        if not database.FTS_ENABLED:
+            print("当前SQLite不支持FTS5 trigram，结果仅反映LIKE回退路径")
+
+        random.seed(42)
+        started = time.perf_counter()
+        populate(args.rows)
+        print(f"写入 {args.rows} 条提示词（含全文索引维护），耗时 {time.perf_counter() - started:.1f}s")
+        size_mb = sum(os.path.getsize(os.path.join(workdir, f)) for f in os.listdir(workdir)) / 2**20
+        print(f"数据库大小: {size_mb:.0f} MB")
+
+        for name in ("英文单词", "罕见词"):
+            p50, p99, _ = measure(legacy_like, QUERIES[name], 10)
+            print(f"旧做法 LIKE 扫描（{name}）: p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+        print(f"{'查询类型':<14} {'p50':>9} {'p99':>9} {'平均结果数':>10}  目标")
+        for name, queries in QUERIES.items():
+            p50, p99, hits = measure(
+                lambda q: database.search_model_history(q, limit=20), queries, args.runs
+            )
+            indexed = "LIKE" not in name
+            verdict = ("通过" if p99 <= args.p99_target_ms else "未达标") if indexed else "-"
+            print(f"{name:<14} {p50:>7.2f}ms {p99:>7.2f}ms {hits:>10.1f}  {verdict}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
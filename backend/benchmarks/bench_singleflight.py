@@ -0,0 +1,64 @@
+"""
+并发相同请求合并测试
+向模拟Meshy服务发起 N 个相同提示词的并发预览请求，验证只创建一个上游任务
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_singleflight -n 50
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from benchmarks.fake_meshy import FakeMeshyServer
+from meshy_client import MeshyClient
+from singleflight import SingleFlight
+
+
+async def burst(base_url: str, n: int, check_interval: float) -> dict:
+    client = MeshyClient(api_key="bench", base_url=base_url,
+                         poll_min_interval=check_interval, poll_max_interval=check_interval)
+    flight = SingleFlight()
+
+    async def preview(prompt: str) -> dict:
+        response = await client.create_preview_task(prompt=prompt)
+        return await client.wait_for_task_completion(response["result"])
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            flight.do("model_cache:same-prompt", lambda: preview("a red sports car"))
+            for _ in range(n)
+        ))
+    finally:
+        await client.aclose()
+    return {
+        "elapsed": time.perf_counter() - start,
+        "task_ids": {r["id"] for r in results},
+        "stats": flight.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发相同请求合并测试")
+    parser.add_argument("-n", "--concurrency", type=int, default=50)
+    parser.add_argument("--task-duration", type=float, default=1.0)
+    parser.add_argument("--check-interval", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with FakeMeshyServer(port=args.port, task_duration=args.task_duration) as server:
+        outcome = asyncio.run(burst(server.base_url, args.concurrency, args.check_interval))
+        create_calls = server.stats["create_calls"]
+
+    print(f"并发请求: {args.concurrency}, 耗时: {outcome['elapsed']:.2f}s")
+    print(f"上游创建任务次数: {create_calls}, 返回的任务ID: {sorted(outcome['task_ids'])}")
+    print(f"合并统计: {outcome['stats']}")
+    if create_calls != 1 or len(outcome["task_ids"]) != 1:
+        print("❌ 并发相同请求未被合并")
+        sys.exit(1)
+    print("✅ 所有请求共享同一个上游任务")
+
+
+if __name__ == "__main__":
+    main()
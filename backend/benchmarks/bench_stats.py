@@ -0,0 +1,125 @@
+"""
+统计接口基准测试
+- 读取代价：历史记录从 1万 增长到 100万 行时，对比旧实现（每次请求 COUNT/AVG 扫描 model_history）
+  与增量计数器（读取 stats_counters 小表）的耗时，并校验两者结果一致
+- 写入代价：触发器维护计数器对批量写入历史记录的影响
+- 多进程准确性：多个进程同时累加计数并定期合并写入，校验总数没有丢失
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_stats --rows 10000,100000,1000000 --processes 4 --increments 20000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+from benchmarks.bench_history import populate
+from stats import StatsRecorder, summarize_counters
+
+
+def legacy_summary() -> dict:
+    """旧实现：每次请求扫描全部历史记录"""
+    cursor = database.get_connection().cursor()
+    cursor.execute('SELECT COUNT(*), AVG(quality_score) FROM model_history')
+    total, average = cursor.fetchone()
+    return {'total_models': total, 'average_quality': round(average or 0.0, 4)}
+
+
+def counter_summary(recorder: StatsRecorder) -> dict:
+    history = summarize_counters(recorder.snapshot())['history']
+    return {'total_models': history['models'],
+            'average_quality': round(history['quality_sum'] / max(history['quality_count'], 1), 4)}
+
+
+def timed(fn, repeat: int) -> float:
+    """返回中位数耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def count_rows() -> int:
+    return database.get_connection().execute('SELECT COUNT(*) FROM model_history').fetchone()[0]
+
+
+def drop_stats_triggers():
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    for name in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS model_history_stats_{name}')
+    conn.commit()
+    conn.close()
+
+
+def increment_worker(args: tuple) -> int:
+    database_path, increments, flush_every = args
+    database.DATABASE_PATH = database_path
+    recorder = StatsRecorder()
+    for i in range(increments):
+        recorder.incr('bench.increments')
+        recorder.observe('bench', random.random() / 100)
+        if i % flush_every == flush_every - 1:
+            recorder.flush()
+    recorder.flush()
+    return increments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计接口基准测试")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="历史记录行数（逐级增加），逗号分隔")
+    parser.add_argument("--processes", type=int, default=4, help="并发累加计数的进程数")
+    parser.add_argument("--increments", type=int, default=20000, help="每个进程累加的次数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_stats_")
+    database.DATABASE_PATH = os.path.join(workdir, "models.db")
+    random.seed(42)
+    try:
+        database.init_database()
+        recorder = StatsRecorder()
+
+        print(f"{'历史记录':>10} {'全表统计':>10} {'计数器':>10}  结果一致")
+        for target in (int(x) for x in args.rows.split(",")):
+            populate(target - count_rows())
+            legacy = legacy_summary()
+            current = counter_summary(recorder)
+            print(f"{target:>10} {timed(legacy_summary, args.repeat):>8.2f}ms "
+                  f"{timed(lambda: counter_summary(recorder), args.repeat):>8.3f}ms  "
+                  f"{'是' if legacy == current else f'否 {legacy} != {current}'}")
+
+        # 触发器对写入的影响：同样写入 10万 行，有无计数触发器
+        rows = 100000
+        started = time.perf_counter()
+        populate(rows)
+        with_triggers = time.perf_counter() - started
+        drop_stats_triggers()
+        started = time.perf_counter()
+        populate(rows)
+        without_triggers = time.perf_counter() - started
+        print(f"写入 {rows} 行历史记录: 有计数触发器 {with_triggers:.2f}s，无触发器 {without_triggers:.2f}s")
+
+        flush_every = 500
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            pool.map(increment_worker, [(database.DATABASE_PATH, args.increments, flush_every)] * args.processes)
+        elapsed = time.perf_counter() - started
+        counters = summarize_counters(recorder.snapshot())
+        expected = args.processes * args.increments
+        print(f"{args.processes} 个进程各累加 {args.increments} 次（每 {flush_every} 次合并写入一次）"
+              f"用时 {elapsed:.2f}s: 计数 {counters['bench']['increments']} / {expected}，"
+              f"直方图 {counters['latency']['bench']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+端到端压测套件
+以生产模式启动服务（python main.py），连接独立进程中的模拟Meshy服务（可配置延迟、失败率、进度曲线、文件大小），
+按固定并发依次执行以下场景：
+- preview_cold：全新提示词的预览生成（创建Meshy任务、轮询、下载文件）
+- preview_cached：重复已生成的提示词（应全部命中缓存，不调用Meshy）
+- refine：对冷启动生成的预览做精细化
+- image：上传图片生成（少量不同图片反复上传，首次生成后命中缓存）
+- history：历史记录分页
+- files：下载已存储的模型和缩略图文件
+每个场景统计吞吐量、p50/p95/p99 延迟、失败数和期间模拟Meshy收到的上游调用次数，
+结果连同提交号写入JSON文件；--compare 指定之前的结果文件时逐场景对比，便于发现性能回退
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_suite --output bench_suite.json
+    python -m benchmarks.bench_suite --scenarios preview_cached,history --compare bench_suite.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+from PIL import Image
+
+from benchmarks.bench_workers import start_api, stop_api
+from benchmarks.fake_meshy import FakeMeshyProcess, PROGRESS_CURVES
+from benchmarks.fake_redis import FakeRedisProcess
+
+SCENARIOS = ["preview_cold", "preview_cached", "refine", "image", "history", "files"]
+SUBJECTS = ["car", "dragon", "castle", "robot", "chair", "tree", "ship", "lamp", "sword", "house"]
+STYLES = ["red", "wooden", "futuristic", "low poly", "rusty", "crystal", "golden", "cartoon"]
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def git_revision() -> Dict[str, object]:
+    """当前提交号及工作区是否有未提交的修改"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def make_image(index: int) -> bytes:
+    """生成内容互不相同的小尺寸PNG"""
+    rng = random.Random(index)
+    image = Image.new("RGB", (256, 256), tuple(rng.randrange(256) for _ in range(3)))
+    image.putpixel((index % 256, index // 256 % 256), (255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def upstream_stats(client: httpx.AsyncClient) -> Dict[str, int]:
+    return (await client.get("/__stats")).json()
+
+
+async def run_scenario(base_url: str, meshy_url: str, request: Request, total: int, concurrency: int) -> dict:
+    """以固定并发发起 total 个请求，返回吞吐量、延迟分位数和上游调用增量"""
+    timings, errors = [], 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client, \
+            httpx.AsyncClient(base_url=meshy_url, timeout=10) as meshy:
+        before = await upstream_stats(meshy)
+
+        async def worker():
+            nonlocal errors
+            for index in counter:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, index)
+                    response.raise_for_status()
+                    timings.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = await upstream_stats(meshy)
+
+    timings.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(timings) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(timings) * 1000, 2) if timings else 0.0,
+            "p50": round(percentile(timings, 0.50) * 1000, 2),
+            "p95": round(percentile(timings, 0.95) * 1000, 2),
+            "p99": round(percentile(timings, 0.99) * 1000, 2),
+            "max": round(timings[-1] * 1000, 2) if timings else 0.0,
+        },
+        "upstream": {name: after[name] - before.get(name, 0) for name in after},
+    }
+
+
+class Suite:
+    """各场景共享的状态：冷启动生成的任务ID和文件URL供 refine / files 场景使用"""
+
+    def __init__(self, args):
+        self.args = args
+        self.prompts = [f"{STYLES[i % len(STYLES)]} {SUBJECTS[i // len(STYLES) % len(SUBJECTS)]} benchmark {i}"
+                        for i in range(args.cold)]
+        self.images = [make_image(i) for i in range(args.images)]
+        self.task_ids: List[str] = []
+        self.file_urls: List[str] = []
+
+    def plan(self, name: str) -> tuple:
+        """返回 (请求函数, 请求数)"""
+        args = self.args
+        if name == "preview_cold":
+            async def request(client, index):
+                response = await client.post("/api/generate/text/preview",
+                                             json={"text": self.prompts[index], "reuse_similar": False})
+                if response.status_code == 200:
+                    data = response.json()
+                    self.task_ids.append(data["task_id"])
+                    self.file_urls += [url for url in (data.get("preview_url"), data.get("thumbnail_url"))
+                                       if url and url.startswith("/api/files/")]
+                return response
+            return request, len(self.prompts)
+
+        if name == "preview_cached":
+            async def request(client, index):
+                return await client.post("/api/generate/text/preview",
+                                         json={"text": self.prompts[index % len(self.prompts)]})
+            return request, args.requests
+
+        if name == "refine":
+            async def request(client, index):
+                return await client.post("/api/generate/text/refine", json={"task_id": self.task_ids[index]})
+            return request, len(self.task_ids)
+
+        if name == "image":
+            async def request(client, index):
+                content = self.images[index % len(self.images)]
+                return await client.post("/api/generate/image",
+                                         files={"file": (f"bench_{index % len(self.images)}.png", content, "image/png")})
+            return request, args.requests
+
+        if name == "history":
+            async def request(client, index):
+                return await client.get("/api/history", params={"limit": 50})
+            return request, args.requests
+
+        if name == "files":
+            async def request(client, index):
+                return await client.get(self.file_urls[index % len(self.file_urls)])
+            return request, args.requests if self.file_urls else 0
+
+        raise ValueError(f"未知场景: {name}")
+
+
+def compare(report: dict, baseline_path: str):
+    """逐场景对比吞吐量和 p95 延迟（比值 >1 表示吞吐量提高 / 延迟增加）"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n对比 {baseline_path}（提交 {str(baseline['meta'].get('commit'))[:10]}）")
+    print(f"{'场景':<16} {'吞吐量':>22} {'p95':>26}")
+    for name, current in report["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous:
+            print(f"{name:<16} 基线中没有此场景")
+            continue
+        rps = (previous["throughput_rps"], current["throughput_rps"])
+        p95 = (previous["latency_ms"]["p95"], current["latency_ms"]["p95"])
+        print(f"{name:<16} {rps[0]:>8.1f} -> {rps[1]:>8.1f} x{rps[1] / rps[0] if rps[0] else 0:.2f}"
+              f" {p95[0]:>9.1f}ms -> {p95[1]:>9.1f}ms x{p95[1] / p95[0] if p95[0] else 0:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测套件")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"要执行的场景，逗号分隔（refine / files 依赖 preview_cold）: {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个场景的并发请求数")
+    parser.add_argument("--requests", type=int, default=300, help="缓存/查询类场景的请求数")
+    parser.add_argument("--cold", type=int, default=40, help="冷启动生成的提示词数（refine 场景同样数量）")
+    parser.add_argument("--images", type=int, default=8, help="image 场景中不同图片的数量")
+    parser.add_argument("--workers", type=int, default=1, help="服务工作进程数")
+    parser.add_argument("--redis", action="store_true", help="使用模拟Redis（默认只用进程内缓存和SQLite）")
+    parser.add_argument("--task-duration", type=float, default=1.0, help="模拟Meshy任务耗时（秒）")
+    parser.add_argument("--duration-spread", type=float, default=0.5, help="任务耗时随机浮动比例")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟Meshy每次API调用的延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟Meshy状态查询和下载的失败率")
+    parser.add_argument("--progress-curve", choices=sorted(PROGRESS_CURVES), default="linear")
+    parser.add_argument("--asset-size", type=int, default=256 * 1024, help="模型文件大小（字节）")
+    parser.add_argument("--thumbnail-size", type=int, default=32 * 1024, help="缩略图大小（字节）")
+    parser.add_argument("--simulation-delay", type=float, default=0.2, help="图片生成（模拟）耗时（秒）")
+    parser.add_argument("--output", default="bench_suite.json", help="结果JSON文件")
+    parser.add_argument("--compare", default=None, help="作为基线对比的结果JSON文件")
+    parser.add_argument("--port", type=int, default=8792)
+    parser.add_argument("--meshy-port", type=int, default=8793)
+    parser.add_argument("--redis-port", type=int, default=6396)
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+    if {"refine", "files"} & set(scenarios) and "preview_cold" not in scenarios:
+        parser.error("refine / files 场景依赖 preview_cold")
+
+    storage_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    meshy = FakeMeshyProcess(port=args.meshy_port, task_duration=args.task_duration,
+                             duration_spread=args.duration_spread, latency=args.latency,
+                             failure_rate=args.failure_rate, progress_curve=args.progress_curve,
+                             asset_size=args.asset_size, thumbnail_size=args.thumbnail_size)
+    redis = FakeRedisProcess(port=args.redis_port) if args.redis else None
+    env = dict(
+        os.environ,
+        API_HOST="127.0.0.1",
+        API_RELOAD="false",
+        STORAGE_DIR=storage_dir,
+        MESHY_API_KEY="bench",
+        MESHY_BASE_URL=meshy.base_url,
+        MESHY_POLL_MIN_INTERVAL="0.1",
+        MESHY_POLL_MAX_INTERVAL="0.5",
+        SIMULATION_DELAY=str(args.simulation_delay),
+        REDIS_HOST="127.0.0.1" if redis else "",
+        REDIS_PORT=str(args.redis_port),
+        LOG_LEVEL="WARNING",
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    suite = Suite(args)
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+
+    meshy.start()
+    if redis:
+        redis.start()
+    try:
+        api = start_api(args.port, args.workers, env)
+        try:
+            print(f"{'场景':<16} {'请求':>6} {'失败':>5} {'吞吐量':>11} {'p50':>9} {'p95':>9} {'p99':>9}  上游调用")
+            for name in scenarios:
+                request, total = suite.plan(name)
+                if not total:
+                    print(f"{name:<16} 跳过（没有可用的请求）")
+                    continue
+                concurrency = min(args.concurrency, total)
+                result = asyncio.run(run_scenario(base_url, meshy.base_url, request, total, concurrency))
+                report["scenarios"][name] = result
+                latency = result["latency_ms"]
+                upstream = result["upstream"]
+                print(f"{name:<16} {total:>6} {result['errors']:>5} {result['throughput_rps']:>7.1f} 次/s "
+                      f"{latency['p50']:>7.1f}ms {latency['p95']:>7.1f}ms {latency['p99']:>7.1f}ms  "
+                      f"创建 {upstream['create_calls']} 查询 {upstream['status_calls']} 下载 {upstream['asset_calls']}")
+        finally:
+            stop_api(api)
+    finally:
+        if redis:
+            redis.kill()
+        meshy.stop()
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+缩略图渲染吞吐量测试
+对已存储的模型（GLB和OBJ，不含LOD和优化版本；也可指定文件或目录，都没有时生成合成模型）
+用 render_thumbnails 一次渲染 THUMBNAIL_SIZES 中的所有尺寸，统计：
+- 单进程逐个渲染：每个模型的耗时、每秒生成的缩略图数（即每核吞吐量）
+- 进程池：所有模型重复 --repeat 次同时提交，总吞吐量和按实际可用核数折算的每核吞吐量
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_thumbnails
+    python -m benchmarks.bench_thumbnails storage/models/ --sizes 512,256,128 --repeat 4
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_glb_optimize import stored_models
+from benchmarks.bench_lod import make_model
+from config import settings
+from file_manager import MODELS_DIR
+from process_pool import run_in_process, shutdown_process_pool
+from thumbnail_renderer import parse_sizes, render_thumbnails
+
+
+def collect(paths: list) -> list:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.endswith(('.glb', '.obj')) and '.lod' not in name and not name.endswith('.opt.glb'))
+        else:
+            files.append(path)
+    return files
+
+
+def file_type(path: str) -> str:
+    # 内容寻址存储中的文件没有扩展名，都是GLB
+    return os.path.splitext(path)[1][1:] or 'glb'
+
+
+async def render_concurrently(files: list, sizes: list, workdir: str) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(run_in_process(render_thumbnails, path, file_type(path),
+                                          os.path.join(workdir, f"pool_{index}"), sizes)
+                           for index, path in enumerate(files)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩略图渲染吞吐量测试")
+    parser.add_argument("paths", nargs="*", help="GLB/OBJ文件或目录（默认使用已存储的模型）")
+    parser.add_argument("--sizes", default=settings.THUMBNAIL_SIZES, help="缩略图边长，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="进程池测试中每个模型提交的次数")
+    parser.add_argument("--synthetic", default="5,6", help="没有模型时生成的合成模型细分级数")
+    args = parser.parse_args()
+
+    sizes = parse_sizes(args.sizes)
+    workdir = tempfile.mkdtemp(prefix="bench_thumbnails_")
+    try:
+        if args.paths:
+            files = collect(args.paths)
+        else:
+            files = stored_models()
+            if os.path.isdir(MODELS_DIR):
+                files += [path for path in collect([MODELS_DIR]) if path.endswith('.obj')]
+        if not files:
+            print("没有已存储的模型，使用合成模型")
+            files = [make_model(os.path.join(workdir, f"synthetic_{level}.glb"), level, 1024, seed=level)
+                     for level in (int(x) for x in args.synthetic.split(","))]
+
+        print(f"尺寸 {sizes}，渲染分辨率 {max(sizes) * 2}px")
+        print(f"{'模型':<32} {'耗时':>8} {'缩略图/秒':>10}")
+        # 预热（导入 trimesh 等）
+        render_thumbnails(files[0], file_type(files[0]), os.path.join(workdir, "warmup"), sizes)
+        total = 0.0
+        for index, path in enumerate(files):
+            started = time.perf_counter()
+            render_thumbnails(path, file_type(path), os.path.join(workdir, f"single_{index}"), sizes)
+            elapsed = time.perf_counter() - started
+            total += elapsed
+            print(f"{os.path.basename(path)[:32]:<32} {elapsed:>7.3f}s {len(sizes) / elapsed:>10.1f}")
+        print(f"\n单进程: {len(files) * len(sizes) / total:.1f} 缩略图/秒/核")
+
+        workers = min(settings.PROCESS_POOL_SIZE, os.cpu_count() or 1)
+        pool_files = files * args.repeat
+        asyncio.run(render_concurrently(files[:1], sizes, workdir))  # 启动进程池
+        elapsed = asyncio.run(render_concurrently(pool_files, sizes, workdir))
+        throughput = len(pool_files) * len(sizes) / elapsed
+        print(f"进程池（{settings.PROCESS_POOL_SIZE} 个进程，可用 {os.cpu_count()} 核）: {len(pool_files)} 次渲染 "
+              f"{elapsed:.2f}s，{throughput:.1f} 缩略图/秒，{throughput / workers:.1f} 缩略图/秒/核")
+    finally:
+        shutdown_process_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+图片上传内存占用测试
+分别启动两种服务进程，上传约 50MB 的JPEG，比较服务进程的峰值内存（/proc/<pid>/status 中的 VmHWM）
+相对空闲时的增长：
+- legacy：原实现，await file.read() 整体读入内存后计算MD5
+- streaming：当前的 /api/generate/image（按块写入暂存文件并计算SHA-256，Pillow 缩小解码并重新编码）
+每种模式下分别测试不同的并发上传数（内容各不相同，不命中缓存），每次测量使用新启动的进程。
+legacy 的内存随并发上传数线性增长；streaming 中上传本身只占用固定大小的读取缓冲，
+峰值来自图片解码（与像素尺寸有关，同时解码数受 IMAGE_PROCESS_CONCURRENCY 限制）；
+--payload bytes 上传随机字节（streaming 在解码时返回400），只测量接收上传本身的内存
+
+用法（在 backend 目录下执行，仅支持Linux）:
+    python -m benchmarks.bench_upload --size-mb 50 --concurrency 1,4,8
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+MODES = ("legacy", "streaming")
+
+
+def create_legacy_app():
+    """原实现的上传处理（只保留读取和哈希部分）"""
+    from fastapi import FastAPI, File, UploadFile
+
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return {"status": "running"}
+
+    @app.post("/api/generate/image")
+    async def generate_from_image(file: UploadFile = File(...)):
+        content = await file.read()
+        content_hash = hashlib.md5(content).hexdigest()
+        return {"hash": content_hash, "size": len(content)}
+
+    return app
+
+
+def make_jpeg(size_mb: float) -> bytes:
+    """生成约 size_mb 大小的噪声JPEG（噪声几乎无法压缩，边长按目标大小估算）"""
+    side = int((size_mb * 1e6 / 0.97) ** 0.5)
+    pixels = np.random.default_rng(0).integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def memory_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"无法读取 {field}")
+
+
+def start_server(mode: str, port: int, env: dict) -> subprocess.Popen:
+    if mode == "legacy":
+        command = [sys.executable, "-m", "benchmarks.bench_upload", "--serve-legacy", "--port", str(port)]
+    else:
+        command = [sys.executable, "main.py"]
+    process = subprocess.Popen(command, env=dict(env, API_PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} 服务启动失败")
+
+
+async def upload_all(base_url: str, payloads: list) -> list:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        async def one(index, content):
+            response = await client.post("/api/generate/image",
+                                         files={"file": (f"upload_{index}.jpg", content, "image/jpeg")})
+            return response.status_code
+        return await asyncio.gather(*(one(i, content) for i, content in enumerate(payloads)))
+
+
+def measure(mode: str, payloads: list, port: int, env: dict) -> dict:
+    process = start_server(mode, port, env)
+    try:
+        # 预热一次小文件上传，排除首次请求的导入和初始化开销
+        asyncio.run(upload_all(f"http://127.0.0.1:{port}", [make_jpeg(0.05)]))
+        idle = memory_kb(process.pid, "VmRSS")
+        started = time.perf_counter()
+        statuses = asyncio.run(upload_all(f"http://127.0.0.1:{port}", payloads))
+        elapsed = time.perf_counter() - started
+        peak = memory_kb(process.pid, "VmHWM")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"idle_mb": idle / 1024, "growth_mb": (peak - idle) / 1024, "elapsed": elapsed, "statuses": statuses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片上传内存占用测试")
+    parser.add_argument("--size-mb", type=float, default=50, help="每个上传文件的大小（MB）")
+    parser.add_argument("--concurrency", default="1,4,8", help="并发上传数，逗号分隔")
+    parser.add_argument("--payload", choices=("jpeg", "bytes"), default="jpeg", help="上传JPEG或随机字节")
+    parser.add_argument("--port", type=int, default=8794)
+    parser.add_argument("--serve-legacy", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_legacy:
+        import uvicorn
+        uvicorn.run(create_legacy_app(), host="127.0.0.1", port=args.port, log_level="warning")
+        return
+
+    base = make_jpeg(args.size_mb) if args.payload == "jpeg" else os.urandom(int(args.size_mb * 1e6))
+    # JPEG结束标记之后追加的字节不影响解码，但使每个文件的哈希不同
+    levels = [int(x) for x in args.concurrency.split(",")]
+    payloads = [base + f"#{i}".encode() for i in range(max(levels))]
+    storage_dir = tempfile.mkdtemp(prefix="bench_upload_")
+    env = dict(os.environ, API_HOST="127.0.0.1", API_RELOAD="false", API_WORKERS="1",
+               STORAGE_DIR=storage_dir, REDIS_HOST="", LOG_LEVEL="WARNING", SIMULATION_DELAY="0",
+               MAX_UPLOAD_SIZE=str(int(args.size_mb * 1.5 * 1024 * 1024)))
+    print(f"上传文件 {len(base) / 1e6:.1f}MB")
+    print(f"{'模式':<10} {'并发':>4} {'空闲RSS':>10} {'峰值增长':>10} {'每个上传':>10} {'耗时':>8}  状态码")
+    try:
+        for mode in MODES:
+            for concurrency in levels:
+                result = measure(mode, payloads[:concurrency], args.port, env)
+                print(f"{mode:<10} {concurrency:>6} {result['idle_mb']:>10.1f}MB {result['growth_mb']:>9.1f}MB "
+                      f"{result['growth_mb'] / concurrency:>9.1f}MB {result['elapsed']:>7.2f}s  {result['statuses']}")
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
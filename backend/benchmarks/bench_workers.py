@@ -0,0 +1,216 @@
+"""
+多工作进程吞吐量测试
+以生产模式（API_RELOAD=false）分别用 1 / 2 / 4 个工作进程启动服务（python main.py），
+共享同一个临时存储目录、模拟Meshy服务和模拟Redis，由多个客户端进程持续发起混合请求：
+- 60% 已生成提示词的预览请求（命中共享缓存，不调用Meshy）
+- 25% 历史记录分页
+- 15% 历史记录全文搜索
+统计各工作进程数下的吞吐量和延迟，并验证共享状态：提交的后台任务在任意工作进程上都能查询到结果，
+各工作进程返回的模型总数一致
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bench_workers --workers 1,2,4 --duration 10 --clients 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_meshy import FakeMeshyProcess
+from benchmarks.fake_redis import FakeRedisProcess
+
+SUBJECTS = ["car", "dragon", "castle", "robot", "chair", "tree", "ship", "lamp", "sword", "house"]
+STYLES = ["red", "wooden", "futuristic", "low poly", "rusty", "crystal", "golden", "cartoon"]
+SEARCH_TERMS = ["dragon", "wooden", "robot", "crystal", "castle"]
+
+
+def make_prompts(count: int) -> list:
+    rng = random.Random(7)
+    return [f"{rng.choice(STYLES)} {rng.choice(SUBJECTS)} number {i}" for i in range(count)]
+
+
+def start_api(port: int, workers: int, env: dict) -> subprocess.Popen:
+    env = dict(env, API_PORT=str(port), API_WORKERS=str(workers))
+    process = subprocess.Popen([sys.executable, "main.py"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("服务启动失败")
+
+
+def stop_api(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def seed(base_url: str, prompts: list):
+    """生成预览，写入历史记录和缓存"""
+    semaphore = asyncio.Semaphore(16)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def one(prompt):
+            async with semaphore:
+                response = await client.post("/api/generate/text/preview",
+                                             json={"text": prompt, "reuse_similar": False})
+                response.raise_for_status()
+        await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+
+async def client_loop(base_url: str, prompts: list, duration: float, concurrency: int, seed_value: int) -> dict:
+    rng = random.Random(seed_value)
+    timings, errors = [], 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                roll = rng.random()
+                started = time.perf_counter()
+                try:
+                    if roll < 0.6:
+                        response = await client.post("/api/generate/text/preview",
+                                                     json={"text": rng.choice(prompts)})
+                    elif roll < 0.85:
+                        response = await client.get("/api/history", params={"limit": 50})
+                    else:
+                        response = await client.get("/api/history/search",
+                                                    params={"q": rng.choice(SEARCH_TERMS)})
+                    response.raise_for_status()
+                    timings.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"timings": timings, "errors": errors}
+
+
+def run_client(args: tuple) -> dict:
+    return asyncio.run(client_loop(*args))
+
+
+async def check_shared_state(base_url: str, jobs: int) -> tuple:
+    """提交后台任务后用新连接轮询（请求落到不同工作进程），返回 (成功任务数, 各次返回的模型总数)"""
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        job_ids = []
+        for i in range(jobs):
+            response = await client.post("/api/jobs/text/preview",
+                                         json={"text": f"shared state check {time.time()} {i}"})
+            job_ids.append(response.json()["job_id"])
+
+    succeeded = set()
+    deadline = time.monotonic() + 60
+    while len(succeeded) < jobs and time.monotonic() < deadline:
+        for job_id in job_ids:
+            if job_id in succeeded:
+                continue
+            # 每次新建连接，使请求分散到不同工作进程
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+                status = (await client.get(f"/api/jobs/{job_id}")).json()["status"]
+            if status == "succeeded":
+                succeeded.add(job_id)
+        await asyncio.sleep(0.2)
+
+    totals = set()
+    for _ in range(10):
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            totals.add((await client.get("/api/stats")).json()["total_models"])
+    return len(succeeded), totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多工作进程吞吐量测试")
+    parser.add_argument("--workers", default="1,2,4", help="工作进程数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10.0, help="每轮压测时长（秒）")
+    parser.add_argument("--clients", type=int, default=4, help="客户端进程数")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个客户端进程的并发请求数")
+    parser.add_argument("--prompts", type=int, default=200, help="预先生成的提示词数")
+    parser.add_argument("--jobs", type=int, default=8, help="验证共享状态时提交的后台任务数")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--meshy-port", type=int, default=8791)
+    parser.add_argument("--redis-port", type=int, default=6395)
+    parser.add_argument("--no-redis", action="store_true", help="不使用Redis（缓存只在进程内和SQLite中共享）")
+    args = parser.parse_args()
+
+    storage_dir = tempfile.mkdtemp(prefix="bench_workers_")
+    meshy = FakeMeshyProcess(port=args.meshy_port, task_duration=0.2, asset_size=16 * 1024)
+    redis = None if args.no_redis else FakeRedisProcess(port=args.redis_port)
+    env = dict(
+        os.environ,
+        API_HOST="127.0.0.1",
+        API_RELOAD="false",
+        STORAGE_DIR=storage_dir,
+        MESHY_API_KEY="bench",
+        MESHY_BASE_URL=meshy.base_url,
+        MESHY_POLL_MIN_INTERVAL="0.1",
+        MESHY_POLL_MAX_INTERVAL="0.2",
+        REDIS_HOST="" if args.no_redis else "127.0.0.1",
+        REDIS_PORT=str(args.redis_port),
+        LOG_LEVEL="WARNING",
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    prompts = make_prompts(args.prompts)
+
+    meshy.start()
+    if redis:
+        redis.start()
+    try:
+        api = start_api(args.port, 1, env)
+        try:
+            started = time.perf_counter()
+            asyncio.run(seed(base_url, prompts))
+            print(f"生成 {len(prompts)} 个预览用时 {time.perf_counter() - started:.1f}s")
+        finally:
+            stop_api(api)
+
+        print(f"CPU核数: {os.cpu_count()}，客户端进程: {args.clients} x {args.concurrency} 并发，"
+              f"Redis: {'关闭' if args.no_redis else '模拟Redis'}")
+        print(f"{'工作进程':<6} {'请求数':>8} {'失败':>6} {'吞吐量':>12} {'p50':>9} {'p99':>9}  共享状态")
+        baseline = None
+        for workers in (int(x) for x in args.workers.split(",")):
+            api = start_api(args.port, workers, env)
+            try:
+                with multiprocessing.Pool(args.clients) as pool:
+                    results = pool.map(run_client, [
+                        (base_url, prompts, args.duration, args.concurrency, workers * 100 + i)
+                        for i in range(args.clients)
+                    ])
+                succeeded, totals = asyncio.run(check_shared_state(base_url, args.jobs))
+            finally:
+                stop_api(api)
+
+            timings = sorted(t for result in results for t in result["timings"])
+            errors = sum(result["errors"] for result in results)
+            throughput = len(timings) / args.duration
+            baseline = baseline or throughput
+            p99 = timings[int(len(timings) * 0.99)] if timings else 0
+            print(f"{workers:<10} {len(timings):>8} {errors:>6} {throughput:>8.0f} 次/s "
+                  f"{statistics.median(timings) * 1000 if timings else 0:>7.1f}ms {p99 * 1000:>7.1f}ms  "
+                  f"x{throughput / baseline:.2f}，任务 {succeeded}/{args.jobs} 完成，模型总数 {sorted(totals)}")
+    finally:
+        if redis:
+            redis.kill()
+        meshy.stop()
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+本地模拟的Meshy API服务
+实现 text-to-3d 和 image-to-3d 任务的创建与状态查询接口，用于离线基准测试；
+GET /__stats 返回各接口的调用次数，便于统计被测服务实际发起的上游调用
+"""
+import asyncio
+import itertools
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+
+# 任务进度曲线：已用时间比例 -> 进度比例
+PROGRESS_CURVES: Dict[str, Callable[[float], float]] = {
+    "linear": lambda t: t,
+    "ease-out": lambda t: 1 - (1 - t) ** 2,  # 前期进展快、接近完成时变慢
+    "stall": lambda t: min(t * 2, 0.99),      # 很快到 99% 后停住直到完成
+}
+
+
+def create_app(task_duration: float = 2.0, asset_size: int = 64 * 1024,
+               duration_spread: float = 0.0, rate_limit: Optional[int] = None,
+               failure_rate: float = 0.0, drop_rate: float = 0.0,
+               bandwidth: Optional[float] = None, latency: float = 0.0,
+               progress_curve: str = "linear", thumbnail_size: Optional[int] = None) -> FastAPI:
+    """
+    创建模拟Meshy服务
+
+    Args:
+        task_duration: 每个任务从创建到 SUCCEEDED 的耗时（秒）
+        asset_size: 模拟模型/缩略图文件大小（字节）
+        duration_spread: 任务耗时的随机浮动比例，实际耗时在 [1, 1 + spread] 倍之间
+        rate_limit: 每秒允许的状态查询次数，超出时返回429
+        failure_rate: 状态查询和文件下载随机返回503的概率
+        drop_rate: 文件下载在传输中途断开连接的概率（用于验证断点续传）
+        bandwidth: 每个下载连接的带宽上限（字节/秒），模拟CDN单连接限速
+        latency: 每次API调用（创建任务、查询状态）额外的响应延迟（秒）
+        progress_curve: 进度曲线，见 PROGRESS_CURVES
+        thumbnail_size: 缩略图大小（字节），默认与 asset_size 相同
+    """
+    curve = PROGRESS_CURVES[progress_curve]
+    app = FastAPI(title="Fake Meshy API")
+    app.state.tasks: Dict[str, Dict[str, Any]] = {}
+    app.state.stats = {"create_calls": 0, "status_calls": 0, "asset_calls": 0,
+                       "rate_limited": 0, "injected_failures": 0, "dropped_streams": 0,
+                       "asset_bytes": 0, "image_create_calls": 0}
+    window = {"second": 0, "count": 0}
+    counter = itertools.count(1)
+    block = bytes(range(256)) * 4096  # 1 MiB 的重复数据块
+
+    def task_view(task_id: str, base_url: str) -> Dict[str, Any]:
+        task = app.state.tasks[task_id]
+        elapsed = time.monotonic() - task["created"]
+        duration = task["done_at"] - task["created"]
+        fraction = elapsed / duration if duration else 1
+        progress = 100 if fraction >= 1 else int(curve(fraction) * 100)
+        result = {"id": task_id, "mode": task["mode"], "progress": progress}
+        if progress >= 100:
+            result["status"] = "SUCCEEDED"
+            result["model_urls"] = {"glb": f"{base_url}/assets/{task_id}.glb"}
+            result["thumbnail_url"] = f"{base_url}/assets/{task_id}.png"
+            if thumbnail_size is not None:
+                result["thumbnail_url"] += f"?size={thumbnail_size}"
+        else:
+            result["status"] = "IN_PROGRESS" if progress > 0 else "PENDING"
+        return result
+
+    def add_task(mode: str) -> str:
+        task_id = f"fake-{next(counter):06d}"
+        created = time.monotonic()
+        duration = task_duration * (1 + random.random() * duration_spread)
+        app.state.tasks[task_id] = {"mode": mode, "created": created, "done_at": created + duration}
+        return task_id
+
+    @app.post("/openapi/v2/text-to-3d")
+    async def create_task(body: Dict[str, Any]):
+        app.state.stats["create_calls"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return {"result": add_task(body.get("mode", "preview"))}
+
+    @app.post("/openapi/v1/image-to-3d")
+    async def create_image_task(body: Dict[str, Any]):
+        app.state.stats["create_calls"] += 1
+        app.state.stats["image_create_calls"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        image_url = body.get("image_url") or ""
+        if not image_url.startswith(("http://", "https://", "data:image/")):
+            raise HTTPException(status_code=400, detail="image_url must be a URL or an image data URI")
+        return {"result": add_task("image")}
+
+    @app.get("/openapi/v1/image-to-3d/{task_id}")
+    @app.get("/openapi/v2/text-to-3d/{task_id}")
+    async def get_task(task_id: str):
+        app.state.stats["status_calls"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if rate_limit:
+            second = int(time.monotonic())
+            if window["second"] != second:
+                window["second"], window["count"] = second, 0
+            window["count"] += 1
+            if window["count"] > rate_limit:
+                app.state.stats["rate_limited"] += 1
+                return Response(status_code=429, headers={"Retry-After": "1"})
+        if failure_rate and random.random() < failure_rate:
+            app.state.stats["injected_failures"] += 1
+            return Response(status_code=503)
+        if task_id not in app.state.tasks:
+            raise HTTPException(status_code=404, detail="task not found")
+        return task_view(task_id, app.state.base_url)
+
+    @app.get("/assets/{name}")
+    async def get_asset(name: str, request: Request, size: Optional[int] = None):
+        """返回指定大小的模拟文件，支持 Range 请求；size 查询参数可覆盖默认大小"""
+        app.state.stats["asset_calls"] += 1
+        if failure_rate and random.random() < failure_rate:
+            app.state.stats["injected_failures"] += 1
+            return Response(status_code=503)
+
+        total = asset_size if size is None else size
+        start = 0
+        headers = {"Accept-Ranges": "bytes"}
+        status_code = 200
+        range_header = request.headers.get("range")
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-", 1)[0])
+            if start >= total:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{total - 1}/{total}"
+        headers["Content-Length"] = str(total - start)
+        drop_at = start + (total - start) // 2 if drop_rate and random.random() < drop_rate else None
+
+        async def body():
+            position = start
+            while position < total:
+                if drop_at is not None and position >= drop_at:
+                    app.state.stats["dropped_streams"] += 1
+                    raise ConnectionError("模拟传输中断")
+                offset = position % len(block)
+                chunk = block[offset:offset + min(len(block) - offset, total - position)]
+                position += len(chunk)
+                app.state.stats["asset_bytes"] += len(chunk)
+                yield chunk
+                if bandwidth:
+                    await asyncio.sleep(len(chunk) / bandwidth)
+
+        return StreamingResponse(body(), status_code=status_code, headers=headers,
+                                 media_type="application/octet-stream")
+
+    @app.get("/__stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+class FakeMeshyServer:
+    """在后台线程中运行模拟服务，便于基准脚本直接使用"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, **app_kwargs):
+        self.host = host
+        self.port = port
+        self.app = create_app(**app_kwargs)
+        self.app.state.base_url = self.base_url
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self.app.state.stats
+
+    def start(self):
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeMeshyProcess:
+    """在独立进程中运行模拟服务，避免与被测客户端争用GIL"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, **options):
+        self.host = host
+        self.port = port
+        self.options = options
+        self._process: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        command = [sys.executable, "-m", "benchmarks.fake_meshy", "--host", self.host, "--port", str(self.port)]
+        for name, value in self.options.items():
+            if value is not None:
+                command += [f"--{name.replace('_', '-')}", str(value)]
+        self._process = subprocess.Popen(command)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("模拟Meshy服务启动失败")
+
+    def stop(self):
+        if self._process:
+            self._process.terminate()
+            self._process.wait(timeout=5)
+            self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟Meshy API服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--task-duration", type=float, default=2.0)
+    parser.add_argument("--duration-spread", type=float, default=0.0)
+    parser.add_argument("--asset-size", type=int, default=64 * 1024)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--progress-curve", choices=sorted(PROGRESS_CURVES), default="linear")
+    parser.add_argument("--thumbnail-size", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeMeshyServer(
+        host=args.host, port=args.port, task_duration=args.task_duration,
+        duration_spread=args.duration_spread, asset_size=args.asset_size,
+        rate_limit=args.rate_limit, failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+        bandwidth=args.bandwidth, latency=args.latency, progress_curve=args.progress_curve,
+        thumbnail_size=args.thumbnail_size
+    )
+    uvicorn.run(server.app, host=server.host, port=server.port, log_level="warning")
@@ -0,0 +1,199 @@
+"""
+本地模拟的Redis服务
+实现缓存和合并锁用到的少量命令（PING / GET / SET EX PX NX / SETEX / PTTL / DEL / EXISTS）。
+FakeRedisProcess 在独立进程中运行，可以随时杀死（数据丢失）、重启，或暂停进程
+（接受连接但不响应，相当于Redis卡死），用于验证熔断和自动恢复
+"""
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeRedisServer:
+    """在后台线程中运行的RESP协议服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self.host = host
+        self.port = port
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: List[asyncio.StreamWriter] = []
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"connections": 0, "commands": 0}
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, reuse_address=True)
+        )
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """断开所有连接并丢弃数据"""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for writer in self._writers:
+                writer.transport.abort()
+            self._writers.clear()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._data.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.append(writer)
+        self.stats["connections"] += 1
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                self.stats["commands"] += 1
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    def _get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def _execute(self, args: List[str]) -> bytes:
+        name = args[0].upper()
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name in ("CLIENT", "SELECT"):
+            return b"+OK\r\n"
+        if name == "GET":
+            entry = self._get(args[1])
+            if entry is None:
+                return b"$-1\r\n"
+            value = entry[0].encode()
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == "SET":
+            key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+            expires_at = None
+            if "EX" in options:
+                expires_at = time.time() + int(args[3 + options.index("EX") + 1])
+            if "PX" in options:
+                expires_at = time.time() + int(args[3 + options.index("PX") + 1]) / 1000
+            if "NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            self._data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if name == "SETEX":
+            self._data[args[1]] = (args[3], time.time() + int(args[2]))
+            return b"+OK\r\n"
+        if name == "PTTL":
+            entry = self._get(args[1])
+            if entry is None:
+                return b":-2\r\n"
+            if entry[1] is None:
+                return b":-1\r\n"
+            return b":%d\r\n" % int((entry[1] - time.time()) * 1000)
+        if name in ("DEL", "EXISTS"):
+            count = sum(self._get(key) is not None for key in args[1:])
+            if name == "DEL":
+                for key in args[1:]:
+                    self._data.pop(key, None)
+            return b":%d\r\n" % count
+        return b"-ERR unknown command '%s'\r\n" % args[0].encode()
+
+
+class FakeRedisProcess:
+    """在独立进程中运行模拟Redis，避免与被测客户端争用GIL，并可模拟进程被杀死或卡死"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self.host = host
+        self.port = port
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        command = [sys.executable, "-m", "benchmarks.fake_redis", "--host", self.host, "--port", str(self.port)]
+        self._process = subprocess.Popen(command)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and self._process.poll() is None:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        self.kill()
+        raise RuntimeError("模拟Redis服务启动失败")
+
+    def kill(self):
+        """SIGKILL，已建立的连接被重置，数据丢失"""
+        if self._process:
+            self.resume()
+            self._process.kill()
+            self._process.wait(timeout=5)
+            self._process = None
+
+    def pause(self):
+        """SIGSTOP，连接保持但不再响应"""
+        if self._process:
+            os.kill(self._process.pid, signal.SIGSTOP)
+
+    def resume(self):
+        if self._process:
+            os.kill(self._process.pid, signal.SIGCONT)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.kill()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟Redis服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = FakeRedisServer(host=args.host, port=args.port)
+    server.start()
+    server._thread.join()
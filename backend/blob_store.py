@@ -0,0 +1,140 @@
+"""
+内容寻址的文件存储
+下载的模型和预览图按内容的SHA-256存放在分片目录 storage/blobs/ab/cd/<sha256> 中，
+相同内容只保存一份（不带扩展名，媒体类型由逻辑路径决定）；原有的逻辑路径（如 models/model_xxx.glb）作为引用记录在 models.db，
+/api/files 通过引用解析到实际文件
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+from database import (
+    get_asset_ref, add_asset_ref, remove_asset_ref, remove_asset_refs,
+    get_asset_stats, touch_asset_refs, purge_asset_blobs
+)
+
+STORAGE_BASE = settings.STORAGE_DIR
+BLOBS_DIR = os.path.join(STORAGE_BASE, 'blobs')
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 访问记录先累积在内存中，由存储管理器定期批量写入，避免每次读文件都写数据库
+_pending_access: Dict[str, Tuple[float, int]] = {}
+_access_lock = threading.Lock()
+
+
+def blob_path(sha256: str) -> str:
+    """文件实体的存放路径（两级分片目录，避免单目录文件过多）"""
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def hash_file(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_file(path: str, ref: str) -> str:
+    """
+    将文件移入存储并把逻辑路径指向它；内容已存在时直接丢弃该文件
+
+    Args:
+        path: 已下载完成的临时文件，调用后不再存在
+        ref: 逻辑路径（相对 storage 目录）
+
+    Returns:
+        实际文件路径
+    """
+    sha256 = hash_file(path)
+    size = os.path.getsize(path)
+    target = blob_path(sha256)
+
+    # 先登记引用（引用计数加一），再放置文件：不再被引用的文件只在写线程中确认后删除（见 _delete_blobs），
+    # 登记之后实体不会再被删除，此时文件缺失（不存在或刚被淘汰）就用本次的文件补上
+    orphan = add_asset_ref(ref, sha256, size)
+    if orphan:
+        _delete_blobs([orphan])
+    try:
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+    except OSError:
+        release(ref)
+        raise
+    return target
+
+
+def resolve(ref: str) -> Optional[str]:
+    """解析逻辑路径对应的实际文件，未登记或文件缺失时返回None"""
+    blob = get_asset_ref(ref)
+    if not blob:
+        return None
+    path = blob_path(blob['sha256'])
+    if not os.path.exists(path):
+        return None
+    record_access(ref)
+    return path
+
+
+def record_access(ref: str):
+    """记录一次访问（用于LRU/LFU淘汰）"""
+    with _access_lock:
+        _, hits = _pending_access.get(ref, (0.0, 0))
+        _pending_access[ref] = (time.time(), hits + 1)
+
+
+def flush_access() -> int:
+    """将累积的访问记录写入数据库，返回写入的路径数"""
+    global _pending_access
+    with _access_lock:
+        pending, _pending_access = _pending_access, {}
+    if pending and not touch_asset_refs(pending):
+        # 写入失败时放回，下次再试
+        with _access_lock:
+            for ref, (last_access, hits) in pending.items():
+                current_access, current_hits = _pending_access.get(ref, (0.0, 0))
+                _pending_access[ref] = (max(last_access, current_access), hits + current_hits)
+        return 0
+    return len(pending)
+
+
+def release(ref: str) -> bool:
+    """删除逻辑路径引用，实体不再被引用时删除文件；返回是否删除了文件"""
+    orphan = remove_asset_ref(ref)
+    return bool(orphan and _delete_blobs([orphan]))
+
+
+def release_many(refs: Iterable[str]) -> List[Dict]:
+    """批量删除引用，返回因此删除的文件实体"""
+    orphans = remove_asset_refs(refs)
+    return _delete_blobs(orphans) if orphans else []
+
+
+def get_dedup_stats() -> Dict:
+    """去重统计：逻辑大小、实际占用、去重比例和节省的空间"""
+    stats = get_asset_stats()
+    logical = stats['logical_bytes']
+    physical = stats['physical_bytes']
+    stats['saved_bytes'] = logical - physical
+    stats['dedup_ratio'] = round(logical / physical, 3) if physical else 1.0
+    return stats
+
+
+def _delete_blobs(blobs: List[Dict]) -> List[Dict]:
+    """删除不再被引用的实体文件（期间被重新存入的实体保留），返回实际删除的实体"""
+    return purge_asset_blobs(blobs, _remove_blob_file)
+
+
+def _remove_blob_file(sha256: str):
+    try:
+        os.remove(blob_path(sha256))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,241 @@
+"""
+分层缓存
+进程内LRU（最多 MAX_CACHE_SIZE 条） -> Redis（多进程共享） -> SQLite model_cache 表（持久化）。
+读取逐层查找，下层命中时按剩余有效期回填上层；写入同时写入所有层，各层使用同一过期时间
+（CACHE_TTL）。批量读写时每层只需一次往返（Redis管道、SQLite IN查询）。
+Redis 不可用、熔断或出错时跳过该层，SQLite 中的过期记录由后台协程分批清理
+（多个工作进程中只有持有 cache_sweep 租约的进程执行）
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from database import (
+    save_to_cache_db, get_cache_entries_db, delete_from_cache_db, sweep_expired_cache,
+    acquire_lease, release_lease
+)
+from redis_pool import RedisPool, RedisUnavailable
+from stats import stats_recorder
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """容量有限、带过期时间的进程内LRU缓存（线程安全）"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (值, 过期时间)，不存在或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def set(self, key: str, value: Any, expires_at: float):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class TieredCache:
+    """进程内LRU -> Redis -> SQLite 的读穿透/写穿透缓存"""
+
+    def __init__(self, redis: Optional[RedisPool] = None, max_size: Optional[int] = None,
+                 ttl: Optional[int] = None, sweep_interval: Optional[float] = None,
+                 sweep_batch: Optional[int] = None):
+        """
+        Args:
+            redis: Redis连接池，为None时只用进程内和SQLite两层
+            max_size: 进程内LRU的最大条目数
+            ttl: 默认过期时间（秒）
+            sweep_interval: 清理SQLite过期记录的间隔（秒）
+            sweep_batch: 每批删除的过期记录数
+        """
+        self.redis = redis
+        self.ttl = ttl or settings.CACHE_TTL
+        self.sweep_interval = sweep_interval or settings.CACHE_SWEEP_INTERVAL
+        self.sweep_batch = sweep_batch or settings.CACHE_SWEEP_BATCH
+        self.memory = LRUCache(settings.MAX_CACHE_SIZE if max_size is None else max_size)
+        self._sweeper: Optional[asyncio.Task] = None
+        self.redis_stats = {"hits": 0, "misses": 0, "unavailable": 0}  # unavailable: 熔断或出错而跳过的调用
+        self.sqlite_stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """逐层读取，下层命中时回填上层"""
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """
+        批量读取：进程内未命中的键用一次Redis管道查询，仍未命中的键用一次SQLite查询；
+        下层命中的记录同样一次管道回填Redis
+        """
+        found: Dict[str, Dict] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            entry = self.memory.get(key)
+            if entry is not None:
+                found[key] = entry[0]
+            else:
+                missing.append(key)
+        stats_recorder.incr("cache.memory_hits", len(found))
+        stats_recorder.incr("cache.memory_misses", len(missing))
+        if not missing:
+            return found
+
+        for key, (value, expires_at) in (await self._redis_get_many(missing)).items():
+            self.memory.set(key, value, expires_at)
+            found[key] = value
+        missing = [key for key in missing if key not in found]
+        if not missing:
+            return found
+
+        entries = get_cache_entries_db(missing)
+        self.sqlite_stats["hits"] += len(entries)
+        self.sqlite_stats["misses"] += len(missing) - len(entries)
+        stats_recorder.incr("cache.sqlite_hits", len(entries))
+        stats_recorder.incr("cache.sqlite_misses", len(missing) - len(entries))
+        backfill = {}
+        for key, (value, expires_at) in entries.items():
+            expires_at = expires_at or time.time() + self.ttl
+            self.memory.set(key, value, expires_at)
+            backfill[key] = (value, expires_at)
+            found[key] = value
+        await self._redis_set_many(backfill)
+        return found
+
+    async def set(self, key: str, value: Dict, ttl: Optional[int] = None):
+        """写入所有层；SQLite 写入不等待提交，由写线程批量完成"""
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, Dict], ttl: Optional[int] = None):
+        expires_at = time.time() + (ttl or self.ttl)
+        for key, value in items.items():
+            self.memory.set(key, value, expires_at)
+            save_to_cache_db(key, value, expires_at, wait=False)
+        await self._redis_set_many({key: (value, expires_at) for key, value in items.items()})
+
+    async def delete(self, key: str):
+        self.memory.delete(key)
+        await self._redis_call(lambda client: client.delete(key))
+        delete_from_cache_db(key)
+
+    async def _redis_call(self, op: Callable[[Any], Awaitable[Any]]) -> Optional[Any]:
+        """执行Redis操作，未配置、熔断或失败时返回None（按未命中处理）"""
+        if self.redis is None or not self.redis.enabled:
+            return None
+        try:
+            return await self.redis.run(op)
+        except RedisUnavailable as e:
+            self.redis_stats["unavailable"] += 1
+            stats_recorder.incr("cache.redis_unavailable")
+            logger.debug(f"跳过Redis缓存层: {e}")
+            return None
+
+    async def _redis_get_many(self, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        async def op(client):
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            return await pipe.execute()
+
+        replies = await self._redis_call(op)
+        if replies is None:
+            return {}
+        now = time.time()
+        entries = {}
+        for key, cached, pttl in zip(keys, replies[::2], replies[1::2]):
+            if cached is None:
+                continue
+            # pttl 为 -1 表示没有过期时间
+            entries[key] = json.loads(cached), now + (pttl / 1000 if pttl and pttl > 0 else self.ttl)
+        self.redis_stats["hits"] += len(entries)
+        self.redis_stats["misses"] += len(keys) - len(entries)
+        stats_recorder.incr("cache.redis_hits", len(entries))
+        stats_recorder.incr("cache.redis_misses", len(keys) - len(entries))
+        return entries
+
+    async def _redis_set_many(self, entries: Dict[str, Tuple[Any, float]]):
+        now = time.time()
+        entries = {key: entry for key, entry in entries.items() if entry[1] > now}
+        if not entries:
+            return
+
+        async def op(client):
+            pipe = client.pipeline(transaction=False)
+            for key, (value, expires_at) in entries.items():
+                pipe.set(key, json.dumps(value), px=max(1, int((expires_at - now) * 1000)))
+            return await pipe.execute()
+
+        await self._redis_call(op)
+
+    def sweep(self) -> int:
+        """删除SQLite中所有已过期的记录（分批执行，避免长时间占用写线程），返回删除条数"""
+        total = 0
+        while True:
+            deleted = sweep_expired_cache(self.sweep_batch)
+            total += deleted
+            if deleted < self.sweep_batch:
+                break
+        self.sqlite_stats["expired"] += total
+        return total
+
+    def start(self):
+        """启动后台清理协程"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._run_sweeper())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+            await asyncio.to_thread(release_lease, 'cache_sweep')
+
+    async def _run_sweeper(self):
+        while True:
+            try:
+                leader = await asyncio.to_thread(acquire_lease, 'cache_sweep', self.sweep_interval * 3)
+                deleted = await asyncio.to_thread(self.sweep) if leader else 0
+                if deleted:
+                    logger.info(f"清理过期缓存 {deleted} 条")
+            except Exception as e:
+                logger.error(f"清理过期缓存失败: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def get_stats(self) -> Dict:
+        return {
+            "memory": {**self.memory.stats, "size": len(self.memory), "max_size": self.memory.max_size},
+            "redis": {**self.redis_stats, "enabled": self.redis is not None and self.redis.enabled},
+            "sqlite": dict(self.sqlite_stats),
+        }
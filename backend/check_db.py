@@ -1,6 +1,7 @@
-from database import get_model_history
+from database import init_database, get_model_history
 import json
 
+init_database()
 history = get_model_history()
 print('数据库中的历史记录:')
 for i, model in enumerate(history[:3]):
@@ -17,32 +17,100 @@ class Settings:
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
     REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD", "") or None
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # 连接池上限
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))  # 连接和命令超时（秒）
+    REDIS_HEALTH_CHECK_INTERVAL: int = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))  # 空闲连接复用前的检查间隔（秒）
+    REDIS_FAILURE_THRESHOLD: int = int(os.getenv("REDIS_FAILURE_THRESHOLD", "3"))  # 连续失败多少次后熔断
+    REDIS_RECOVERY_INTERVAL: float = float(os.getenv("REDIS_RECOVERY_INTERVAL", "2"))  # 熔断期间探测恢复的间隔（秒）
+    SINGLEFLIGHT_LOCK_TTL: int = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", "60"))  # 跨进程合并锁的过期时间（秒），执行期间自动续期
     
     # API配置
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     API_RELOAD: bool = os.getenv("API_RELOAD", "true").lower() == "true"
+    API_WORKERS: int = int(os.getenv("API_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))  # 工作进程数，大于1时不支持自动重载
+    API_SERVER: str = os.getenv("API_SERVER", "uvicorn")  # 多进程启动方式: uvicorn / gunicorn（需安装gunicorn）
     
     # 3D模型生成API配置
     MESHY_API_KEY: Optional[str] = os.getenv("MESHY_API_KEY")
     MESHY_BASE_URL: str = os.getenv("MESHY_BASE_URL", "https://api.meshy.ai")
+    MESHY_POLL_MIN_INTERVAL: float = float(os.getenv("MESHY_POLL_MIN_INTERVAL", "1"))  # 任务状态最短轮询间隔（秒）
+    MESHY_POLL_MAX_INTERVAL: float = float(os.getenv("MESHY_POLL_MAX_INTERVAL", "10"))  # 任务状态最长轮询间隔（秒）
+    MESHY_TIMEOUT: float = float(os.getenv("MESHY_TIMEOUT", "30"))  # Meshy API请求超时（秒）
+    SIMULATION_DELAY: float = float(os.getenv("SIMULATION_DELAY", "2"))  # 未配置Meshy时模拟生成的耗时（秒）
+    
+    # HTTP连接池配置（Meshy API与文件下载共用）
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "100"))
+    HTTP_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_PER_HOST_LIMIT: int = int(os.getenv("HTTP_PER_HOST_LIMIT", "16"))  # 每个主机的最大并发请求数
+    HTTP_MAX_RETRIES: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))  # 幂等请求的最大重试次数
+    HTTP_RETRY_BACKOFF: float = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))  # 重试退避基数（秒）
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    DOWNLOAD_TIMEOUT: float = float(os.getenv("DOWNLOAD_TIMEOUT", "60"))  # 文件下载读取超时（秒）
+    DOWNLOAD_CONCURRENCY: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))  # 全局同时下载的文件数
+    DOWNLOAD_CHUNK_SIZE: int = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 下载写入块大小（字节）
+    
+    # 图片上传配置
+    MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024)))  # 上传图片的大小上限（字节）
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))  # 读取上传内容的块大小（字节）
+    UPLOAD_MAX_DIMENSION: int = int(os.getenv("UPLOAD_MAX_DIMENSION", "2048"))  # 规范化后图片的最大边长（像素）
+    UPLOAD_MAX_PIXELS: int = int(os.getenv("UPLOAD_MAX_PIXELS", str(50_000_000)))  # 解码前的像素上限，防止解压炸弹
+    UPLOAD_JPEG_QUALITY: int = int(os.getenv("UPLOAD_JPEG_QUALITY", "90"))  # 重新编码的JPEG质量
+    PUBLIC_BASE_URL: str = os.getenv("PUBLIC_BASE_URL", "")  # 服务的公网地址，设置后Meshy通过 /api/files 获取上传的图片，否则以Data URI提交
+    IMAGE_PROCESS_CONCURRENCY: int = int(os.getenv("IMAGE_PROCESS_CONCURRENCY", "2"))  # 每个工作进程同时处理的图片数
     
     # 文件存储配置
+    STORAGE_DIR: str = os.getenv("STORAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage"))  # 数据库和模型文件目录，多个实例共享时指向同一卷
     MODEL_STORAGE_PATH: str = os.getenv("MODEL_STORAGE_PATH", "./storage/models")
     PREVIEW_STORAGE_PATH: str = os.getenv("PREVIEW_STORAGE_PATH", "./storage/previews")
+    MODEL_STORAGE_QUOTA: int = int(os.getenv("MODEL_STORAGE_QUOTA", "0"))  # 模型文件配额（字节），0表示不限制
+    PREVIEW_STORAGE_QUOTA: int = int(os.getenv("PREVIEW_STORAGE_QUOTA", "0"))  # 预览图配额（字节），0表示不限制
+    CONVERTED_STORAGE_QUOTA: int = int(os.getenv("CONVERTED_STORAGE_QUOTA", str(1 << 30)))  # 按需转换的格式缓存配额（字节），0表示不限制
+    EAGER_DOWNLOAD_FORMATS: str = os.getenv("EAGER_DOWNLOAD_FORMATS", "")  # 生成时立即下载的Meshy格式（逗号分隔，如 fbx,usdz），其余按需转换或保留原始链接
+    STORAGE_EVICTION_POLICY: str = os.getenv("STORAGE_EVICTION_POLICY", "lru")  # 超出配额时的淘汰策略: lru / lfu
+    STORAGE_EVICTION_INTERVAL: float = float(os.getenv("STORAGE_EVICTION_INTERVAL", "60"))  # 后台检查配额的间隔（秒）
+    STORAGE_EVICTION_BATCH: int = int(os.getenv("STORAGE_EVICTION_BATCH", "1000"))  # 每轮最多淘汰的文件数
+    
+    # 模型后处理配置
+    PROCESS_POOL_SIZE: int = int(os.getenv("PROCESS_POOL_SIZE", "2"))  # 每个工作进程的计算进程数（网格简化等CPU密集任务）
+    LOD_RATIOS: str = os.getenv("LOD_RATIOS", "1.0,0.25,0.05")  # 各级LOD保留的面数比例，逗号分隔；只填1.0表示不生成LOD
+    GLB_OPTIMIZE: bool = os.getenv("GLB_OPTIMIZE", "true").lower() == "true"  # 是否为各级模型生成量化、重排和纹理压缩后的传输版本
+    GLB_TEXTURE_MAX_SIZE: int = int(os.getenv("GLB_TEXTURE_MAX_SIZE", "2048"))  # 优化版本中纹理的最大边长（像素）
+    GLB_TEXTURE_QUALITY: int = int(os.getenv("GLB_TEXTURE_QUALITY", "85"))  # 不透明纹理重新编码的JPEG质量
+    GLB_GZIP_LEVEL: int = int(os.getenv("GLB_GZIP_LEVEL", "9"))  # 预压缩的gzip级别（只在生成时压缩一次）
+    THUMBNAIL_SIZES: str = os.getenv("THUMBNAIL_SIZES", "512,256,128")  # 渲染缩略图的边长（像素），逗号分隔；Meshy未提供预览图时使用最大尺寸
+    
+    # 数据库配置
+    DB_BUSY_TIMEOUT: float = float(os.getenv("DB_BUSY_TIMEOUT", "5"))  # 等待其他进程释放写锁的超时（秒）
+    DB_WRITE_BATCH: int = int(os.getenv("DB_WRITE_BATCH", "256"))  # 每个事务最多合并的写操作数
     
     # 缓存配置
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))  # 1小时
-    MAX_CACHE_SIZE: int = int(os.getenv("MAX_CACHE_SIZE", "1000"))
+    MAX_CACHE_SIZE: int = int(os.getenv("MAX_CACHE_SIZE", "1000"))  # 进程内LRU缓存的最大条目数
+    CACHE_SWEEP_INTERVAL: float = float(os.getenv("CACHE_SWEEP_INTERVAL", "300"))  # 清理数据库过期缓存的间隔（秒）
+    CACHE_SWEEP_BATCH: int = int(os.getenv("CACHE_SWEEP_BATCH", "1000"))  # 每批删除的过期缓存数
+    
+    # 提示词近似重复检测
+    PROMPT_SIMILARITY_THRESHOLD: float = float(os.getenv("PROMPT_SIMILARITY_THRESHOLD", "0.95"))  # 请求方接受近似重复（reuse_similar）时复用已有模型的最低相似度
+    PROMPT_INDEX_DIM: int = int(os.getenv("PROMPT_INDEX_DIM", "512"))  # n-gram哈希向量维度
+    PROMPT_INDEX_REFRESH_INTERVAL: float = float(os.getenv("PROMPT_INDEX_REFRESH_INTERVAL", "30"))  # 从数据库同步新记录的间隔（秒）
+    PROMPT_ANN_MIN_SIZE: int = int(os.getenv("PROMPT_ANN_MIN_SIZE", "20000"))  # 达到该条目数且安装了hnswlib时使用近似最近邻
+    
+    # 后台任务配置
+    JOB_CONCURRENCY: int = int(os.getenv("JOB_CONCURRENCY", "4"))  # 每个工作进程同时执行的生成任务数
+    JOB_LEASE_TTL: float = float(os.getenv("JOB_LEASE_TTL", "60"))  # 任务租约有效期（秒），工作进程退出后超过该时间由其他进程接管
+    
+    # 统计配置
+    STATS_FLUSH_INTERVAL: float = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))  # 各工作进程合并写入统计计数的间隔（秒）
+    
+    # 链路追踪配置（需安装 opentelemetry-sdk）
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "")  # 空表示关闭: console / file / otlp
+    TRACING_FILE: str = os.getenv("TRACING_FILE", "./storage/traces/spans.jsonl")  # file 导出的文件（按进程号加后缀）
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "ai-3d-generator")
     
     # 开发环境配置
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    
-    def __init__(self):
-        """初始化时创建必要的目录"""
-        os.makedirs(self.MODEL_STORAGE_PATH, exist_ok=True)
-        os.makedirs(self.PREVIEW_STORAGE_PATH, exist_ok=True)
 
 # 创建全局配置实例
 settings = Settings()
\ No newline at end of file
@@ -1,18 +1,229 @@
 import sqlite3
 import os
+import socket
+import base64
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Iterable, Tuple
 import json
+import re
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'storage', 'models.db')
+from config import settings
+from tracing import span
+
+DATABASE_PATH = os.path.join(settings.STORAGE_DIR, 'models.db')
+
+# 连接管理：
+# - 读操作使用按线程复用的连接（WAL模式下读不阻塞写）
+# - 写操作交给单个写线程执行，排队中的写操作合并到同一事务提交，
+#   进程内不再争抢写锁；跨进程的冲突由 busy_timeout 等待
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    """创建配置好的连接（WAL、synchronous=NORMAL、忙等待超时）"""
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=settings.DB_BUSY_TIMEOUT,
+        isolation_level=None,  # 自动提交，事务由写线程显式控制
+        check_same_thread=False
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT * 1000)}')
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """获取当前线程的读连接"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DATABASE_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _local.conn = _connect()
+        _local.path = DATABASE_PATH
+    return conn
+
+WriteOp = Callable[[sqlite3.Cursor], Any]
+
+# 每种写入耗时最多保留的样本数（统计模块定期取走；未启用统计时丢弃最早的样本）
+WRITE_TIMING_SAMPLES = 10000
+
+class _Writer:
+    """单写线程：每批最多 DB_WRITE_BATCH 个写操作在一个事务中提交，单个操作失败只回滚它自己"""
+    
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {'writes': 0, 'commits': 0, 'errors': 0}
+        # 耗时样本（秒）：排队等待、获取写锁（BEGIN IMMEDIATE，跨进程争用时变长）、整个事务
+        self.timings = {name: deque(maxlen=WRITE_TIMING_SAMPLES)
+                        for name in ('sqlite_queue_wait', 'sqlite_lock_wait', 'sqlite_transaction')}
+    
+    def submit(self, op: WriteOp) -> Future:
+        future: Future = Future()
+        future.submitted_at = time.perf_counter()
+        self._queue.put((op, future))
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                    self._thread.start()
+        return future
+    
+    def _run(self):
+        conn, path = None, None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < settings.DB_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                if conn is None or path != DATABASE_PATH:
+                    if conn is not None:
+                        conn.close()
+                    conn, path = _connect(), DATABASE_PATH
+                results = self._commit(conn, batch)
+            except Exception as e:
+                # 整批提交失败（如跨进程锁等待超时）
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+                self.stats['errors'] += len(batch)
+                results = [(future, None, e) for _, future in batch]
+            
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+    
+    def _commit(self, conn: sqlite3.Connection, batch) -> List[Tuple[Future, Any, Optional[Exception]]]:
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        for _, future in batch:
+            self.timings['sqlite_queue_wait'].append(started - future.submitted_at)
+        with span('sqlite.write_batch', ops=len(batch)):
+            cursor.execute('BEGIN IMMEDIATE')
+            self.timings['sqlite_lock_wait'].append(time.perf_counter() - started)
+            results = self._apply(cursor, batch)
+            cursor.execute('COMMIT')
+        self.timings['sqlite_transaction'].append(time.perf_counter() - started)
+        self.stats['writes'] += len(batch)
+        self.stats['commits'] += 1
+        return results
+    
+    def _apply(self, cursor: sqlite3.Cursor, batch) -> List[Tuple[Future, Any, Optional[Exception]]]:
+        results = []
+        for op, future in batch:
+            cursor.execute('SAVEPOINT write_op')
+            try:
+                result = op(cursor)
+                cursor.execute('RELEASE write_op')
+                results.append((future, result, None))
+            except Exception as e:
+                cursor.execute('ROLLBACK TO write_op')
+                cursor.execute('RELEASE write_op')
+                self.stats['errors'] += 1
+                results.append((future, None, e))
+        return results
+
+_writer = _Writer()
+
+def submit_write(op: WriteOp) -> Future:
+    """提交写操作，返回在事务提交后完成的 Future（结果为 op 的返回值）"""
+    return _writer.submit(op)
+
+def write(op: WriteOp) -> Any:
+    """执行写操作并等待提交，返回 op 的返回值"""
+    return submit_write(op).result()
+
+def get_writer_stats() -> Dict:
+    """写线程统计：写操作数、提交次数（两者之比即平均每次提交合并的写入数）"""
+    return dict(_writer.stats)
+
+def drain_write_timings() -> Dict[str, List[float]]:
+    """取走写线程记录的耗时样本（秒）：排队等待、写锁等待、事务耗时"""
+    drained = {}
+    for name, samples in _writer.timings.items():
+        # deque 的 popleft 是线程安全的，与写线程并发追加不冲突
+        values = []
+        while True:
+            try:
+                values.append(samples.popleft())
+            except IndexError:
+                break
+        drained[name] = values
+    return drained
+
+def _init_history_fts(cursor) -> bool:
+    """
+    创建提示词全文索引（外部内容表指向 model_history，由触发器维护）
+    
+    使用 trigram 分词：中文无需分词即可检索，任意长度≥3的子串都能命中（包含前缀查询）；
+    需要 SQLite 3.34+ 的 FTS5，不可用时返回False，搜索退化为 LIKE 扫描
+    """
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+        exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                input_content,
+                content='model_history',
+                content_rowid='rowid',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"全文索引不可用: {e}，历史搜索将使用LIKE")
+        return False
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_fts_insert AFTER INSERT ON model_history
+        BEGIN
+            INSERT INTO history_fts (rowid, input_content) VALUES (new.rowid, new.input_content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_fts_delete AFTER DELETE ON model_history
+        BEGIN
+            INSERT INTO history_fts (history_fts, rowid, input_content)
+            VALUES ('delete', old.rowid, old.input_content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_fts_update AFTER UPDATE OF input_content ON model_history
+        BEGIN
+            INSERT INTO history_fts (history_fts, rowid, input_content)
+            VALUES ('delete', old.rowid, old.input_content);
+            INSERT INTO history_fts (rowid, input_content) VALUES (new.rowid, new.input_content);
+        END
+    ''')
+    if not exists:
+        # 首次创建时为已有历史记录建立索引
+        cursor.execute("INSERT INTO history_fts (history_fts) VALUES ('rebuild')")
+    return True
+
+FTS_ENABLED = False
 
 def init_database():
-    """初始化数据库"""
+    """
+    初始化数据库（在每个工作进程启动时调用，可重复执行）
+    
+    建表和迁移在一个 IMMEDIATE 事务中执行，多个工作进程同时启动时依次进行，
+    不会重复执行迁移
+    """
     # 确保storage目录存在
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = _connect()
     cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
     
     # 创建模型历史表
     cursor.execute('''
@@ -33,30 +244,219 @@ def init_database():
         )
     ''')
     
-    # 创建缓存表
+    history_columns = {row[1] for row in cursor.execute('PRAGMA table_info(model_history)')}
+    if 'lods' not in history_columns:
+        # 后处理生成的LOD信息（JSON），旧记录为空
+        cursor.execute('ALTER TABLE model_history ADD COLUMN lods TEXT')
+    if 'quality_metrics' not in history_columns:
+        # 质量分析的网格指标（JSON），旧记录为空
+        cursor.execute('ALTER TABLE model_history ADD COLUMN quality_metrics TEXT')
+    
+    # 历史列表按创建时间倒序分页，筛选字段与创建时间组合建索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_created ON model_history(created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_stage ON model_history(stage, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_input_type ON model_history(input_type, created_at, id)')
+    # 图片生成按上传内容查找已有结果（只索引图片记录，不增加文本记录的写入代价）
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_image_input ON model_history(input_content, created_at)
+        WHERE input_type = 'image'
+    ''')
+    
+    # 提示词全文索引
+    global FTS_ENABLED
+    FTS_ENABLED = _init_history_fts(cursor)
+    
+    # 创建缓存表（expires_at 为Unix时间戳，NULL表示不过期）
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS model_cache (
             cache_key TEXT PRIMARY KEY,
             model_data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at REAL
+        )
+    ''')
+    cache_columns = {row[1] for row in cursor.execute('PRAGMA table_info(model_cache)')}
+    if 'expires_at' not in cache_columns:
+        # 旧版缓存表没有过期时间，已有记录从现在起按 CACHE_TTL 过期
+        cursor.execute('ALTER TABLE model_cache ADD COLUMN expires_at REAL')
+        cursor.execute('UPDATE model_cache SET expires_at = ?', (time.time() + settings.CACHE_TTL,))
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_expires ON model_cache(expires_at)')
+    
+    # 创建后台任务表（重启后可继续轮询未完成的Meshy任务）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            progress INTEGER DEFAULT 0,
+            params TEXT,
+            meshy_tasks TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            owner TEXT,
+            lease_expires REAL
+        )
+    ''')
+    job_columns = {row[1] for row in cursor.execute('PRAGMA table_info(generation_jobs)')}
+    if 'owner' not in job_columns:
+        # 旧版任务表没有租约，已有的未完成任务由第一个启动的工作进程接管
+        cursor.execute('ALTER TABLE generation_jobs ADD COLUMN owner TEXT')
+        cursor.execute('ALTER TABLE generation_jobs ADD COLUMN lease_expires REAL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON generation_jobs(status, lease_expires)')
+    
+    # 共享的统计计数器（各工作进程定期合并写入增量）；模型数和质量分由触发器维护，
+    # 首次创建时按已有历史记录初始化
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO stats_counters (name, value)
+        SELECT 'history.models', COUNT(*) FROM model_history
+        UNION ALL SELECT 'history.quality_sum', COALESCE(SUM(quality_score), 0) FROM model_history
+        UNION ALL SELECT 'history.quality_count', COUNT(quality_score) FROM model_history
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_stats_insert AFTER INSERT ON model_history
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'history.models';
+            UPDATE stats_counters SET value = value + COALESCE(new.quality_score, 0)
+            WHERE name = 'history.quality_sum';
+            UPDATE stats_counters SET value = value + (new.quality_score IS NOT NULL)
+            WHERE name = 'history.quality_count';
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_stats_delete AFTER DELETE ON model_history
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'history.models';
+            UPDATE stats_counters SET value = value - COALESCE(old.quality_score, 0)
+            WHERE name = 'history.quality_sum';
+            UPDATE stats_counters SET value = value - (old.quality_score IS NOT NULL)
+            WHERE name = 'history.quality_count';
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS model_history_stats_update AFTER UPDATE OF quality_score ON model_history
+        BEGIN
+            UPDATE stats_counters
+            SET value = value - COALESCE(old.quality_score, 0) + COALESCE(new.quality_score, 0)
+            WHERE name = 'history.quality_sum';
+            UPDATE stats_counters
+            SET value = value - (old.quality_score IS NOT NULL) + (new.quality_score IS NOT NULL)
+            WHERE name = 'history.quality_count';
+        END
+    ''')
+    
+    # 后台维护任务（配额淘汰、过期缓存清理）的租约，多个工作进程中只有持有者执行
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    
+    # 内容寻址存储：按SHA-256去重的文件实体及引用它们的逻辑路径
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS asset_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # 引用同时记录大小和访问情况，供按配额淘汰使用（category 为 models/previews 等顶层目录）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS asset_refs (
+            ref TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            size INTEGER NOT NULL DEFAULT 0,
+            last_access REAL NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            pinned INTEGER NOT NULL DEFAULT 0,
+            in_history INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_asset_refs_sha256 ON asset_refs(sha256)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_asset_refs_lru
+        ON asset_refs(category, pinned, in_history, last_access)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_asset_refs_lfu
+        ON asset_refs(category, pinned, in_history, hits, last_access)
+    ''')
+    
+    # 各分类的引用数和总大小由触发器维护，检查配额时无需聚合整张表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS asset_usage (
+            category TEXT PRIMARY KEY,
+            refs INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            protected_bytes INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_refs_usage_insert AFTER INSERT ON asset_refs
+        BEGIN
+            INSERT OR IGNORE INTO asset_usage (category) VALUES (new.category);
+            UPDATE asset_usage SET
+                refs = refs + 1,
+                bytes = bytes + new.size,
+                protected_bytes = protected_bytes + (new.pinned OR new.in_history) * new.size
+            WHERE category = new.category;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_refs_usage_delete AFTER DELETE ON asset_refs
+        BEGIN
+            UPDATE asset_usage SET
+                refs = refs - 1,
+                bytes = bytes - old.size,
+                protected_bytes = protected_bytes - (old.pinned OR old.in_history) * old.size
+            WHERE category = old.category;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_refs_usage_update
+        AFTER UPDATE OF category, size, pinned, in_history ON asset_refs
+        BEGIN
+            UPDATE asset_usage SET
+                refs = refs - 1,
+                bytes = bytes - old.size,
+                protected_bytes = protected_bytes - (old.pinned OR old.in_history) * old.size
+            WHERE category = old.category;
+            INSERT OR IGNORE INTO asset_usage (category) VALUES (new.category);
+            UPDATE asset_usage SET
+                refs = refs + 1,
+                bytes = bytes + new.size,
+                protected_bytes = protected_bytes + (new.pinned OR new.in_history) * new.size
+            WHERE category = new.category;
+        END
+    ''')
     
-    conn.commit()
+    cursor.execute('COMMIT')
     conn.close()
 
 def save_model_to_history(model_data: Dict) -> bool:
     """保存模型到历史记录"""
-    try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO model_history 
-            (id, input_type, input_content, complexity, format, stage, 
-             model_url, preview_url, download_urls, quality_score, 
-             created_at, local_model_path, local_preview_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    def op(cursor):
+        # 使用UPSERT而不是 INSERT OR REPLACE：REPLACE 删除旧行时不会触发全文索引的删除触发器；
+        # 更新时保留原 created_at，否则重新保存的记录会移到历史记录顶部，打乱游标分页
+        cursor.execute(f'''
+            INSERT INTO model_history 
+            ({', '.join(HISTORY_COLUMNS)})
+            VALUES ({', '.join('?' for _ in HISTORY_COLUMNS)})
+            ON CONFLICT(id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in HISTORY_COLUMNS[1:] if column != 'created_at')}
         ''', (
             model_data.get('id'),
             model_data.get('input_type'),
@@ -70,102 +470,797 @@ def save_model_to_history(model_data: Dict) -> bool:
             model_data.get('quality_score'),
             model_data.get('created_at', datetime.now().isoformat()),
             model_data.get('local_model_path'),
-            model_data.get('local_preview_path')
+            model_data.get('local_preview_path'),
+            json.dumps(model_data['quality_metrics']) if model_data.get('quality_metrics') else None
         ))
         
-        conn.commit()
-        conn.close()
+        # 历史记录引用的本地文件不参与淘汰
+        refs = _history_refs(model_data)
+        if refs:
+            cursor.execute(f'''
+                UPDATE asset_refs SET in_history = 1
+                WHERE ref IN ({', '.join('?' for _ in refs)})
+            ''', refs)
+    
+    try:
+        write(op)
         return True
     except Exception as e:
         print(f"保存模型历史失败: {e}")
         return False
 
+FILES_URL_PREFIX = '/api/files/'
+
+def _history_refs(model_data: Dict) -> List[str]:
+    """提取历史记录中指向本地存储的逻辑路径（/api/files/<ref>）"""
+    urls = [model_data.get('model_url'), model_data.get('preview_url')]
+    urls.extend((model_data.get('download_urls') or {}).values())
+    refs = set()
+    for url in urls:
+        if url and FILES_URL_PREFIX in url:
+            refs.add(url.split(FILES_URL_PREFIX, 1)[1].split('?', 1)[0])
+    return sorted(refs)
+
+HISTORY_COLUMNS = ('id', 'input_type', 'input_content', 'complexity', 'format', 'stage',
+                   'model_url', 'preview_url', 'download_urls', 'quality_score',
+                   'created_at', 'local_model_path', 'local_preview_path', 'quality_metrics')
+# 生成后由后台处理写入的字段（保存历史记录时不覆盖）
+HISTORY_DERIVED_COLUMNS = ('lods',)
+HISTORY_FULL_COLUMNS = HISTORY_COLUMNS + HISTORY_DERIVED_COLUMNS
+# 以JSON保存的字段及缺省值
+HISTORY_JSON_COLUMNS = {'download_urls': {}, 'lods': None, 'quality_metrics': None}
+# 列表页只需要的轻量字段（不读取下载链接JSON和本地路径）
+HISTORY_SUMMARY_COLUMNS = ('id', 'input_type', 'input_content', 'stage',
+                           'model_url', 'preview_url', 'quality_score', 'created_at')
+
+def _decode_history(record: Dict) -> Dict:
+    """解析记录中以JSON保存的字段（内容损坏时使用缺省值）"""
+    for column, default in HISTORY_JSON_COLUMNS.items():
+        if column in record:
+            try:
+                record[column] = json.loads(record[column]) if record[column] else default
+            except ValueError:
+                record[column] = default
+    return record
+
+def _encode_cursor(created_at: str, record_id: str) -> str:
+    """分页游标：最后一条记录的 (created_at, id)"""
+    raw = json.dumps([created_at, record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return str(created_at), str(record_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+def query_model_history(limit: int = 50, cursor: Optional[str] = None,
+                        stage: Optional[str] = None, input_type: Optional[str] = None,
+                        created_after: Optional[str] = None, created_before: Optional[str] = None,
+                        min_quality: Optional[float] = None, max_quality: Optional[float] = None,
+                        summary: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """
+    按创建时间倒序分页查询历史记录
+    
+    使用 (created_at, id) 游标分页，任意页都通过索引定位，耗时与翻页深度无关
+    
+    Args:
+        cursor: 上一页返回的游标，为空时从最新记录开始
+        stage / input_type: 精确筛选
+        created_after / created_before: 创建时间范围（ISO格式，含边界）
+        min_quality / max_quality: 质量分范围（含边界）
+        summary: 只返回列表页需要的字段
+    
+    Returns:
+        (记录列表, 下一页游标)，没有更多记录时游标为None
+    
+    Raises:
+        ValueError: 游标无效
+    """
+    columns = HISTORY_SUMMARY_COLUMNS if summary else HISTORY_FULL_COLUMNS
+    conditions, params = [], []
+    for column, value in (('stage', stage), ('input_type', input_type)):
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if created_after is not None:
+        conditions.append('created_at >= ?')
+        params.append(created_after)
+    if created_before is not None:
+        conditions.append('created_at <= ?')
+        params.append(created_before)
+    if min_quality is not None:
+        conditions.append('quality_score >= ?')
+        params.append(min_quality)
+    if max_quality is not None:
+        conditions.append('quality_score <= ?')
+        params.append(max_quality)
+    if cursor:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(_decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    try:
+        db_cursor = get_connection().cursor()
+        
+        # 多取一条判断是否还有下一页
+        db_cursor.execute(f'''
+            SELECT {', '.join(columns)} FROM model_history
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit + 1))
+        
+        rows = db_cursor.fetchall()
+    except Exception as e:
+        print(f"获取模型历史失败: {e}")
+        return [], None
+    
+    history = [_decode_history(dict(zip(columns, row))) for row in rows[:limit]]
+    
+    next_cursor = None
+    if len(rows) > limit and history:
+        last = history[-1]
+        next_cursor = _encode_cursor(last['created_at'], last['id'])
+    return history, next_cursor
+
+def find_image_history(image_refs: Iterable[str]) -> Optional[Dict]:
+    """按上传图片的逻辑路径查找最新的图片生成记录，用于相同图片不重复生成"""
+    refs = list(image_refs)
+    try:
+        db_cursor = get_connection().cursor()
+        db_cursor.execute(f'''
+            SELECT {', '.join(HISTORY_FULL_COLUMNS)} FROM model_history
+            WHERE input_type = 'image' AND input_content IN ({', '.join('?' * len(refs))})
+            ORDER BY created_at DESC
+            LIMIT 1
+        ''', refs)
+        row = db_cursor.fetchone()
+    except Exception as e:
+        print(f"查找图片生成记录失败: {e}")
+        return None
+    if row is None:
+        return None
+    return _decode_history(dict(zip(HISTORY_FULL_COLUMNS, row)))
+
+def set_history_lods(model_id: str, lods: List[Dict]) -> bool:
+    """记录模型各级LOD的面数、大小和地址"""
+    def op(cursor):
+        cursor.execute('UPDATE model_history SET lods = ? WHERE id = ?', (json.dumps(lods), model_id))
+    
+    try:
+        write(op)
+        return True
+    except Exception as e:
+        print(f"保存LOD信息失败: {e}")
+        return False
+
 def get_model_history(limit: int = 50) -> List[Dict]:
     """获取模型历史记录"""
+    history, _ = query_model_history(limit)
+    return history
+
+def add_stats_counters(deltas: Dict[str, float]) -> bool:
+    """把计数增量合并到共享计数器（一个事务内完成）"""
+    def op(cursor):
+        cursor.executemany('''
+            INSERT INTO stats_counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        ''', list(deltas.items()))
+    
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        write(op)
+        return True
+    except Exception as e:
+        print(f"写入统计失败: {e}")
+        return False
+
+def get_stats_counters() -> Dict[str, float]:
+    """读取所有共享计数器（行数只与计数器种类有关，与历史记录数量无关）"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute('SELECT name, value FROM stats_counters')
+        return dict(cursor.fetchall())
+    except Exception as e:
+        print(f"读取统计失败: {e}")
+        return {}
+
+def get_text_previews(after_rowid: int = 0) -> List[Dict]:
+    """获取文本预览历史（rowid 大于 after_rowid 的记录，按写入顺序），用于构建提示词相似度索引"""
+    try:
+        cursor = get_connection().cursor()
         
         cursor.execute('''
-            SELECT id, input_type, input_content, complexity, format, stage,
-                   model_url, preview_url, download_urls, quality_score,
-                   created_at, local_model_path, local_preview_path
-            FROM model_history 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        ''', (limit,))
-        
+            SELECT rowid, id, input_content, model_url, preview_url, quality_score
+            FROM model_history
+            WHERE rowid > ? AND input_type = 'text' AND stage = 'preview'
+            ORDER BY rowid
+        ''', (after_rowid,))
         rows = cursor.fetchall()
-        conn.close()
         
-        history = []
-        for row in rows:
-            download_urls = {}
-            try:
-                if row[8]:  # download_urls
-                    download_urls = json.loads(row[8])
-            except:
-                pass
-                
-            history.append({
-                'id': row[0],
-                'input_type': row[1],
-                'input_content': row[2],
-                'complexity': row[3],
-                'format': row[4],
-                'stage': row[5],
-                'model_url': row[6],
-                'preview_url': row[7],
-                'download_urls': download_urls,
-                'quality_score': row[9],
-                'created_at': row[10],
-                'local_model_path': row[11],
-                'local_preview_path': row[12]
-            })
-        
-        return history
+        columns = ('rowid', 'id', 'input_content', 'model_url', 'preview_url', 'quality_score')
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
-        print(f"获取模型历史失败: {e}")
+        print(f"获取文本预览历史失败: {e}")
         return []
 
-def save_to_cache_db(cache_key: str, data: Dict) -> bool:
-    """保存到数据库缓存"""
+SEARCH_MIN_TERM_LENGTH = 3  # trigram 能通过索引检索的最短子串
+SEARCH_RANK_WINDOW = 500  # 参与相关度排序的最近匹配数（常见词可能命中数十万条，全部计算bm25太慢）
+
+def _search_terms(query: str) -> List[str]:
+    """拆分搜索词（空格分隔，多个词需同时命中）；结尾的 * 可省略，子串匹配本身包含前缀匹配"""
+    terms = []
+    for term in query.split():
+        term = term.rstrip('*')
+        if term and term.lower() not in (t.lower() for t in terms):
+            terms.append(term)
+    return terms
+
+def _highlight(text: str, terms: List[str]) -> str:
+    """用 <mark> 标出命中的搜索词（不区分大小写）"""
+    pattern = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.sub(pattern, lambda m: f'<mark>{m.group(0)}</mark>', text or '', flags=re.IGNORECASE)
+
+def search_model_history(query: str, limit: int = 20, offset: int = 0,
+                         stage: Optional[str] = None, input_type: Optional[str] = None) -> List[Dict]:
+    """
+    按提示词搜索历史记录
+    
+    长度≥3的词通过全文索引匹配，取最近的 SEARCH_RANK_WINDOW 条匹配按 bm25 相关度排序；
+    只有较短的词（如两个汉字）时无法使用索引，按 LIKE 匹配并按创建时间倒序
+    
+    Returns:
+        历史记录（列表字段），附加 highlight（标出命中词的提示词）和 score（相关度，越大越相关）
+    """
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    
+    indexed = [t for t in terms if len(t) >= SEARCH_MIN_TERM_LENGTH] if FTS_ENABLED else []
+    conditions, params = [], []
+    for term in terms:
+        if term not in indexed:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("h.input_content LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+    for column, value in (('stage', stage), ('input_type', input_type)):
+        if value is not None:
+            conditions.append(f'h.{column} = ?')
+            params.append(value)
+    columns = ', '.join(f'h.{column}' for column in HISTORY_SUMMARY_COLUMNS)
+    
+    if indexed:
+        # 多个带引号的短语默认按 AND 组合
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in indexed)
+        where = ''.join(f' AND {condition}' for condition in conditions)
+        # 全文索引按rowid倒序（即写入顺序倒序）遍历匹配项，取到窗口大小即停止
+        sql = f'''
+            SELECT * FROM (
+                SELECT {columns}, -history_fts.rank AS score FROM history_fts
+                JOIN model_history h ON h.rowid = history_fts.rowid
+                WHERE history_fts MATCH ?{where}
+                ORDER BY history_fts.rowid DESC
+                LIMIT ?
+            )
+            ORDER BY score DESC
+            LIMIT ? OFFSET ?
+        '''
+        params = [match, *params, max(SEARCH_RANK_WINDOW, offset + limit)]
+    else:
+        sql = f'''
+            SELECT {columns}, NULL FROM model_history h
+            WHERE {' AND '.join(conditions)}
+            ORDER BY h.created_at DESC, h.id DESC
+            LIMIT ? OFFSET ?
+        '''
+    
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
+        cursor = get_connection().cursor()
+        cursor.execute(sql, (*params, limit, offset))
+        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"搜索历史记录失败: {e}")
+        return []
+    
+    results = []
+    for row in rows:
+        record = dict(zip(HISTORY_SUMMARY_COLUMNS, row))
+        record['score'] = row[-1]
+        record['highlight'] = _highlight(record['input_content'], terms)
+        results.append(record)
+    return results
+
+def save_to_cache_db(cache_key: str, data: Dict, expires_at: Optional[float] = None,
+                     wait: bool = True) -> bool:
+    """
+    保存到数据库缓存
+    
+    Args:
+        expires_at: 过期时间（Unix时间戳），None表示不过期
+        wait: 是否等待提交完成
+    """
+    def op(cursor):
         cursor.execute('''
-            INSERT OR REPLACE INTO model_cache (cache_key, model_data, created_at)
-            VALUES (?, ?, ?)
-        ''', (cache_key, json.dumps(data), datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+            INSERT OR REPLACE INTO model_cache (cache_key, model_data, created_at, expires_at)
+            VALUES (?, ?, ?, ?)
+        ''', (cache_key, json.dumps(data), datetime.now().isoformat(), expires_at))
+    
+    future = submit_write(op)
+    if not wait:
+        future.add_done_callback(
+            lambda f: f.exception() and print(f"保存缓存失败: {f.exception()}")
+        )
+        return True
+    try:
+        future.result()
         return True
     except Exception as e:
         print(f"保存缓存失败: {e}")
         return False
 
-def get_from_cache_db(cache_key: str) -> Optional[Dict]:
-    """从数据库缓存获取"""
+def get_cache_entry_db(cache_key: str) -> Optional[Tuple[Dict, Optional[float]]]:
+    """从数据库缓存获取未过期的记录，返回 (数据, 过期时间)"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
         cursor.execute('''
-            SELECT model_data FROM model_cache 
-            WHERE cache_key = ?
-        ''', (cache_key,))
+            SELECT model_data, expires_at FROM model_cache 
+            WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > ?)
+        ''', (cache_key, time.time()))
         
         row = cursor.fetchone()
-        conn.close()
         
         if row:
-            return json.loads(row[0])
+            return json.loads(row[0]), row[1]
         return None
     except Exception as e:
         print(f"获取缓存失败: {e}")
         return None
 
-# 初始化数据库
-init_database()
\ No newline at end of file
+def get_cache_entries_db(cache_keys: List[str]) -> Dict[str, Tuple[Dict, Optional[float]]]:
+    """批量获取未过期的缓存记录（一次查询），返回 缓存键 -> (数据, 过期时间)"""
+    if not cache_keys:
+        return {}
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute(f'''
+            SELECT cache_key, model_data, expires_at FROM model_cache
+            WHERE cache_key IN ({', '.join('?' for _ in cache_keys)})
+              AND (expires_at IS NULL OR expires_at > ?)
+        ''', (*cache_keys, time.time()))
+        return {key: (json.loads(data), expires_at) for key, data, expires_at in cursor.fetchall()}
+    except Exception as e:
+        print(f"获取缓存失败: {e}")
+        return {}
+
+def get_from_cache_db(cache_key: str) -> Optional[Dict]:
+    """从数据库缓存获取"""
+    entry = get_cache_entry_db(cache_key)
+    return entry[0] if entry else None
+
+def delete_from_cache_db(cache_key: str) -> bool:
+    """删除数据库缓存记录"""
+    try:
+        write(lambda cursor: cursor.execute('DELETE FROM model_cache WHERE cache_key = ?', (cache_key,)))
+        return True
+    except Exception as e:
+        print(f"删除缓存失败: {e}")
+        return False
+
+def sweep_expired_cache(limit: int = 1000) -> int:
+    """删除最多 limit 条已过期的缓存记录（走 expires_at 索引），返回删除条数"""
+    def op(cursor):
+        cursor.execute('''
+            DELETE FROM model_cache WHERE rowid IN (
+                SELECT rowid FROM model_cache WHERE expires_at <= ? LIMIT ?
+            )
+        ''', (time.time(), limit))
+        return cursor.rowcount
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"清理过期缓存失败: {e}")
+        return 0
+
+JOB_COLUMNS = ('id', 'kind', 'status', 'stage', 'progress', 'params',
+               'meshy_tasks', 'result', 'error', 'created_at', 'updated_at')
+JOB_JSON_COLUMNS = ('params', 'meshy_tasks', 'result')
+
+def _row_to_job(row) -> Dict:
+    """将数据库行转换为任务字典"""
+    job = dict(zip(JOB_COLUMNS, row))
+    for column in JOB_JSON_COLUMNS:
+        try:
+            job[column] = json.loads(job[column]) if job[column] else None
+        except (TypeError, ValueError):
+            job[column] = None
+    return job
+
+def worker_id() -> str:
+    """当前工作进程的标识（主机名:进程号），用作任务和维护租约的持有者"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def save_job(job: Dict, wait: bool = True, lease_ttl: Optional[float] = None) -> bool:
+    """
+    保存或更新后台任务
+    
+    Args:
+        wait: 是否等待提交完成；进度更新等高频写入可不等待，按提交顺序批量写入
+        lease_ttl: 新建任务时由当前工作进程持有租约的时长（秒）；更新已有任务时不改变租约
+    
+    已有任务只在当前进程持有租约时更新：租约已被其他进程接管的旧执行不会覆盖新持有者写入的状态
+    """
+    values = []
+    for column in JOB_COLUMNS:
+        value = job.get(column)
+        if column in JOB_JSON_COLUMNS and value is not None:
+            value = json.dumps(value)
+        values.append(value)
+    if lease_ttl:
+        values += [worker_id(), time.time() + lease_ttl]
+    else:
+        values += [None, None]
+    
+    def op(cursor):
+        cursor.execute(f'''
+            INSERT INTO generation_jobs ({', '.join(JOB_COLUMNS)}, owner, lease_expires)
+            VALUES ({', '.join('?' for _ in JOB_COLUMNS)}, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in JOB_COLUMNS[1:])}
+            WHERE generation_jobs.owner = ?
+        ''', values + [worker_id()])
+    
+    future = submit_write(op)
+    if not wait:
+        future.add_done_callback(
+            lambda f: f.exception() and print(f"保存任务失败: {f.exception()}")
+        )
+        return True
+    try:
+        future.result()
+        return True
+    except Exception as e:
+        print(f"保存任务失败: {e}")
+        return False
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """获取后台任务"""
+    try:
+        cursor = get_connection().cursor()
+        
+        cursor.execute(f'''
+            SELECT {', '.join(JOB_COLUMNS)} FROM generation_jobs
+            WHERE id = ?
+        ''', (job_id,))
+        
+        row = cursor.fetchone()
+        
+        return _row_to_job(row) if row else None
+    except Exception as e:
+        print(f"获取任务失败: {e}")
+        return None
+
+def claim_jobs(lease_ttl: float, limit: int = 100, include_own: bool = False) -> List[Dict]:
+    """
+    认领未完成且没有有效租约的任务（无持有者或租约过期），
+    用于启动时恢复及接管已退出工作进程的任务；多个进程同时认领时每个任务只归一个进程
+    
+    Args:
+        include_own: 同时认领持有者是当前进程的任务（仅用于启动时恢复，
+            运行中定期认领时不能包含，否则会把本进程正在执行的任务再执行一次）
+    """
+    owner = worker_id()
+    
+    def op(cursor):
+        now = time.time()
+        cursor.execute(f'''
+            SELECT id FROM generation_jobs
+            WHERE status IN ('queued', 'running')
+              AND (owner IS NULL OR lease_expires < ?{' OR owner = ?' if include_own else ''})
+            ORDER BY created_at
+            LIMIT ?
+        ''', (now, owner, limit) if include_own else (now, limit))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return []
+        placeholders = ', '.join('?' for _ in ids)
+        cursor.execute(f'''
+            UPDATE generation_jobs SET owner = ?, lease_expires = ?
+            WHERE id IN ({placeholders})
+        ''', [owner, now + lease_ttl, *ids])
+        cursor.execute(f'''
+            SELECT {', '.join(JOB_COLUMNS)} FROM generation_jobs
+            WHERE id IN ({placeholders})
+            ORDER BY created_at
+        ''', ids)
+        return [_row_to_job(row) for row in cursor.fetchall()]
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"认领任务失败: {e}")
+        return []
+
+def renew_job_leases(job_ids: Iterable[str], lease_ttl: float) -> List[str]:
+    """延长当前进程持有的任务租约，返回仍由当前进程持有的任务ID"""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+    owner = worker_id()
+    
+    def op(cursor):
+        placeholders = ', '.join('?' for _ in job_ids)
+        cursor.execute(f'''
+            UPDATE generation_jobs SET lease_expires = ?
+            WHERE owner = ? AND id IN ({placeholders})
+        ''', [time.time() + lease_ttl, owner, *job_ids])
+        cursor.execute(f'''
+            SELECT id FROM generation_jobs WHERE owner = ? AND id IN ({placeholders})
+        ''', [owner, *job_ids])
+        return [row[0] for row in cursor.fetchall()]
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"续租任务失败: {e}")
+        return job_ids
+
+def release_job_leases() -> int:
+    """释放当前进程持有的所有任务租约（正常退出时调用，未完成的任务可立即被其他进程接管）"""
+    owner = worker_id()
+    
+    def op(cursor):
+        cursor.execute('''
+            UPDATE generation_jobs SET owner = NULL, lease_expires = NULL
+            WHERE owner = ?
+        ''', (owner,))
+        return cursor.rowcount
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"释放任务租约失败: {e}")
+        return 0
+
+def acquire_lease(name: str, ttl: float) -> bool:
+    """
+    获取或续期名为 name 的维护租约（如配额淘汰、过期缓存清理），
+    成功表示当前进程在 ttl 秒内是唯一的执行者
+    """
+    owner = worker_id()
+    
+    def op(cursor):
+        now = time.time()
+        cursor.execute('''
+            INSERT INTO worker_leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE worker_leases.owner = excluded.owner OR worker_leases.expires_at < ?
+        ''', (name, owner, now + ttl, now))
+        return cursor.rowcount > 0
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"获取租约 {name} 失败: {e}")
+        return False
+
+def release_lease(name: str) -> bool:
+    """释放当前进程持有的维护租约（正常退出时调用，其他进程无需等待租约过期即可接替）"""
+    owner = worker_id()
+    
+    def op(cursor):
+        cursor.execute('DELETE FROM worker_leases WHERE name = ? AND owner = ?', (name, owner))
+        return cursor.rowcount > 0
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"释放租约 {name} 失败: {e}")
+        return False
+
+def get_asset_ref(ref: str) -> Optional[Dict]:
+    """获取逻辑路径引用的文件实体"""
+    try:
+        cursor = get_connection().cursor()
+        
+        cursor.execute('''
+            SELECT b.sha256, b.size FROM asset_refs r
+            JOIN asset_blobs b ON b.sha256 = r.sha256
+            WHERE r.ref = ?
+        ''', (ref,))
+        
+        row = cursor.fetchone()
+        
+        return {'sha256': row[0], 'size': row[1]} if row else None
+    except Exception as e:
+        print(f"获取文件引用失败: {e}")
+        return None
+
+def _release_blob(cursor, sha256: str) -> Optional[Dict]:
+    """引用计数减一，归零时删除记录并返回该实体（由调用方删除文件）"""
+    cursor.execute('UPDATE asset_blobs SET refcount = refcount - 1 WHERE sha256 = ?', (sha256,))
+    cursor.execute('SELECT sha256, size, refcount FROM asset_blobs WHERE sha256 = ?', (sha256,))
+    row = cursor.fetchone()
+    if row and row[2] <= 0:
+        cursor.execute('DELETE FROM asset_blobs WHERE sha256 = ?', (sha256,))
+        return {'sha256': row[0], 'size': row[1]}
+    return None
+
+def add_asset_ref(ref: str, sha256: str, size: int) -> Optional[Dict]:
+    """
+    将逻辑路径指向文件实体并增加引用计数
+    
+    Returns:
+        该路径原先指向、且因此不再被引用的文件实体（需删除文件），没有则为None
+    """
+    def op(cursor):
+        cursor.execute('SELECT sha256 FROM asset_refs WHERE ref = ?', (ref,))
+        row = cursor.fetchone()
+        if row and row[0] == sha256:
+            return None
+        
+        cursor.execute('''
+            INSERT INTO asset_blobs (sha256, size, refcount, created_at)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1
+        ''', (sha256, size, datetime.now().isoformat()))
+        # 已存在的引用保留固定标记、历史引用标记和访问次数
+        cursor.execute('''
+            INSERT INTO asset_refs (ref, sha256, category, size, last_access, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ref) DO UPDATE SET
+                sha256 = excluded.sha256, size = excluded.size, last_access = excluded.last_access
+        ''', (ref, sha256, ref.split('/', 1)[0], size, time.time(), datetime.now().isoformat()))
+        
+        return _release_blob(cursor, row[0]) if row else None
+    
+    return write(op)
+
+def remove_asset_ref(ref: str) -> Optional[Dict]:
+    """
+    删除逻辑路径引用
+    
+    Returns:
+        因此不再被引用的文件实体（需删除文件），没有则为None
+    """
+    orphans = remove_asset_refs([ref])
+    return orphans[0] if orphans else None
+
+def remove_asset_refs(refs: Iterable[str]) -> List[Dict]:
+    """
+    在一个事务中批量删除逻辑路径引用（淘汰时使用）
+    
+    Returns:
+        因此不再被引用的文件实体列表（需删除文件）
+    """
+    refs = list(refs)
+    
+    def op(cursor):
+        orphans = []
+        for ref in refs:
+            cursor.execute('SELECT sha256 FROM asset_refs WHERE ref = ?', (ref,))
+            row = cursor.fetchone()
+            if not row:
+                continue
+            cursor.execute('DELETE FROM asset_refs WHERE ref = ?', (ref,))
+            orphan = _release_blob(cursor, row[0])
+            if orphan:
+                orphans.append(orphan)
+        return orphans
+    
+    return write(op)
+
+def purge_asset_blobs(blobs: Iterable[Dict], delete_file: Callable[[str], None]) -> List[Dict]:
+    """
+    删除不再被引用的文件实体的文件：在写线程中确认实体仍未被重新引用后再删除，
+    与 add_asset_ref 串行，避免删除并发存入的相同内容
+    
+    Returns:
+        实际删除了文件的实体
+    """
+    blobs = list(blobs)
+    
+    def op(cursor):
+        deleted = []
+        for blob in blobs:
+            cursor.execute('SELECT 1 FROM asset_blobs WHERE sha256 = ?', (blob['sha256'],))
+            if cursor.fetchone():
+                continue
+            delete_file(blob['sha256'])
+            deleted.append(blob)
+        return deleted
+    
+    return write(op)
+
+def touch_asset_refs(accesses: Dict[str, Tuple[float, int]]) -> bool:
+    """批量写入访问记录：逻辑路径 -> (最后访问时间, 新增访问次数)"""
+    def op(cursor):
+        cursor.executemany('''
+            UPDATE asset_refs SET last_access = MAX(last_access, ?), hits = hits + ?
+            WHERE ref = ?
+        ''', [(last_access, hits, ref) for ref, (last_access, hits) in accesses.items()])
+    
+    try:
+        write(op)
+        return True
+    except Exception as e:
+        print(f"保存文件访问记录失败: {e}")
+        return False
+
+def set_asset_pinned(ref: str, pinned: bool) -> bool:
+    """固定或取消固定逻辑路径，固定的文件不会被淘汰；路径不存在时返回False"""
+    def op(cursor):
+        cursor.execute('UPDATE asset_refs SET pinned = ? WHERE ref = ?', (int(pinned), ref))
+        return cursor.rowcount > 0
+    
+    try:
+        return write(op)
+    except Exception as e:
+        print(f"更新固定状态失败: {e}")
+        return False
+
+def get_storage_usage() -> Dict[str, Dict]:
+    """按分类统计引用的总大小，以及其中受保护（固定或被历史记录引用）的部分"""
+    try:
+        cursor = get_connection().cursor()
+        
+        cursor.execute('SELECT category, refs, bytes, protected_bytes FROM asset_usage')
+        rows = cursor.fetchall()
+        
+        return {
+            row[0]: {'refs': row[1], 'bytes': row[2], 'protected_bytes': row[3]}
+            for row in rows
+        }
+    except Exception as e:
+        print(f"获取存储用量失败: {e}")
+        return {}
+
+EVICTION_ORDER = {
+    'lru': 'last_access',
+    'lfu': 'hits, last_access',
+}
+
+def get_eviction_candidates(category: str, policy: str = 'lru', limit: int = 1000) -> List[Tuple[str, int]]:
+    """按淘汰顺序返回可淘汰的引用 (逻辑路径, 大小)，跳过固定的和被历史记录引用的文件"""
+    order = EVICTION_ORDER.get(policy, EVICTION_ORDER['lru'])
+    try:
+        cursor = get_connection().cursor()
+        
+        cursor.execute(f'''
+            SELECT ref, size FROM asset_refs
+            WHERE category = ? AND pinned = 0 AND in_history = 0
+            ORDER BY {order}
+            LIMIT ?
+        ''', (category, limit))
+        rows = cursor.fetchall()
+        
+        return [(row[0], row[1]) for row in rows]
+    except Exception as e:
+        print(f"获取淘汰候选失败: {e}")
+        return []
+
+def get_asset_stats() -> Dict:
+    """统计去重效果：逻辑引用总大小与实际占用大小"""
+    try:
+        cursor = get_connection().cursor()
+        
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM asset_blobs')
+        blob_count, physical_bytes = cursor.fetchone()
+        cursor.execute('''
+            SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM asset_refs r
+            JOIN asset_blobs b ON b.sha256 = r.sha256
+        ''')
+        ref_count, logical_bytes = cursor.fetchone()
+        
+        return {
+            'blobs': blob_count,
+            'refs': ref_count,
+            'physical_bytes': physical_bytes,
+            'logical_bytes': logical_bytes
+        }
+    except Exception as e:
+        print(f"获取存储统计失败: {e}")
+        return {'blobs': 0, 'refs': 0, 'physical_bytes': 0, 'logical_bytes': 0}
@@ -1,19 +1,36 @@
 import os
-import requests
+import asyncio
+import base64
 import hashlib
+import httpx
 from typing import Optional, Dict
 from urllib.parse import urlparse
+import time
 import uuid
+from config import settings
+from http_transport import http_transport
+import blob_store
+from storage_manager import storage_manager
+from stats import stats_recorder
+from tracing import span
 
 # 存储目录配置
-STORAGE_BASE = os.path.join(os.path.dirname(__file__), 'storage')
+STORAGE_BASE = settings.STORAGE_DIR
 MODELS_DIR = os.path.join(STORAGE_BASE, 'models')
 PREVIEWS_DIR = os.path.join(STORAGE_BASE, 'previews')
+STAGING_DIR = os.path.join(STORAGE_BASE, 'staging')  # 下载中的文件，完成后移入内容寻址存储
+
+# 下载中的临时文件后缀，完成校验后才重命名为正式文件
+PARTIAL_SUFFIX = '.part'
+
+_download_slots = None
 
 def init_storage():
-    """初始化存储目录"""
+    """初始化存储目录（在每个工作进程启动时调用）"""
     os.makedirs(MODELS_DIR, exist_ok=True)
     os.makedirs(PREVIEWS_DIR, exist_ok=True)
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    os.makedirs(blob_store.BLOBS_DIR, exist_ok=True)
 
 def get_file_extension(url: str) -> str:
     """从URL获取文件扩展名"""
@@ -33,107 +50,196 @@ def generate_filename(original_url: str, prefix: str = '') -> str:
         return f"{prefix}_{url_hash}.{extension}"
     return f"{url_hash}.{extension}"
 
-def download_file(url: str, local_path: str) -> bool:
-    """下载文件到本地"""
-    try:
-        response = requests.get(url, stream=True, timeout=30)
+async def download_file(url: str, local_path: str) -> bool:
+    """
+    下载文件到本地
+    
+    先写入 .part 临时文件，校验大小（及服务端提供的MD5）后原子重命名为目标文件，
+    因此目标路径存在即表示文件完整；传输中断时通过 Range 请求从已写入的位置续传
+    """
+    part_path = local_path + PARTIAL_SUFFIX
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    
+    async with _download_slot():
+        with stats_recorder.timer("download"), span("download", url=url) as current:
+            for attempt in range(settings.HTTP_MAX_RETRIES + 1):
+                if attempt:
+                    stats_recorder.incr("downloads.retries")
+                    if current is not None:
+                        current.set_attribute("download.retries", attempt)
+                try:
+                    if await _fetch_to_part(url, part_path):
+                        os.replace(part_path, local_path)
+                        stats_recorder.incr("downloads.files")
+                        return True
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code < 500:
+                        print(f"下载文件失败 {url}: {e}")
+                        stats_recorder.incr("downloads.failures")
+                        return False
+                    print(f"下载中断 {url}: {e}，准备续传")
+                except Exception as e:
+                    print(f"下载中断 {url}: {e}，准备续传")
+                await asyncio.sleep(settings.HTTP_RETRY_BACKOFF * 2 ** attempt)
+    
+    print(f"下载文件失败 {url}: 重试次数已用完")
+    stats_recorder.incr("downloads.failures")
+    return False
+
+async def _fetch_to_part(url: str, part_path: str) -> bool:
+    """
+    将文件内容写入（或追加到）临时文件
+    
+    Returns:
+        文件是否已完整下载并通过校验；服务端拒绝续传时删除临时文件并返回False
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Accept-Encoding": "identity"}  # 避免压缩传输，保证Range和Content-Length按原始字节计算
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    
+    async with http_transport.stream("GET", url, headers=headers) as response:
+        if response.status_code == 416:
+            # 临时文件与远端不一致，丢弃后重新下载
+            os.remove(part_path)
+            return False
         response.raise_for_status()
         
-        # 确保目录存在
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        digest = hashlib.md5()
+        if response.status_code == 206:
+            mode = 'ab'
+            expected_size = _parse_total_size(response.headers.get('Content-Range'))
+            await asyncio.to_thread(_hash_file, part_path, digest)
+        else:
+            mode = 'wb'
+            content_length = response.headers.get('Content-Length')
+            expected_size = int(content_length) if content_length else None
+        expected_md5 = _expected_md5(response.headers)
         
-        with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        return True
-    except Exception as e:
-        print(f"下载文件失败 {url}: {e}")
-        return False
+        received = 0
+        started = time.perf_counter()
+        try:
+            with open(part_path, mode) as f:
+                async for chunk in response.aiter_raw(chunk_size=settings.DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                    received += len(chunk)
+        finally:
+            # 中断前已接收的字节同样计入（续传时不会重复下载）
+            stats_recorder.incr("downloads.bytes", received)
+            elapsed = time.perf_counter() - started
+            if received and elapsed > 0:
+                stats_recorder.observe("download", received / elapsed, kind="throughput")
+    
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            os.remove(part_path)
+        raise IOError(f"文件大小不匹配: {size} != {expected_size}")
+    if expected_md5 and digest.hexdigest() != expected_md5:
+        os.remove(part_path)
+        raise IOError("文件校验和不匹配")
+    return True
 
-def download_model_file(model_url: str, model_id: str) -> Optional[str]:
+def _parse_total_size(content_range: Optional[str]) -> Optional[int]:
+    """解析 Content-Range: bytes 100-199/1000 中的总大小"""
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else None
+
+def _expected_md5(headers) -> Optional[str]:
+    """获取服务端显式提供的MD5（Content-MD5 或 x-goog-hash），没有时返回None"""
+    candidates = [headers.get('Content-MD5')]
+    for part in (headers.get('x-goog-hash') or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name == 'md5':
+            candidates.append(value)
+    for value in candidates:
+        if value:
+            try:
+                return base64.b64decode(value).hex()
+            except ValueError:
+                pass
+    return None
+
+def _hash_file(path: str, digest) -> None:
+    """将已有文件内容计入摘要（续传时使用）"""
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(settings.DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+
+def _download_slot() -> asyncio.Semaphore:
+    """全局下载并发名额，跨格式和跨任务共享（按事件循环创建）"""
+    global _download_slots
+    loop = asyncio.get_running_loop()
+    if _download_slots is None or _download_slots[0] is not loop:
+        _download_slots = (loop, asyncio.Semaphore(settings.DOWNLOAD_CONCURRENCY))
+    return _download_slots[1]
+
+async def download_model_file(model_url: str, model_id: str) -> Optional[str]:
     """下载模型文件"""
     if not model_url:
         return None
     
     filename = generate_filename(model_url, f"model_{model_id}")
-    local_path = os.path.join(MODELS_DIR, filename)
-    
-    # 如果文件已存在，直接返回路径
-    if os.path.exists(local_path):
-        return local_path
-    
-    if download_file(model_url, local_path):
-        return local_path
-    
-    return None
+    return await download_asset(model_url, os.path.join(MODELS_DIR, filename))
 
-def download_preview_image(preview_url: str, model_id: str) -> Optional[str]:
+async def download_preview_image(preview_url: str, model_id: str) -> Optional[str]:
     """下载预览图片"""
     if not preview_url:
         return None
     
     filename = generate_filename(preview_url, f"preview_{model_id}")
-    local_path = os.path.join(PREVIEWS_DIR, filename)
-    
-    # 如果文件已存在，直接返回路径
-    if os.path.exists(local_path):
-        return local_path
-    
-    if download_file(preview_url, local_path):
-        return local_path
-    
-    return None
+    return await download_asset(preview_url, os.path.join(PREVIEWS_DIR, filename))
 
-def download_all_formats(download_urls: Dict[str, str], model_id: str) -> Dict[str, str]:
-    """下载所有格式的模型文件"""
-    local_paths = {}
+async def download_all_formats(download_urls: Dict[str, str], model_id: str) -> Dict[str, str]:
+    """并行下载所有格式的模型文件，总耗时取决于最大的文件"""
+    formats = [(format_name, url) for format_name, url in download_urls.items() if url]
+    results = await asyncio.gather(*(
+        download_asset(url, os.path.join(MODELS_DIR, generate_filename(url, f"{name}_{model_id}")))
+        for name, url in formats
+    ))
     
-    for format_name, url in download_urls.items():
-        if not url:
-            continue
-            
-        filename = generate_filename(url, f"{format_name}_{model_id}")
-        local_path = os.path.join(MODELS_DIR, filename)
-        
-        # 如果文件已存在，直接使用
-        if os.path.exists(local_path):
-            local_paths[format_name] = local_path
-            continue
-        
-        if download_file(url, local_path):
-            local_paths[format_name] = local_path
-    
-    return local_paths
+    return {name: path for (name, _), path in zip(formats, results) if path}
 
 def get_file_url_for_frontend(local_path: str) -> str:
     """将本地文件路径转换为前端可访问的URL"""
-    if not local_path or not os.path.exists(local_path):
+    if not local_path or not get_physical_path(local_path):
         return ""
     
-    # 获取相对于storage目录的路径
-    rel_path = os.path.relpath(local_path, STORAGE_BASE)
-    # 转换为URL格式（使用正斜杠）
-    url_path = rel_path.replace('\\', '/')
-    return f"/api/files/{url_path}"
-
-def cleanup_old_files(days: int = 7):
-    """清理旧文件（可选功能）"""
-    import time
-    current_time = time.time()
-    cutoff_time = current_time - (days * 24 * 60 * 60)
+    # 获取相对于storage目录的路径（转换为URL格式，使用正斜杠）
+    return f"/api/files/{to_ref(local_path)}"
+
+def to_ref(local_path: str) -> str:
+    """本地路径转换为内容寻址存储中的逻辑路径（相对storage目录）"""
+    return os.path.relpath(local_path, STORAGE_BASE).replace('\\', '/')
+
+def get_physical_path(local_path: str) -> Optional[str]:
+    """获取逻辑路径对应的实际文件：优先查内容寻址存储，其次是旧版直接存放的文件"""
+    if not local_path:
+        return None
+    blob = blob_store.resolve(to_ref(local_path))
+    if blob:
+        return blob
+    return local_path if os.path.isfile(local_path) else None
+
+async def download_asset(url: str, local_path: str) -> Optional[str]:
+    """
+    下载文件到内容寻址存储，local_path 作为逻辑路径登记引用
+    
+    Returns:
+        逻辑路径；已下载过时直接返回，下载失败返回None
+    """
+    if get_physical_path(local_path):
+        return local_path
+    
+    ref = to_ref(local_path)
+    staging_path = os.path.join(STAGING_DIR, ref.replace('/', '_'))
+    if not await download_file(url, staging_path):
+        return None
     
-    for directory in [MODELS_DIR, PREVIEWS_DIR]:
-        for filename in os.listdir(directory):
-            file_path = os.path.join(directory, filename)
-            if os.path.isfile(file_path):
-                file_time = os.path.getmtime(file_path)
-                if file_time < cutoff_time:
-                    try:
-                        os.remove(file_path)
-                        print(f"清理旧文件: {filename}")
-                    except Exception as e:
-                        print(f"清理文件失败 {filename}: {e}")
-
-# 初始化存储目录
-init_storage()
\ No newline at end of file
+    size = os.path.getsize(staging_path)
+    await asyncio.to_thread(blob_store.ingest_file, staging_path, ref)
+    storage_manager.notify_added(ref, size)
+    return local_path
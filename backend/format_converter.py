@@ -0,0 +1,116 @@
+"""
+按需格式转换
+只保存GLB，其他格式在第一次请求时用 trimesh 在共享进程池中转换：
+- obj：OBJ连同材质和纹理打包为zip（application/zip）
+- stl / ply：单个文件
+转换结果以 converted/<GLB内容的SHA-256>.<格式> 存入内容寻址存储（内容相同的模型共享转换结果），
+converted 分类按 CONVERTED_STORAGE_QUOTA 配额淘汰，淘汰后再次请求时重新转换；
+相同转换的并发请求通过 single-flight 合并（配置了Redis时跨工作进程合并）
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from typing import Dict, Tuple
+
+import blob_store
+from file_manager import STAGING_DIR
+from process_pool import run_in_process
+from redis_pool import redis_pool
+from singleflight import SingleFlight
+from stats import stats_recorder
+from storage_manager import storage_manager
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 格式 -> (媒体类型, 下载文件的扩展名)
+CONVERSION_FORMATS: Dict[str, Tuple[str, str]] = {
+    'obj': ('application/zip', '.obj.zip'),
+    'stl': ('model/stl', '.stl'),
+    'ply': ('application/ply', '.ply'),
+}
+
+
+def convert_model(source_path: str, target_path: str, file_format: str) -> int:
+    """把GLB转换为指定格式写入 target_path（同步，在进程池中执行），返回文件大小"""
+    import trimesh
+
+    # 合并为单个网格（应用场景中的节点变换）
+    mesh = trimesh.load(source_path, file_type='glb', force='mesh')
+    if file_format == 'obj':
+        # OBJ 的材质和纹理是单独的文件，导出到临时目录后打包
+        workdir = tempfile.mkdtemp(dir=os.path.dirname(target_path))
+        try:
+            mesh.export(os.path.join(workdir, 'model.obj'), file_type='obj')
+            with zipfile.ZipFile(target_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(os.listdir(workdir)):
+                    archive.write(os.path.join(workdir, name), name)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        mesh.export(target_path, file_type=file_format)
+    return os.path.getsize(target_path)
+
+
+def converted_ref(sha256: str, file_format: str) -> str:
+    return f"converted/{sha256}.{file_format}"
+
+
+class FormatConverter:
+    """按需转换并缓存模型格式"""
+
+    def __init__(self):
+        self.flight = SingleFlight(redis_pool, poll_interval=0.2)
+
+    async def get(self, source_path: str, file_format: str) -> str:
+        """
+        返回 source_path（GLB）转换为 file_format 后的实际文件路径，已转换过时直接返回缓存
+
+        Raises:
+            ValueError: 不支持的格式
+        """
+        if file_format not in CONVERSION_FORMATS:
+            raise ValueError(f"不支持的格式: {file_format}")
+        if source_path.startswith(blob_store.BLOBS_DIR + os.sep):
+            sha256 = os.path.basename(source_path)
+        else:
+            # 旧版直接存放在目录中的文件
+            sha256 = await asyncio.to_thread(blob_store.hash_file, source_path)
+        ref = converted_ref(sha256, file_format)
+        cached = blob_store.resolve(ref)
+        if cached:
+            stats_recorder.incr("conversions.cache_hits")
+            return cached
+        return await self.flight.do(
+            ref,
+            lambda: self._convert(source_path, ref, file_format),
+            lambda: asyncio.to_thread(blob_store.resolve, ref)
+        )
+
+    async def _convert(self, source_path: str, ref: str, file_format: str) -> str:
+        # 等待锁期间其他工作进程可能已经完成转换
+        cached = blob_store.resolve(ref)
+        if cached:
+            stats_recorder.incr("conversions.cache_hits")
+            return cached
+        stats_recorder.incr("conversions.misses")
+        target = os.path.join(STAGING_DIR, f"convert_{uuid.uuid4().hex}.{file_format}")
+        try:
+            with stats_recorder.timer(f"convert_{file_format}"), span("model.convert", format=file_format):
+                size = await run_in_process(convert_model, source_path, target, file_format)
+            physical_path = await asyncio.to_thread(blob_store.ingest_file, target, ref)
+        finally:
+            if os.path.exists(target):
+                os.remove(target)
+        storage_manager.notify_added(ref, size)
+        stats_recorder.incr(f"conversions.{file_format}")
+        logger.info(f"格式转换完成 {ref}: {size} 字节")
+        return physical_path
+
+
+# 创建全局格式转换实例
+format_converter = FormatConverter()
@@ -0,0 +1,366 @@
+"""
+GLB传输优化
+对GLB做一次性优化，结果与原始文件一起保存，客户端声明支持时返回优化版本：
+- 顶点量化（KHR_mesh_quantization）：位置存为 uint16（反量化的平移和统一缩放写入新增的子节点），
+  法线、切线存为归一化 int8，[0,1] 范围内的纹理坐标存为归一化 uint16
+- 索引重排：三角形按重心的Morton码排序，顶点按首次使用的顺序重新编号，提高GPU顶点缓存和读取的局部性，
+  也使数据更容易被gzip压缩；顶点数小于65536时索引存为 uint16
+- 纹理：边长缩小到 GLB_TEXTURE_MAX_SIZE 以内，不透明的纹理重新编码为JPEG，其余为压缩后的PNG
+- 另外保存gzip压缩的版本，客户端支持时以 Content-Encoding: gzip 返回（浏览器自动解压）
+无法安全处理的图元（动画目标、蒙皮、共享访问器、稀疏访问器、非三角形）保持原样；
+使用了不认识的必需扩展（如Draco）的文件不做优化
+"""
+import gzip
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# glTF 访问器的分量类型和元素类型
+COMPONENT_DTYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+BYTE, UNSIGNED_BYTE, SHORT, UNSIGNED_SHORT, UNSIGNED_INT, FLOAT = 5120, 5121, 5122, 5123, 5125, 5126
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+TRIANGLES = 4
+
+# 位置量化的最大整数值（uint16）
+POSITION_LEVELS = 65535
+
+
+def variant_ref(ref: str) -> str:
+    """优化版本的逻辑路径：models/a.lod1.glb -> models/a.lod1.opt.glb"""
+    base, ext = os.path.splitext(ref)
+    return f"{base}.opt{ext}"
+
+
+def read_glb(path: str) -> Tuple[Dict, bytes]:
+    """读取GLB，返回 (JSON内容, BIN块)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from('<4sII', data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("不是glTF 2.0的GLB文件")
+    gltf, binary, offset = None, b'', 12
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        offset += 8 + chunk_length
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN and not binary:
+            binary = chunk
+    if gltf is None:
+        raise ValueError("GLB中没有JSON块")
+    return gltf, binary
+
+
+def encode_glb(gltf: Dict, binary: bytes) -> bytes:
+    """把JSON和BIN块编码为GLB（块按4字节对齐）"""
+    content = json.dumps(gltf, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    content += b' ' * (-len(content) % 4)
+    binary = binary + b'\0' * (-len(binary) % 4)
+    chunks = struct.pack('<II', len(content), CHUNK_JSON) + content
+    if binary:
+        chunks += struct.pack('<II', len(binary), CHUNK_BIN) + binary
+    return struct.pack('<4sII', GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+
+def read_accessor(gltf: Dict, binary: bytes, index: int) -> np.ndarray:
+    """读取访问器为 (count, 分量数) 的数组；归一化的整数按glTF规则转换为浮点数"""
+    accessor = gltf['accessors'][index]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor['componentType']])
+    components = TYPE_SIZES[accessor['type']]
+    count = accessor['count']
+    view = gltf['bufferViews'][accessor['bufferView']]
+    offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    stride = view.get('byteStride') or dtype.itemsize * components
+    values = np.ndarray((count, components), dtype=dtype, buffer=binary, offset=offset,
+                        strides=(stride, dtype.itemsize)).copy()
+    if accessor.get('normalized'):
+        values = values.astype(np.float32) / np.iinfo(dtype).max
+        values = np.maximum(values, -1.0)
+    return values
+
+
+def _quantize_normalized(values: np.ndarray, dtype) -> np.ndarray:
+    limit = np.iinfo(dtype).max
+    low = -1.0 if np.iinfo(dtype).min < 0 else 0.0
+    return np.round(np.clip(values, low, 1.0) * limit).astype(dtype)
+
+
+def _morton_order(positions: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """三角形重心的Morton码（每轴10位）排序，空间上相邻的三角形排在一起"""
+    centroids = positions[faces].mean(axis=1)
+    low = centroids.min(axis=0)
+    extent = np.maximum(centroids.max(axis=0) - low, 1e-12)
+    cells = np.minimum((centroids - low) / extent * 1024, 1023).astype(np.uint64)
+    codes = np.zeros(len(faces), dtype=np.uint64)
+    for bit in range(10):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return np.argsort(codes, kind='stable')
+
+
+def reorder_mesh(positions: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    三角形按Morton码排序，顶点按首次使用的顺序编号（未被引用的顶点被去除）
+
+    Returns:
+        (新的面, 新顶点对应的原顶点下标)
+    """
+    faces = faces[_morton_order(positions, faces)]
+    used, first = np.unique(faces.reshape(-1), return_index=True)
+    vertex_order = used[np.argsort(first, kind='stable')]
+    remap = np.empty(len(positions), dtype=np.int64)
+    remap[vertex_order] = np.arange(len(vertex_order))
+    return remap[faces], vertex_order
+
+
+class _BufferBuilder:
+    """按4字节对齐拼接新的BIN块并登记bufferView"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.views: List[Dict] = []
+
+    def add(self, content: bytes, **fields) -> int:
+        self.data += b'\0' * (-len(self.data) % 4)
+        self.views.append({'buffer': 0, 'byteOffset': len(self.data), 'byteLength': len(content), **fields})
+        self.data += content
+        return len(self.views) - 1
+
+    def add_attribute(self, values: np.ndarray) -> int:
+        """顶点属性：每个元素补齐到4字节（glTF要求的对齐）"""
+        element = values.dtype.itemsize * values.shape[1]
+        stride = element + (-element % 4)
+        if stride != element:
+            padded = np.zeros((len(values), stride), dtype=np.uint8)
+            padded[:, :element] = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), element)
+            return self.add(padded.tobytes(), byteStride=stride, target=ARRAY_BUFFER)
+        return self.add(np.ascontiguousarray(values).tobytes(), byteStride=stride, target=ARRAY_BUFFER)
+
+
+def _eligible_meshes(gltf: Dict) -> List[int]:
+    """可以安全重写的网格：全部图元为带索引或不带索引的三角形，访问器不共享、无稀疏和动画目标，且未被蒙皮节点引用"""
+    references: Dict[int, int] = {}
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            accessors = list(primitive.get('attributes', {}).values())
+            accessors += [primitive['indices']] if 'indices' in primitive else []
+            for target in primitive.get('targets', []):
+                accessors += list(target.values())
+            for accessor in accessors:
+                references[accessor] = references.get(accessor, 0) + 1
+    skinned = {node['mesh'] for node in gltf.get('nodes', []) if 'mesh' in node and 'skin' in node}
+
+    eligible = []
+    for index, mesh in enumerate(gltf.get('meshes', [])):
+        ok = index not in skinned and 'weights' not in mesh
+        for primitive in mesh.get('primitives', []):
+            accessors = list(primitive.get('attributes', {}).values())
+            accessors += [primitive['indices']] if 'indices' in primitive else []
+            ok = ok and primitive.get('mode', TRIANGLES) == TRIANGLES and 'targets' not in primitive \
+                and not primitive.get('extensions') and 'POSITION' in primitive.get('attributes', {})
+            for accessor in accessors:
+                entry = gltf['accessors'][accessor]
+                ok = ok and references[accessor] == 1 and 'sparse' not in entry and 'bufferView' in entry
+        if ok and mesh.get('primitives'):
+            eligible.append(index)
+    return eligible
+
+
+def _encode_attribute(name: str, values: np.ndarray, accessor: Dict) -> Tuple[np.ndarray, Dict]:
+    """按属性类型选择量化方式，返回 (编码后的数组, 访问器字段)"""
+    fields = {'type': accessor['type'], 'count': len(values)}
+    if name in ('NORMAL', 'TANGENT'):
+        return _quantize_normalized(values, np.int8), {**fields, 'componentType': BYTE, 'normalized': True}
+    if name.startswith('TEXCOORD_') and values.size and values.min() >= 0 and values.max() <= 1:
+        return _quantize_normalized(values, np.uint16), {**fields, 'componentType': UNSIGNED_SHORT, 'normalized': True}
+    # 其余属性（顶点颜色、超出范围的纹理坐标等）保持原来的分量类型
+    component_type = accessor['componentType']
+    dtype = COMPONENT_DTYPES[component_type]
+    if accessor.get('normalized'):
+        return _quantize_normalized(values, dtype), {**fields, 'componentType': component_type, 'normalized': True}
+    return values.astype(dtype), {**fields, 'componentType': component_type}
+
+
+def _rewrite_meshes(gltf: Dict, binary: bytes, builder: _BufferBuilder) -> List[int]:
+    """重写可处理的网格（重排、量化），返回已重写的访问器下标"""
+    rewritten = []
+    dequantize = {}
+    for mesh_index in _eligible_meshes(gltf):
+        primitives = gltf['meshes'][mesh_index]['primitives']
+        decoded = []
+        for primitive in primitives:
+            attributes = {name: read_accessor(gltf, binary, accessor)
+                          for name, accessor in primitive['attributes'].items()}
+            if 'indices' in primitive:
+                faces = read_accessor(gltf, binary, primitive['indices']).reshape(-1, 3).astype(np.int64)
+            else:
+                faces = np.arange(len(attributes['POSITION']), dtype=np.int64).reshape(-1, 3)
+            decoded.append((attributes, faces))
+
+        # 同一网格的所有图元共用一组反量化参数（统一缩放，不影响法线方向）
+        low = np.min([attributes['POSITION'].min(axis=0) for attributes, _ in decoded], axis=0)
+        high = np.max([attributes['POSITION'].max(axis=0) for attributes, _ in decoded], axis=0)
+        scale = float((high - low).max()) / POSITION_LEVELS or 1.0
+        dequantize[mesh_index] = (low, scale)
+
+        for primitive, (attributes, faces) in zip(primitives, decoded):
+            faces, vertex_order = reorder_mesh(attributes['POSITION'], faces)
+            for name, accessor_index in primitive['attributes'].items():
+                values = attributes[name][vertex_order]
+                accessor = gltf['accessors'][accessor_index]
+                if name == 'POSITION':
+                    encoded = np.round((values - low) / scale).astype(np.uint16)
+                    fields = {'type': 'VEC3', 'count': len(encoded), 'componentType': UNSIGNED_SHORT,
+                              'min': encoded.min(axis=0).tolist(), 'max': encoded.max(axis=0).tolist()}
+                else:
+                    encoded, fields = _encode_attribute(name, values, accessor)
+                gltf['accessors'][accessor_index] = {'bufferView': builder.add_attribute(encoded), **fields}
+                rewritten.append(accessor_index)
+
+            index_type = (np.uint16, UNSIGNED_SHORT) if len(vertex_order) < 65536 else (np.uint32, UNSIGNED_INT)
+            indices = faces.reshape(-1).astype(index_type[0])
+            view = builder.add(indices.tobytes(), target=ELEMENT_ARRAY_BUFFER)
+            if 'indices' not in primitive:
+                primitive['indices'] = len(gltf['accessors'])
+                gltf['accessors'].append({})
+            gltf['accessors'][primitive['indices']] = {
+                'bufferView': view, 'componentType': index_type[1], 'count': len(indices), 'type': 'SCALAR'}
+            rewritten.append(primitive['indices'])
+
+    # 引用网格的节点改为挂一个带反量化变换的子节点（每个引用各自一个，保留原节点的变换）
+    nodes = gltf.get('nodes', [])
+    for node in list(nodes):
+        mesh_index = node.get('mesh')
+        if mesh_index not in dequantize:
+            continue
+        low, scale = dequantize[mesh_index]
+        nodes.append({'mesh': node.pop('mesh'), 'translation': low.tolist(), 'scale': [scale] * 3})
+        node.setdefault('children', []).append(len(nodes) - 1)
+    return rewritten
+
+
+def _has_alpha(image) -> bool:
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA').getchannel('A').getextrema()[0] < 255
+    return False
+
+
+def _rewrite_images(gltf: Dict, binary: bytes, builder: _BufferBuilder,
+                    max_size: int, quality: int) -> List[int]:
+    """缩小并重新编码内嵌的纹理（变小时才替换），返回已替换的图片下标"""
+    import io
+
+    from PIL import Image
+
+    replaced = []
+    for index, entry in enumerate(gltf.get('images', [])):
+        if 'bufferView' not in entry or entry.get('mimeType') not in ('image/png', 'image/jpeg'):
+            continue
+        view = gltf['bufferViews'][entry['bufferView']]
+        start = view.get('byteOffset', 0)
+        original = binary[start:start + view['byteLength']]
+        try:
+            with Image.open(io.BytesIO(original)) as image:
+                image.load()
+                resized = max(image.size) > max_size
+                if resized:
+                    image.thumbnail((max_size, max_size), Image.LANCZOS)
+                output = io.BytesIO()
+                if _has_alpha(image):
+                    image.convert('RGBA').save(output, format='PNG', optimize=True)
+                    mime_type = 'image/png'
+                else:
+                    image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True)
+                    mime_type = 'image/jpeg'
+        except (OSError, ValueError):
+            continue
+        if not resized and len(output.getvalue()) >= len(original):
+            continue
+        entry['bufferView'] = builder.add(output.getvalue())
+        entry['mimeType'] = mime_type
+        replaced.append(index)
+    return replaced
+
+
+def optimize_glb(source_path: str, target_path: str, texture_max_size: Optional[int] = None,
+                 texture_quality: Optional[int] = None, gzip_level: Optional[int] = None) -> Optional[Dict]:
+    """
+    生成优化后的GLB（同步，在进程池中执行），同时写入 <target_path>.gz
+
+    Returns:
+        {bytes, gzip_bytes, extensions}；文件无法优化时返回None
+    """
+    texture_max_size = texture_max_size or settings.GLB_TEXTURE_MAX_SIZE
+    texture_quality = texture_quality or settings.GLB_TEXTURE_QUALITY
+    gzip_level = settings.GLB_GZIP_LEVEL if gzip_level is None else gzip_level
+
+    gltf, binary = read_glb(source_path)
+    buffers = gltf.get('buffers', [])
+    known = {QUANTIZATION_EXTENSION, 'KHR_materials_emissive_strength', 'KHR_texture_transform',
+             'KHR_materials_unlit'}
+    if len(buffers) > 1 or any('uri' in buffer for buffer in buffers) \
+            or set(gltf.get('extensionsRequired', [])) - known:
+        return None
+
+    builder = _BufferBuilder()
+    rewritten = set(_rewrite_meshes(gltf, binary, builder))
+    replaced = set(_rewrite_images(gltf, binary, builder, texture_max_size, texture_quality))
+
+    # 仍被引用的原有bufferView原样复制到新BIN块的末尾，并改为新的下标
+    view_map: Dict[int, int] = {}
+    old_views = gltf.get('bufferViews', [])
+
+    def keep(old_index: int) -> int:
+        if old_index not in view_map:
+            view = dict(old_views[old_index])
+            start = view.pop('byteOffset', 0)
+            view.pop('buffer', None)
+            view_map[old_index] = builder.add(binary[start:start + view.pop('byteLength')], **view)
+        return view_map[old_index]
+
+    for index, accessor in enumerate(gltf.get('accessors', [])):
+        if index not in rewritten and 'bufferView' in accessor:
+            accessor['bufferView'] = keep(accessor['bufferView'])
+        for part in ('indices', 'values'):
+            sparse = accessor.get('sparse', {}).get(part)
+            if sparse and index not in rewritten:
+                sparse['bufferView'] = keep(sparse['bufferView'])
+    for index, image in enumerate(gltf.get('images', [])):
+        if index not in replaced and 'bufferView' in image:
+            image['bufferView'] = keep(image['bufferView'])
+
+    gltf['bufferViews'] = builder.views
+    if not builder.views:
+        gltf.pop('bufferViews', None)
+    gltf['buffers'] = [{'byteLength': len(builder.data)}] if builder.data else []
+    if not gltf['buffers']:
+        gltf.pop('buffers')
+    if rewritten:
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            if QUANTIZATION_EXTENSION not in gltf.setdefault(key, []):
+                gltf[key].append(QUANTIZATION_EXTENSION)
+
+    content = encode_glb(gltf, bytes(builder.data))
+    with open(target_path, 'wb') as f:
+        f.write(content)
+    compressed = gzip.compress(content, compresslevel=gzip_level, mtime=0)
+    with open(target_path + '.gz', 'wb') as f:
+        f.write(compressed)
+    return {
+        'bytes': len(content),
+        'gzip_bytes': len(compressed),
+        'extensions': list(gltf.get('extensionsRequired', [])),
+    }
@@ -0,0 +1,129 @@
+"""
+共享的HTTP传输层
+Meshy API调用和模型文件下载共用一个连接池（keep-alive，安装了 h2 时启用HTTP/2），
+对幂等请求的连接错误和5xx响应做指数退避重试，并限制每个主机的并发连接数
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class HttpTransport:
+    """带连接池、重试和主机并发限制的异步HTTP客户端"""
+
+    def __init__(self, pool_size: Optional[int] = None, keepalive: Optional[int] = None,
+                 per_host_limit: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff: Optional[float] = None):
+        self.pool_size = pool_size or settings.HTTP_POOL_SIZE
+        self.keepalive = keepalive or settings.HTTP_KEEPALIVE_CONNECTIONS
+        self.per_host_limit = per_host_limit or settings.HTTP_PER_HOST_LIMIT
+        self.max_retries = settings.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.HTTP_RETRY_BACKOFF if backoff is None else backoff
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取共享的连接池（首次使用时在当前事件循环中创建）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=httpx.Timeout(settings.DOWNLOAD_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.keepalive
+                ),
+                follow_redirects=True
+            )
+            self._host_slots = {}
+        return self._client
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def request(self, method: str, url: str, retry: Optional[bool] = None,
+                      **kwargs) -> httpx.Response:
+        """
+        发送请求并读取完整响应
+
+        Args:
+            method: HTTP方法
+            url: 请求地址
+            retry: 是否重试，默认仅对幂等方法重试（创建Meshy任务的POST不会重试，避免重复计费）
+            **kwargs: 传给 httpx 的 json/headers/params/timeout 等参数
+        """
+        async with self._host_slot(url):
+            return await self._send(method, url, retry, stream=False, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, retry: Optional[bool] = None,
+                     **kwargs) -> AsyncIterator[httpx.Response]:
+        """以流式方式发送请求，读取响应体期间保持占用主机并发名额"""
+        async with self._host_slot(url):
+            response = await self._send(method, url, retry, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        self.client  # 确保连接池及主机信号量属于当前事件循环
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        async with slot:
+            yield
+
+    async def _send(self, method: str, url: str, retry: Optional[bool], stream: bool,
+                    **kwargs) -> httpx.Response:
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        attempts = self.max_retries + 1 if retry else 1
+
+        for attempt in range(attempts):
+            self.stats["requests"] += 1
+            last_attempt = attempt == attempts - 1
+            try:
+                request = self.client.build_request(method, url, **kwargs)
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    self.stats["failures"] += 1
+                    raise
+                logger.warning(f"请求失败，准备重试 ({attempt + 1}/{attempts - 1}) {url}: {e}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return response
+                if stream:
+                    await response.aclose()
+                logger.warning(f"服务端错误 {response.status_code}，准备重试 ({attempt + 1}/{attempts - 1}) {url}")
+
+            self.stats["retries"] += 1
+            delay = self.backoff * 2 ** attempt
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+        raise RuntimeError("unreachable")
+
+
+# 创建全局传输实例
+http_transport = HttpTransport()
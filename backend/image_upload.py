@@ -0,0 +1,179 @@
+"""
+图片上传处理
+上传内容按块读取并写入暂存文件，同时计算SHA-256，超过 MAX_UPLOAD_SIZE 立即中止，
+内存占用与文件大小无关；内容哈希作为缓存键，重复上传的图片无需再解码。
+需要生成时用 Pillow 校验并规范化（按EXIF方向旋转、缩小到 UPLOAD_MAX_DIMENSION、去除EXIF等元数据、重新编码），
+在线程中执行并限制同时处理的数量，结果以 uploads/<哈希>.<扩展名> 存入内容寻址存储。
+提交给Meshy时，配置了 PUBLIC_BASE_URL 则传 /api/files 下的公网地址，否则以Data URI内联图片
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import UploadFile
+from PIL import Image, UnidentifiedImageError
+
+import blob_store
+from config import settings
+from file_manager import STAGING_DIR
+from storage_manager import storage_manager
+
+# 解码前的像素上限，超出时视为解压炸弹拒绝处理
+Image.MAX_IMAGE_PIXELS = settings.UPLOAD_MAX_PIXELS
+
+# EXIF 方向标记及对应的变换（与 ImageOps.exif_transpose 相同）
+ORIENTATION_TAG = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+_image_slots = None
+
+
+class UploadTooLargeError(Exception):
+    """上传内容超过 MAX_UPLOAD_SIZE"""
+
+
+class InvalidImageError(Exception):
+    """上传内容不是可解码的图片"""
+
+
+class SpooledUpload:
+    """已写入暂存文件的上传内容"""
+
+    def __init__(self, path: str, sha256: str, size: int, filename: Optional[str]):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+
+    def discard(self):
+        """删除暂存文件（已规范化存储或不再需要时调用）"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_upload(file: UploadFile, max_size: Optional[int] = None) -> SpooledUpload:
+    """
+    按块读取上传内容到暂存文件并计算SHA-256
+
+    Raises:
+        UploadTooLargeError: 超过大小上限（暂存文件已删除）
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    path = os.path.join(STAGING_DIR, f"upload_{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"文件超过大小上限 {max_size} 字节")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return SpooledUpload(path, digest.hexdigest(), size, file.filename)
+
+
+def normalize_image(source: str, target: str, max_dimension: Optional[int] = None) -> str:
+    """
+    校验并规范化图片（同步，在线程中调用），返回写入 target 的格式（JPEG / PNG）
+
+    带透明通道的图片保存为PNG，其余保存为JPEG；保存时不写入EXIF等元数据
+    """
+    max_dimension = max_dimension or settings.UPLOAD_MAX_DIMENSION
+    try:
+        with Image.open(source) as image:
+            # JPEG 直接以缩小的比例解码（1/2、1/4、1/8），解码后的尺寸不小于目标尺寸
+            image.draft('RGB', (max_dimension, max_dimension))
+            orientation = image.getexif().get(ORIENTATION_TAG)
+            # 先在原图上原地缩小，再按EXIF方向旋转较小的图，避免复制解码后的大图
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            if orientation in ORIENTATION_TRANSPOSE:
+                image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+            if has_alpha:
+                image = image if image.mode == 'RGBA' else image.convert('RGBA')
+                image.save(target, format='PNG', optimize=True)
+                return 'PNG'
+            image = image if image.mode == 'RGB' else image.convert('RGB')
+            # 不传 exif 参数，元数据不会写入新文件
+            image.save(target, format='JPEG', quality=settings.UPLOAD_JPEG_QUALITY, optimize=True)
+            return 'JPEG'
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise InvalidImageError("无法识别的图片格式或文件已损坏") from e
+
+
+def _image_slot() -> asyncio.Semaphore:
+    """同时解码/编码图片的数量上限（按事件循环创建）"""
+    global _image_slots
+    loop = asyncio.get_running_loop()
+    if _image_slots is None or _image_slots[0] is not loop:
+        _image_slots = (loop, asyncio.Semaphore(settings.IMAGE_PROCESS_CONCURRENCY))
+    return _image_slots[1]
+
+
+def upload_refs(sha256: str) -> Tuple[str, ...]:
+    """上传内容规范化后可能的逻辑路径（JPEG或PNG）"""
+    return f"uploads/{sha256}.jpg", f"uploads/{sha256}.png"
+
+
+async def store_upload(upload: SpooledUpload) -> Tuple[str, str]:
+    """
+    规范化上传的图片并存入内容寻址存储（相同内容只处理一次）
+
+    Returns:
+        (逻辑路径, 实际文件路径)
+
+    Raises:
+        InvalidImageError: 不是可解码的图片
+    """
+    for ref in upload_refs(upload.sha256):
+        existing = blob_store.resolve(ref)
+        if existing:
+            return ref, existing
+
+    normalized = upload.path + '.normalized'
+    try:
+        async with _image_slot():
+            image_format = await asyncio.to_thread(normalize_image, upload.path, normalized)
+        ref = f"uploads/{upload.sha256}.{'png' if image_format == 'PNG' else 'jpg'}"
+        size = os.path.getsize(normalized)
+        physical_path = await asyncio.to_thread(blob_store.ingest_file, normalized, ref)
+    finally:
+        if os.path.exists(normalized):
+            os.remove(normalized)
+    storage_manager.notify_added(ref, size)
+    return ref, physical_path
+
+
+
+def _read_data_uri(path: str, media_type: str) -> str:
+    with open(path, 'rb') as f:
+        return f"data:{media_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+
+async def image_source_url(ref: str, physical_path: str) -> str:
+    """提交给Meshy的图片地址：公网可访问时用 /api/files 地址，否则用Data URI"""
+    if settings.PUBLIC_BASE_URL:
+        return f"{settings.PUBLIC_BASE_URL.rstrip('/')}/api/files/{ref}"
+    media_type = 'image/png' if ref.endswith('.png') else 'image/jpeg'
+    return await asyncio.to_thread(_read_data_uri, physical_path, media_type)
@@ -0,0 +1,285 @@
+"""
+后台生成任务队列
+提交后立即返回任务ID，由有界的工作协程池执行Meshy生成流程，
+任务状态持久化在 models.db 中，服务重启后会继续轮询未完成的Meshy任务。
+多个工作进程共享同一数据库：每个任务由持有租约的进程执行并定期续租，
+进程退出（或租约过期）后，未完成的任务由有空闲的进程认领接管
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from config import settings
+from database import save_job, get_job, claim_jobs, renew_job_leases, release_job_leases
+from stats import stats_recorder
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+
+class Job:
+    """单个后台任务的状态"""
+
+    def __init__(self, id: str, kind: str, params: Dict[str, Any], status: str = 'queued',
+                 stage: Optional[str] = None, progress: int = 0,
+                 meshy_tasks: Optional[Dict[str, str]] = None,
+                 result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+                 created_at: Optional[str] = None, updated_at: Optional[str] = None):
+        self.id = id
+        self.kind = kind
+        self.params = params or {}
+        self.status = status
+        self.stage = stage
+        self.progress = progress or 0
+        self.meshy_tasks = meshy_tasks or {}  # 阶段 -> Meshy任务ID
+        self.result = result
+        self.error = error
+        self.created_at = created_at or datetime.now().isoformat()
+        self.updated_at = updated_at or self.created_at
+        self._manager: Optional['JobManager'] = None
+        self._enqueued_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None  # 执行中的处理协程，租约被接管时取消
+        self._lease_lost = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'params': self.params,
+            'meshy_tasks': self.meshy_tasks,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+    async def attach_task(self, stage: str, task_id: str):
+        """记录某阶段创建的Meshy任务ID，重启后据此恢复轮询而不是重新创建（重复计费）"""
+        self.meshy_tasks[stage] = task_id
+        self.stage = stage
+        self.progress = 0
+        await self._changed()
+
+    def progress_callback(self, stage: str) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+        """返回供 MeshyClient.wait_for_task_completion 使用的进度回调"""
+        async def on_progress(task_info: Dict[str, Any]):
+            progress = task_info.get('progress')
+            if progress is None or (self.stage == stage and progress == self.progress):
+                return
+            self.stage = stage
+            self.progress = int(progress)
+            await self._changed()
+        return on_progress
+
+    async def _changed(self):
+        self.updated_at = datetime.now().isoformat()
+        if self._manager:
+            self._manager.publish(self)
+
+
+JobHandler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+
+class JobManager:
+    """有界并发的后台任务管理器"""
+
+    def __init__(self, concurrency: Optional[int] = None, lease_ttl: Optional[float] = None):
+        self.concurrency = max(1, concurrency or settings.JOB_CONCURRENCY)
+        self.lease_ttl = lease_ttl or settings.JOB_LEASE_TTL
+        self.handlers: Dict[str, JobHandler] = {}
+        self.jobs: Dict[str, Job] = {}  # 本进程持有的未完成任务
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._leases: Optional[asyncio.Task] = None
+        self._idle: Optional[asyncio.Event] = None  # 有任务结束时唤醒，认领其他进程遗留的任务
+        self._running = 0
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def register(self, kind: str, handler: JobHandler):
+        """注册任务类型对应的处理协程"""
+        self.handlers[kind] = handler
+
+    async def start(self):
+        """启动工作协程，认领上次未完成（或没有进程持有）的任务"""
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.concurrency)
+        ]
+        resumed = await self._claim(recover=True)
+        self._leases = asyncio.create_task(self._maintain_leases())
+        logger.info(f"任务队列已启动，并发数: {self.concurrency}，恢复任务: {resumed}")
+
+    async def stop(self):
+        """停止工作协程并释放租约；执行中的任务保持 running 状态，由下次启动的进程或其他进程恢复"""
+        tasks = self._workers + ([self._leases] if self._leases else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._leases = None
+        await asyncio.to_thread(release_job_leases)
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        """提交任务并立即返回"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知任务类型: {kind}")
+        if self._queue is None:
+            raise RuntimeError("任务队列尚未启动")
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params)
+        self._track(job)
+        await asyncio.to_thread(save_job, job.to_dict(), True, self.lease_ttl)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """获取任务（不由本进程执行或已结束时从数据库读取，不阻塞事件循环）"""
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+        record = await asyncio.to_thread(get_job, job_id)
+        return Job(**record) if record else None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """订阅任务状态变化，每次变化推送一份任务字典"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def publish(self, job: Job):
+        """持久化任务状态并通知订阅者（写入按顺序批量提交，不阻塞事件循环）"""
+        save_job(job.to_dict(), wait=False)
+        snapshot = job.to_dict()
+        for queue in self._subscribers.get(job.id, ()):
+            queue.put_nowait(snapshot)
+        if job.finished:
+            self.jobs.pop(job.id, None)
+
+    def _track(self, job: Job):
+        job._manager = self
+        self.jobs[job.id] = job
+
+    def _enqueue(self, job: Job):
+        job._enqueued_at = time.perf_counter()
+        self._queue.put_nowait(job)
+
+    async def _claim(self, recover: bool = False) -> int:
+        """
+        按空闲的并发数认领没有有效租约的任务，返回认领数
+
+        Args:
+            recover: 启动时恢复，同时认领持有者是本进程的任务（同一工作进程ID重启前留下的）
+        """
+        capacity = self.concurrency - self._running - self._queue.qsize()
+        if capacity <= 0:
+            return 0
+        records = await asyncio.to_thread(claim_jobs, self.lease_ttl, capacity, recover)
+        claimed = 0
+        for record in records:
+            if record['id'] in self.jobs:
+                # 本进程已在执行或排队
+                continue
+            claimed += 1
+            job = Job(**record)
+            job.status = 'queued'
+            self._track(job)
+            self._enqueue(job)
+        return claimed
+
+    async def _maintain_leases(self):
+        """定期续租本进程的任务，并在有空闲时认领其他进程遗留的任务"""
+        while True:
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.lease_ttl / 3)
+            except asyncio.TimeoutError:
+                pass
+            self._idle.clear()
+            try:
+                held = [job_id for job_id, job in self.jobs.items() if not job.finished]
+                renewed = set(await asyncio.to_thread(renew_job_leases, held, self.lease_ttl))
+                lost = [job_id for job_id in held if job_id not in renewed]
+                if lost:
+                    logger.warning(f"任务租约已被其他进程接管，停止本进程的执行: {lost}")
+                    for job_id in lost:
+                        self._abandon(job_id)
+                claimed = await self._claim()
+                if claimed:
+                    logger.info(f"接管未完成的任务: {claimed}")
+            except Exception as e:
+                logger.error(f"维护任务租约失败: {e}")
+
+    def _abandon(self, job_id: str):
+        """放弃已被其他进程接管的任务：不再跟踪，执行中则取消（排队中的在出队时跳过）"""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        job._lease_lost = True
+        if job._task is not None:
+            job._task.cancel()
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            if job._lease_lost:
+                self._queue.task_done()
+                continue
+            self._running += 1
+            # 从入队（提交或接管）到开始执行的等待时间，持续偏高说明 JOB_CONCURRENCY 不足
+            stats_recorder.observe('job_queue_wait', time.perf_counter() - job._enqueued_at)
+            try:
+                with span('job', job_id=job.id, kind=job.kind):
+                    job._task = asyncio.create_task(self._run(job))
+                    await job._task
+            except asyncio.CancelledError:
+                # 租约被接管时只取消该任务；工作协程本身被取消（服务关闭）时继续向上抛出
+                if not job._lease_lost or asyncio.current_task().cancelling():
+                    raise
+                logger.warning(f"任务 {job.id} ({job.kind}) 已由其他进程接管，本进程停止执行")
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+                self._idle.set()
+
+    async def _run(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        job.status = 'running'
+        await job._changed()
+        try:
+            if handler is None:
+                raise ValueError(f"未知任务类型: {job.kind}")
+            job.result = await handler(job)
+            job.status = 'succeeded'
+            job.progress = 100
+            logger.info(f"任务 {job.id} ({job.kind}) 完成")
+        except asyncio.CancelledError:
+            # 服务关闭：保留 running 状态，重启后继续
+            raise
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f"任务 {job.id} ({job.kind}) 失败: {e}")
+        await job._changed()
+
+
+# 创建全局任务管理器实例
+job_manager = JobManager()
@@ -1,28 +1,54 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 import uvicorn
 import os
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Awaitable, Tuple
 import json
 import hashlib
-import redis
+import mimetypes
 import asyncio
 import random
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
 from meshy_client import meshy_client
-from database import save_model_to_history, get_model_history, save_to_cache_db, get_from_cache_db
+from job_queue import Job, job_manager, TERMINAL_STATUSES
+from singleflight import SingleFlight
+from http_transport import http_transport
+from config import settings
+from database import (
+    init_database, save_model_to_history, query_model_history, search_model_history, find_image_history,
+    HISTORY_FULL_COLUMNS, HISTORY_SUMMARY_COLUMNS
+)
 from file_manager import (
+    init_storage,
     download_model_file, 
     download_preview_image, 
     download_all_formats, 
     get_file_url_for_frontend,
+    get_physical_path,
+    to_ref,
     STORAGE_BASE
 )
+import blob_store
+from storage_manager import storage_manager
+from image_upload import (
+    receive_upload, store_upload, upload_refs, image_source_url,
+    UploadTooLargeError, InvalidImageError
+)
+from prompt_index import prompt_index, normalize_prompt
+from cache import TieredCache
+from redis_pool import redis_pool
+from stats import stats_recorder, summarize_counters, render_prometheus
+from tracing import setup_tracing, shutdown_tracing, span
+from model_processing import model_processor, resolve_model_variant, FILES_URL_PREFIX
+from format_converter import format_converter, CONVERSION_FORMATS
+from mesh_quality import assess_model
+from thumbnail_renderer import thumbnail_renderer
+from process_pool import shutdown_process_pool
 
 # 加载环境变量
 load_dotenv()
@@ -45,37 +71,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Model-LOD", "X-Model-Variant"],
 )
 
-# 挂载静态文件服务
-app.mount("/api/files", StaticFiles(directory=STORAGE_BASE), name="files")
-
-# Redis连接配置
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
-REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
-
-# Redis连接
-try:
-    redis_client = redis.Redis(
-        host=REDIS_HOST, 
-        port=REDIS_PORT, 
-        db=REDIS_DB, 
-        password=REDIS_PASSWORD if REDIS_PASSWORD else None,
-        decode_responses=True
-    )
-    redis_client.ping()
-    print(f"✅ Redis连接成功 ({REDIS_HOST}:{REDIS_PORT})")
-except Exception as e:
-    redis_client = None
-    print(f"⚠️ Redis连接失败: {e}，将使用内存缓存")
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """每个请求一个根span，缓存查找、Meshy调用、下载等span挂在它下面（未启用追踪时直接放行）"""
+    with span(f"{request.method} {request.url.path}", **{"http.method": request.method,
+                                                          "http.target": request.url.path}) as current:
+        response = await call_next(request)
+        if current is not None:
+            # 用路由模板命名（/api/jobs/{job_id}），避免每个任务ID产生不同的span名
+            route = request.scope.get("route")
+            if route is not None:
+                current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.status_code", response.status_code)
+        return response
+
+# 需要限制请求体大小的上传接口
+UPLOAD_PATHS = {"/api/generate/image", "/api/jobs/image"}
+# multipart 边界和字段头的余量（字节）
+UPLOAD_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """声明的请求体超过上传上限时直接拒绝，不等待解析整个请求体"""
+    if request.url.path in UPLOAD_PATHS:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and \
+                int(content_length) > settings.MAX_UPLOAD_SIZE + UPLOAD_OVERHEAD:
+            return JSONResponse(status_code=413,
+                                content={"detail": f"文件超过大小上限 {settings.MAX_UPLOAD_SIZE} 字节"})
+    return await call_next(request)
+
+# 分层缓存：进程内LRU -> Redis -> SQLite（Redis连接在启动时建立，不可用时自动熔断和恢复）
+cache = TieredCache(redis_pool)
+
+# 进行中生成请求的合并（Redis可用时跨进程生效）
+single_flight = SingleFlight(redis_pool)
 
 # 数据模型
 class TextGenerateRequest(BaseModel):
     text: str
     complexity: Optional[str] = "medium"
     format: Optional[str] = "gltf"  # 仅用于下载，显示统一用GLB
+    reuse_similar: bool = False  # 接受近似重复（相似度达到阈值且内容词一致）的提示词已生成的预览；规范化后相同的提示词总是复用
 
 class PreviewResponse(BaseModel):
     success: bool
@@ -83,6 +123,8 @@ class PreviewResponse(BaseModel):
     message: str
     preview_url: Optional[str] = None  # GLB模型文件URL，用于3D显示
     thumbnail_url: Optional[str] = None  # 缩略图URL，用于历史记录预览
+    similar_prompt: Optional[str] = None  # 复用相似提示词的结果时，原提示词
+    similarity: Optional[float] = None
 
 class RefineRequest(BaseModel):
     task_id: str
@@ -97,6 +139,20 @@ class GenerateResponse(BaseModel):
     quality_score: Optional[float] = None
     stage: Optional[str] = None  # "preview" 或 "refined"
 
+class JobSubmitRequest(TextGenerateRequest):
+    refine: bool = False  # 预览完成后是否在同一任务中继续精细化
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued / running / succeeded / failed
+    stage: Optional[str] = None  # 当前Meshy阶段: preview / refine / image
+    progress: int = 0  # 当前阶段的Meshy进度 (0-100)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
 class ModelInfo(BaseModel):
     id: str
     input_type: str
@@ -105,47 +161,50 @@ class ModelInfo(BaseModel):
     model_url: Optional[str] = None
     preview_url: Optional[str] = None  # 添加预览图片URL字段
     quality_score: Optional[float] = None
+    stage: Optional[str] = None
+    # 以下字段仅在 fields=full 时返回
+    complexity: Optional[str] = None
+    format: Optional[str] = None
+    download_urls: Optional[Dict[str, str]] = None
+    lods: Optional[List[Dict[str, Any]]] = None  # 各级LOD的面数、大小和地址（生成后才有）
+    quality_metrics: Optional[Dict[str, Any]] = None  # 网格质量指标（模型存入本地存储时才有）
 
-# 内存缓存（Redis不可用时使用）
-memory_cache = {}
-model_history = []
+class SearchResult(ModelInfo):
+    highlight: str  # 用 <mark> 标出命中词的提示词
+    score: Optional[float] = None  # 相关度，越大越相关；仅短词匹配时为空
+
+# 任务由其他工作进程执行时，SSE 从数据库读取进度的间隔（秒）
+JOB_EVENTS_POLL_INTERVAL = 1.0
 
 def get_cache_key(content: str, input_type: str) -> str:
     """生成缓存键"""
     content_hash = hashlib.md5(f"{input_type}:{content}".encode()).hexdigest()
     return f"model_cache:{content_hash}"
 
-def save_to_cache(key: str, data: dict):
-    """保存到缓存"""
-    if redis_client:
-        redis_client.setex(key, 3600, json.dumps(data))  # 1小时过期
-    else:
-        # 使用数据库缓存作为备选
-        save_to_cache_db(key, data)
-        memory_cache[key] = data
+def preview_cache_key(text: str) -> str:
+    """预览缓存键：基于规范化后的提示词，大小写、标点和空白不同的相同提示词共用缓存"""
+    return get_cache_key(normalize_prompt(text), "text_preview")
 
-def get_from_cache(key: str) -> Optional[dict]:
+def image_cache_key(sha256: str) -> str:
+    """图片生成缓存键：基于上传内容的SHA-256，文件名不同的相同图片共用结果"""
+    return get_cache_key(sha256, "image")
+
+async def save_to_cache(key: str, data: dict):
+    """保存到缓存（写入所有层，按 CACHE_TTL 过期）"""
+    await cache.set(key, data)
+
+async def get_from_cache(key: str) -> Optional[dict]:
     """从缓存获取"""
-    if redis_client:
-        cached = redis_client.get(key)
-        return json.loads(cached) if cached else None
-    else:
-        # 先尝试内存缓存，再尝试数据库缓存
-        if key in memory_cache:
-            return memory_cache[key]
-        return get_from_cache_db(key)
+    return await cache.get(key)
 
 async def simulate_3d_generation(input_content: str, input_type: str) -> dict:
     """模拟3D模型生成（实际项目中这里会调用真实的API）"""
     # 模拟生成时间
-    await asyncio.sleep(2)
+    await asyncio.sleep(settings.SIMULATION_DELAY)
     
     # 生成模型ID
     model_id = hashlib.md5(f"{input_content}:{datetime.now().isoformat()}".encode()).hexdigest()[:12]
     
-    # 模拟质量评分
-    quality_score = round(random.uniform(0.7, 0.95), 2)
-    
     # 从现有模型文件中随机选择一个（支持OBJ和GLB格式）
     models_dir = os.path.join(os.path.dirname(__file__), "models")
     available_models = []
@@ -156,15 +215,516 @@ async def simulate_3d_generation(input_content: str, input_type: str) -> dict:
     if available_models:
         selected_model = random.choice(available_models)
         model_url = f"/api/models/{selected_model}"
+        # 质量评分和预览图来自对所选模型的分析和渲染
+        model_path = os.path.join(models_dir, selected_model)
+        (quality_score, quality_metrics), preview_url = await asyncio.gather(
+            assess_model(None, model_path),
+            thumbnail_renderer.preview_url(None, model_path)
+        )
     else:
         model_url = f"/api/models/{model_id}.glb"  # 默认使用GLB格式
+        quality_score, quality_metrics, preview_url = None, None, None
     
     return {
         "model_id": model_id,
         "model_url": model_url,
-        "preview_url": f"/api/previews/{model_id}.jpg",
+        "preview_url": preview_url,
+        "quality_score": quality_score,
+        "quality_metrics": quality_metrics
+    }
+
+# Meshy预览阶段的复杂度设置
+PREVIEW_COMPLEXITY_SETTINGS = {
+    "low": {"art_style": "realistic", "should_remesh": False},
+    "medium": {"art_style": "realistic", "should_remesh": True},
+    "high": {"art_style": "realistic", "should_remesh": True, "negative_prompt": "low quality, low resolution, low poly, ugly"}
+}
+
+async def localize_file(download, url: Optional[str], model_id: str, label: str) -> Optional[str]:
+    """下载远程文件并返回前端可访问的本地URL，下载出错时回退为原始URL"""
+    if not url:
+        return None
+    try:
+        local_path = await download(url, model_id)
+        logger.info(f"{label}下载成功: {local_path}")
+        return get_file_url_for_frontend(local_path)
+    except Exception as download_error:
+        logger.warning(f"{label}下载失败: {download_error}，使用原始URL")
+        return url
+
+# 生成时立即下载到本地的格式，其余格式从本地GLB按需转换（obj/stl/ply）或保留Meshy的原始链接
+EAGER_DOWNLOAD_FORMATS = {name.strip() for name in settings.EAGER_DOWNLOAD_FORMATS.split(",") if name.strip()}
+
+async def ensure_preview(preview_url: Optional[str], model_url: Optional[str]) -> Optional[str]:
+    """预览图已下载到本地时直接使用，否则从本地存储的模型渲染缩略图（无法渲染时保留原地址）"""
+    if preview_url and preview_url.startswith(FILES_URL_PREFIX):
+        return preview_url
+    return await thumbnail_renderer.preview_url(model_url) or preview_url
+
+async def localize_all_formats(download_urls: Dict[str, str], model_id: str) -> Dict[str, str]:
+    """下载 EAGER_DOWNLOAD_FORMATS 中的格式并返回本地URL，出错时回退为原始URLs"""
+    download_urls = {name: url for name, url in download_urls.items() if name in EAGER_DOWNLOAD_FORMATS}
+    if not download_urls:
+        return {}
+    try:
+        local_paths = await download_all_formats(download_urls, model_id)
+        local_download_urls = {
+            format_name: get_file_url_for_frontend(local_path)
+            for format_name, local_path in local_paths.items()
+        }
+        logger.info(f"所有格式文件下载成功: {list(local_download_urls.keys())}")
+        return local_download_urls
+    except Exception as download_error:
+        logger.warning(f"批量文件下载失败: {download_error}，使用原始URLs")
+        return download_urls
+
+def merge_download_urls(model_url: str, download_urls: Dict[str, str],
+                        local_download_urls: Dict[str, str]) -> Dict[str, str]:
+    """
+    各格式的下载链接：已下载到本地的格式优先；模型已存入本地存储时，
+    GLB使用本地文件，obj/stl/ply 使用按需转换的链接，其余格式保留原始URL
+    """
+    urls = dict(download_urls)
+    if model_url and model_url.startswith(FILES_URL_PREFIX) and model_url.endswith(".glb"):
+        urls["glb"] = model_url
+        for format_name in CONVERSION_FORMATS:
+            urls[format_name] = f"{model_url}?format={format_name}"
+        if "obj" not in local_download_urls:
+            # 转换得到的OBJ压缩包已包含材质文件
+            urls.pop("mtl", None)
+    urls.update(local_download_urls)
+    return urls
+
+def meshy_enabled() -> bool:
+    """是否已配置Meshy API密钥（未配置时使用模拟生成）"""
+    return bool(meshy_client.api_key) and meshy_client.api_key != "your_meshy_api_key_here"
+
+async def find_existing_preview(text: str, reuse_similar: bool = False) -> Optional[dict]:
+    """
+    查找可直接复用的预览：先查缓存，再查规范化后相同的历史提示词；
+    请求方接受近似重复（reuse_similar）时，再查足够相似且内容词一致的历史提示词
+    
+    复用相似提示词时结果中附带 similar_prompt 和 similarity
+    """
+    with stats_recorder.timer("cache_lookup"), span("cache.lookup", reuse_similar=reuse_similar):
+        cached_result = await get_from_cache(preview_cache_key(text))
+        match = None
+        if not cached_result:
+            match = await asyncio.to_thread(prompt_index.find, text, reuse_similar)
+    if cached_result:
+        stats_recorder.incr("previews.cache_hits")
+        return cached_result
+    if not match:
+        stats_recorder.incr("previews.misses")
+        return None
+    stats_recorder.incr("previews.similar_hits")
+    record, similarity = match
+    logger.info(f"复用相似提示词的预览: {record['input_content']!r} (相似度 {similarity:.3f})")
+    return {
+        "task_id": record["id"],
+        "model_url": record["model_url"],
+        "preview_url": record["preview_url"],
+        "similar_prompt": record["input_content"],
+        "similarity": round(similarity, 4)
+    }
+
+async def run_text_preview(text: str, complexity: Optional[str], job: Optional[Job] = None) -> dict:
+    """
+    执行文本预览生成流程：创建Meshy任务、等待完成、下载文件、写入缓存和历史记录
+    
+    传入job时会记录Meshy任务ID和进度；若job中已有预览任务ID（服务重启后恢复），
+    则直接继续轮询该任务，不会重新创建
+    """
+    started = time.perf_counter()
+    if meshy_enabled():
+        task_id = job.meshy_tasks.get("preview") if job else None
+        if not task_id:
+            # 调用Meshy API创建预览任务
+            settings = PREVIEW_COMPLEXITY_SETTINGS.get(complexity, PREVIEW_COMPLEXITY_SETTINGS["medium"])
+            preview_response = await meshy_client.create_preview_task(
+                prompt=text,
+                **settings
+            )
+            task_id = preview_response['result']
+            if job:
+                await job.attach_task("preview", task_id)
+        
+        # 等待预览任务完成
+        preview_result = await meshy_client.wait_for_task_completion(
+            task_id,
+            on_progress=job.progress_callback("preview") if job else None
+        )
+        
+        # 提取模型文件和预览信息
+        model_url = None
+        preview_url = None
+        
+        # 获取GLB模型文件URL
+        if 'model_urls' in preview_result and 'glb' in preview_result['model_urls']:
+            model_url = preview_result['model_urls']['glb']
+        
+        # 获取预览图片URL
+        if 'thumbnail_url' in preview_result:
+            preview_url = preview_result['thumbnail_url']
+        
+        # 并行下载GLB模型文件和预览图片到本地
+        local_model_url, local_preview_url = await asyncio.gather(
+            localize_file(download_model_file, model_url, task_id, "预览模型"),
+            localize_file(download_preview_image, preview_url, task_id, "预览图片")
+        )
+        
+        result = {
+            "task_id": task_id,
+            "model_url": local_model_url or model_url
+        }
+        (quality_score, quality_metrics), result["preview_url"] = await asyncio.gather(
+            assess_model(result["model_url"]),
+            ensure_preview(local_preview_url or preview_url, result["model_url"])
+        )
+        logger.info(f"Meshy API预览生成成功: {task_id}")
+    else:
+        # 模拟预览生成
+        task_id = f"preview_{random.randint(1000, 9999)}"
+        simulation_result = await simulate_3d_generation(text, "text")
+        
+        result = {
+            "task_id": task_id,
+            "model_url": simulation_result["model_url"],
+            "preview_url": simulation_result["preview_url"]
+        }
+        quality_score, quality_metrics = simulation_result["quality_score"], simulation_result["quality_metrics"]
+    
+    # 保存到缓存
+    await save_to_cache(preview_cache_key(text), result)
+    
+    # 保存到历史记录
+    await asyncio.to_thread(save_model_to_history, {
+        "id": task_id,
+        "input_type": "text",
+        "input_content": text,
+        "stage": "preview",
+        "model_url": result["model_url"],
+        "preview_url": result["preview_url"],
+        "download_urls": merge_download_urls(result["model_url"], {"glb": result["model_url"]}, {}),
+        "quality_score": quality_score,
+        "quality_metrics": quality_metrics
+    })
+    model_processor.schedule(task_id, result["model_url"])
+    prompt_index.add({
+        "id": task_id,
+        "input_content": text,
+        "model_url": result["model_url"],
+        "preview_url": result["preview_url"],
         "quality_score": quality_score
+    })
+    stats_recorder.incr("generations.preview")
+    stats_recorder.observe("preview", time.perf_counter() - started)
+    
+    return result
+
+async def run_text_refine(preview_task_id: str, job: Optional[Job] = None) -> dict:
+    """
+    执行精细化流程：创建Meshy精细化任务、等待完成、下载所有格式、写入缓存和历史记录
+    
+    与 run_text_preview 相同，job中已记录的精细化任务ID会被直接复用
+    """
+    started = time.perf_counter()
+    if meshy_enabled():
+        refine_task_id = job.meshy_tasks.get("refine") if job else None
+        if not refine_task_id:
+            # 调用Meshy API创建精细化任务
+            refine_response = await meshy_client.create_refine_task(preview_task_id)
+            refine_task_id = refine_response['result']
+            if job:
+                await job.attach_task("refine", refine_task_id)
+        
+        # 等待精细化任务完成
+        refine_result = await meshy_client.wait_for_task_completion(
+            refine_task_id,
+            on_progress=job.progress_callback("refine") if job else None
+        )
+        
+        # 提取模型信息并下载文件
+        model_url = None  # GLB格式用于显示
+        preview_url = None
+        download_urls = {}
+        
+        # 获取GLB格式用于显示
+        if 'model_urls' in refine_result:
+            model_urls = refine_result['model_urls']
+            if 'glb' in model_urls:
+                model_url = model_urls['glb']
+            elif 'gltf' in model_urls:
+                model_url = model_urls['gltf']
+            
+            # 收集所有格式的下载链接
+            download_urls = model_urls.copy()
+        
+        # 获取预览图
+        if 'thumbnail_url' in refine_result:
+            preview_url = refine_result['thumbnail_url']
+        elif 'preview_url' in refine_result:
+            preview_url = refine_result['preview_url']
+        
+        # 模型文件、预览图片和所有格式并行下载到本地
+        local_model_url, local_preview_url, local_download_urls = await asyncio.gather(
+            localize_file(download_model_file, model_url, refine_task_id, "模型文件"),
+            localize_file(download_preview_image, preview_url, refine_task_id, "预览图片"),
+            localize_all_formats(download_urls, refine_task_id)
+        )
+        
+        (quality_score, quality_metrics), local_preview_url = await asyncio.gather(
+            assess_model(local_model_url),
+            ensure_preview(local_preview_url or preview_url, local_model_url)
+        )
+        result = {
+            "success": True,
+            "model_id": refine_result.get('id', refine_task_id),
+            "model_url": local_model_url or model_url,
+            "preview_url": local_preview_url,
+            "download_urls": merge_download_urls(local_model_url, download_urls, local_download_urls),
+            "message": "精细化完成",
+            "quality_score": quality_score,
+            "quality_metrics": quality_metrics,
+            "stage": "refined"
+        }
+        logger.info(f"Meshy API精细化成功: {refine_task_id}")
+    else:
+        # 模拟精细化生成
+        result = {
+            "success": True,
+            "model_id": f"refined_{preview_task_id}",
+            "model_url": "http://localhost:8000/api/files/models/refined_" + preview_task_id + ".glb",
+            "preview_url": None,  # 模拟的模型文件不存在，无法渲染预览图
+            "download_urls": {
+                "glb": "http://localhost:8000/api/files/models/refined_" + preview_task_id + ".glb",
+                "obj": "http://localhost:8000/api/files/models/refined_" + preview_task_id + ".obj",
+                "stl": "http://localhost:8000/api/files/models/refined_" + preview_task_id + ".stl",
+                "fbx": "http://localhost:8000/api/files/models/refined_" + preview_task_id + ".fbx"
+            },
+            "message": "精细化完成（模拟）",
+            "quality_score": None,  # 模拟的模型文件不存在，无法分析
+            "stage": "refined"
+        }
+    
+    # 保存到缓存
+    await save_to_cache(get_cache_key(preview_task_id, "text_refine"), result)
+    
+    # 保存到数据库历史记录
+    await asyncio.to_thread(save_model_to_history, {
+        "id": result["model_id"],
+        "input_type": "text",
+        "input_content": f"refined_{preview_task_id}",
+        "stage": "refined",
+        "model_url": result["model_url"],
+        "preview_url": result["preview_url"],
+        "download_urls": result.get("download_urls", {}),
+        "quality_score": result["quality_score"],
+        "quality_metrics": result.get("quality_metrics")
+    })
+    model_processor.schedule(result["model_id"], result["model_url"])
+    stats_recorder.incr("generations.refine")
+    stats_recorder.observe("refine", time.perf_counter() - started)
+    
+    return result
+
+def coalesced_text_preview(text: str, complexity: Optional[str], job: Optional[Job] = None) -> Awaitable[dict]:
+    """相同提示词的并发预览请求合并为一次Meshy任务"""
+    cache_key = preview_cache_key(text)
+    return single_flight.do(
+        cache_key,
+        lambda: run_text_preview(text, complexity, job=job),
+        lambda: get_from_cache(cache_key)
+    )
+
+def coalesced_text_refine(preview_task_id: str, job: Optional[Job] = None) -> Awaitable[dict]:
+    """同一预览任务的并发精细化请求合并为一次Meshy任务"""
+    cache_key = get_cache_key(preview_task_id, "text_refine")
+    return single_flight.do(
+        cache_key,
+        lambda: run_text_refine(preview_task_id, job=job),
+        lambda: get_from_cache(cache_key)
+    )
+
+async def handle_text_refine_job(job: Job) -> dict:
+    """后台任务：精细化指定的预览任务"""
+    preview_task_id = job.params["task_id"]
+    cached_result = await get_from_cache(get_cache_key(preview_task_id, "text_refine"))
+    if cached_result:
+        return cached_result
+    return await coalesced_text_refine(preview_task_id, job=job)
+
+async def handle_text_preview_job(job: Job) -> dict:
+    """后台任务：文本预览，params.refine 为真时在同一任务中继续精细化"""
+    text = job.params["text"]
+    result = await find_existing_preview(text, job.params.get("reuse_similar", False))
+    if not result:
+        result = await coalesced_text_preview(text, job.params.get("complexity"), job=job)
+    
+    if job.params.get("refine"):
+        job.params["task_id"] = result["task_id"]
+        result = dict(result, refined=await handle_text_refine_job(job))
+    return result
+
+# Meshy图片生成参数
+IMAGE_TASK_SETTINGS = {"ai_model": "meshy-5", "topology": "triangle", "target_polycount": 30000,
+                       "should_remesh": True, "should_texture": True}
+
+async def find_existing_image(sha256: str) -> Optional[dict]:
+    """
+    查找相同图片已生成的模型：先查缓存，再按上传内容查历史记录（缓存过期后同样不会重复生成）
+    """
+    cache_key = image_cache_key(sha256)
+    with stats_recorder.timer("cache_lookup"), span("cache.lookup", input_type="image"):
+        cached_result = await get_from_cache(cache_key)
+        record = None
+        if not cached_result:
+            record = await asyncio.to_thread(find_image_history, upload_refs(sha256))
+    if cached_result:
+        stats_recorder.incr("images.cache_hits")
+        return cached_result
+    if not record:
+        stats_recorder.incr("images.misses")
+        return None
+    stats_recorder.incr("images.history_hits")
+    result = {
+        "model_id": record["id"],
+        "model_url": record["model_url"],
+        "preview_url": record["preview_url"],
+        "download_urls": record["download_urls"],
+        "quality_score": record["quality_score"],
+        "image_url": f"/api/files/{record['input_content']}"
     }
+    await save_to_cache(cache_key, result)
+    return result
+
+async def run_image_generation(sha256: str, image_ref: str, job: Optional[Job] = None) -> dict:
+    """
+    执行图片生成流程：提交规范化后的图片创建Meshy任务、等待完成、下载文件、写入缓存和历史记录
+    
+    与 run_text_preview 相同，job中已记录的Meshy任务ID会被直接复用
+    """
+    started = time.perf_counter()
+    if meshy_enabled():
+        task_id = job.meshy_tasks.get("image") if job else None
+        if not task_id:
+            physical_path = await asyncio.to_thread(blob_store.resolve, image_ref)
+            if not physical_path:
+                raise Exception(f"上传的图片不存在: {image_ref}")
+            image_response = await meshy_client.create_image_task(
+                await image_source_url(image_ref, physical_path),
+                **IMAGE_TASK_SETTINGS
+            )
+            task_id = image_response['result']
+            if job:
+                await job.attach_task("image", task_id)
+        
+        # 等待图片生成任务完成
+        image_result = await meshy_client.wait_for_task_completion(
+            task_id,
+            on_progress=job.progress_callback("image") if job else None,
+            image=True
+        )
+        
+        model_urls = image_result.get('model_urls') or {}
+        model_url = model_urls.get('glb') or model_urls.get('gltf')
+        preview_url = image_result.get('thumbnail_url')
+        
+        # 模型文件、预览图片和所有格式并行下载到本地
+        local_model_url, local_preview_url, local_download_urls = await asyncio.gather(
+            localize_file(download_model_file, model_url, task_id, "模型文件"),
+            localize_file(download_preview_image, preview_url, task_id, "预览图片"),
+            localize_all_formats(model_urls, task_id)
+        )
+        
+        (quality_score, quality_metrics), local_preview_url = await asyncio.gather(
+            assess_model(local_model_url),
+            ensure_preview(local_preview_url or preview_url, local_model_url)
+        )
+        result = {
+            "model_id": task_id,
+            "model_url": local_model_url or model_url,
+            "preview_url": local_preview_url,
+            "download_urls": merge_download_urls(local_model_url, model_urls, local_download_urls),
+            "quality_score": quality_score,
+            "quality_metrics": quality_metrics
+        }
+        logger.info(f"Meshy API图片生成成功: {task_id}")
+    else:
+        # 模拟图片生成
+        result = await simulate_3d_generation(image_ref, "image")
+    result["image_url"] = f"/api/files/{image_ref}"
+    
+    # 保存到缓存
+    await save_to_cache(image_cache_key(sha256), result)
+    
+    # 保存到历史记录，input_content 为上传图片的逻辑路径，用于按内容查找已有结果
+    await asyncio.to_thread(save_model_to_history, {
+        "id": result["model_id"],
+        "input_type": "image",
+        "input_content": image_ref,
+        "stage": "generated",
+        "model_url": result["model_url"],
+        "preview_url": result["preview_url"],
+        "download_urls": result.get("download_urls", {}),
+        "quality_score": result["quality_score"],
+        "quality_metrics": result.get("quality_metrics")
+    })
+    model_processor.schedule(result["model_id"], result["model_url"])
+    stats_recorder.incr("generations.image")
+    stats_recorder.observe("image", time.perf_counter() - started)
+    
+    return result
+
+def coalesced_image_generation(sha256: str, image_ref: str, job: Optional[Job] = None) -> Awaitable[dict]:
+    """相同图片的并发生成请求合并为一次Meshy任务"""
+    cache_key = image_cache_key(sha256)
+    return single_flight.do(
+        cache_key,
+        lambda: run_image_generation(sha256, image_ref, job=job),
+        lambda: get_from_cache(cache_key)
+    )
+
+async def handle_image_job(job: Job) -> dict:
+    """后台任务：图片生成（上传的图片已在提交时规范化并存储）"""
+    sha256 = job.params["sha256"]
+    result = await find_existing_image(sha256)
+    if result:
+        return result
+    return await coalesced_image_generation(sha256, job.params["image_ref"], job=job)
+
+job_manager.register("text_preview", handle_text_preview_job)
+job_manager.register("text_refine", handle_text_refine_job)
+job_manager.register("image", handle_image_job)
+
+@app.on_event("startup")
+async def start_job_manager():
+    """
+    工作进程启动时初始化数据库和存储目录、连接Redis，启动后台任务队列并认领未完成的任务
+    （模块导入时不做任何初始化，多进程部署时每个工作进程各自执行）
+    """
+    setup_tracing()
+    await asyncio.to_thread(init_database)
+    await asyncio.to_thread(init_storage)
+    await redis_pool.start()
+    stats_recorder.start()
+    await job_manager.start()
+    storage_manager.start()
+    cache.start()
+    await asyncio.to_thread(prompt_index.refresh, True)
+
+@app.on_event("shutdown")
+async def close_meshy_client():
+    """应用关闭时停止任务队列、模型后处理、存储管理器、缓存清理，写入剩余统计和span，关闭Redis连接池、进程池并释放共享HTTP连接池"""
+    await job_manager.stop()
+    await model_processor.stop()
+    await storage_manager.stop()
+    await cache.stop()
+    await stats_recorder.stop()
+    await redis_pool.close()
+    await http_transport.aclose()
+    await asyncio.to_thread(shutdown_process_pool)
+    shutdown_tracing()
 
 @app.get("/")
 async def root():
@@ -176,144 +736,39 @@ async def generate_preview_from_text(request: TextGenerateRequest):
     生成3D模型预览（第一阶段）
     """
     try:
-        # 检查缓存
-        cache_key = get_cache_key(request.text, "text_preview")
-        cached_result = get_from_cache(cache_key)
+        # 检查缓存及相似的历史预览
+        cached_result = await find_existing_preview(request.text, request.reuse_similar)
         if cached_result:
+            similarity = cached_result.get("similarity")
+            if similarity is None:
+                source = "来自缓存"
+            elif similarity >= 1.0:
+                source = "来自历史记录"
+            else:
+                source = "复用相似提示词的模型"
             return PreviewResponse(
                 success=True,
                 task_id=cached_result["task_id"],
-                message="预览生成成功（来自缓存）",
-                preview_url=cached_result.get("preview_url")
-            )
-
-        # 检查Meshy API密钥
-        if meshy_client.api_key and meshy_client.api_key != "your_meshy_api_key_here":
-            try:
-                # 复杂度设置
-                complexity_settings = {
-                    "low": {"art_style": "realistic", "should_remesh": False},
-                    "medium": {"art_style": "realistic", "should_remesh": True},
-                    "high": {"art_style": "realistic", "should_remesh": True, "negative_prompt": "low quality, low resolution, low poly, ugly"}
-                }
-                settings = complexity_settings.get(request.complexity, complexity_settings["medium"])
-                
-                # 调用Meshy API创建预览任务
-                preview_response = meshy_client.create_preview_task(
-                    prompt=request.text,
-                    **settings
-                )
-                
-                task_id = preview_response['result']
-                
-                # 等待预览任务完成
-                preview_result = meshy_client.wait_for_task_completion(task_id)
-                
-                # 提取模型文件和预览信息
-                model_url = None
-                preview_url = None
-                local_model_url = None
-                local_preview_url = None
-                
-                # 获取GLB模型文件URL
-                if 'model_urls' in preview_result and 'glb' in preview_result['model_urls']:
-                    model_url = preview_result['model_urls']['glb']
-                
-                # 获取预览图片URL
-                if 'thumbnail_url' in preview_result:
-                    preview_url = preview_result['thumbnail_url']
-                
-                # 下载GLB模型文件到本地
-                if model_url:
-                    try:
-                        local_model_path = download_model_file(model_url, task_id)
-                        local_model_url = get_file_url_for_frontend(local_model_path)
-                        logger.info(f"预览模型下载成功: {local_model_path}")
-                    except Exception as download_error:
-                        logger.warning(f"预览模型下载失败: {download_error}，使用原始URL")
-                        local_model_url = model_url
-                
-                # 下载预览图片到本地
-                if preview_url:
-                    try:
-                        local_preview_path = download_preview_image(preview_url, task_id)
-                        local_preview_url = get_file_url_for_frontend(local_preview_path)
-                        logger.info(f"预览图片下载成功: {local_preview_path}")
-                    except Exception as download_error:
-                        logger.warning(f"预览图片下载失败: {download_error}，使用原始URL")
-                        local_preview_url = preview_url
-                
-                result = {
-                    "task_id": task_id,
-                    "model_url": local_model_url or model_url,
-                    "preview_url": local_preview_url or preview_url
-                }
-                
-                # 保存到缓存
-                save_to_cache(cache_key, result)
-                
-                # 保存到历史记录
-                save_model_to_history({
-                    "id": task_id,
-                    "input_type": "text",
-                    "input_content": request.text,
-                    "stage": "preview",
-                    "model_url": local_model_url or result["model_url"],
-                    "preview_url": local_preview_url or result["preview_url"],
-                    "download_urls": {"glb": local_model_url or result["model_url"]},
-                    "quality_score": 0.8
-                })
-                
-                logger.info(f"Meshy API预览生成成功: {task_id}")
-                
-                return PreviewResponse(
-                    success=True,
-                    task_id=task_id,
-                    message="预览生成成功",
-                    preview_url=result["model_url"],  # GLB模型文件
-                    thumbnail_url=result["preview_url"]  # 缩略图
-                )
-                
-            except Exception as meshy_error:
-                logger.error(f"Meshy API预览生成失败: {meshy_error}")
-                raise HTTPException(status_code=500, detail=f"预览生成失败: {str(meshy_error)}")
-        else:
-            # 模拟预览生成
-            task_id = f"preview_{random.randint(1000, 9999)}"
-            
-            # 使用模拟的3D模型生成
-            simulation_result = await simulate_3d_generation(request.text, "text")
-            
-            result = {
-                "task_id": task_id,
-                "model_url": simulation_result["model_url"],
-                "preview_url": simulation_result["preview_url"]
-            }
-            save_to_cache(cache_key, result)
-            
-            # 保存到历史记录
-            save_model_to_history({
-                "id": task_id,
-                "input_type": "text",
-                "input_content": request.text,
-                "stage": "preview",
-                "model_url": result["model_url"],
-                "preview_url": result["preview_url"],
-                "download_urls": {"glb": result["model_url"]},
-                "quality_score": simulation_result["quality_score"]
-            })
-            
-            return PreviewResponse(
-                success=True,
-                task_id=task_id,
-                message="预览生成成功（模拟）",
-                preview_url=result["model_url"],  # GLB模型文件
-                thumbnail_url=result["preview_url"]  # 缩略图
+                message=f"预览生成成功（{source}）",
+                preview_url=cached_result.get("model_url"),
+                thumbnail_url=cached_result.get("preview_url"),
+                similar_prompt=cached_result.get("similar_prompt"),
+                similarity=similarity
             )
+        
+        result = await coalesced_text_preview(request.text, request.complexity)
+        
+        return PreviewResponse(
+            success=True,
+            task_id=result["task_id"],
+            message="预览生成成功" if meshy_enabled() else "预览生成成功（模拟）",
+            preview_url=result["model_url"],  # GLB模型文件
+            thumbnail_url=result["preview_url"]  # 缩略图
+        )
             
     except Exception as e:
         logger.error(f"预览生成错误: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"预览生成失败: {str(e)}")
 
 @app.post("/api/generate/text/refine", response_model=GenerateResponse)
 async def refine_text_model(request: RefineRequest):
@@ -323,146 +778,92 @@ async def refine_text_model(request: RefineRequest):
     try:
         # 检查缓存
         cache_key = get_cache_key(request.task_id, "text_refine")
-        cached_result = get_from_cache(cache_key)
+        cached_result = await get_from_cache(cache_key)
         if cached_result:
             return GenerateResponse(**cached_result)
-
-        # 检查Meshy API密钥
-        if meshy_client.api_key and meshy_client.api_key != "your_meshy_api_key_here":
-            try:
-                # 调用Meshy API创建精细化任务
-                refine_response = meshy_client.create_refine_task(request.task_id)
-                refine_task_id = refine_response['result']
-                
-                # 等待精细化任务完成
-                refine_result = meshy_client.wait_for_task_completion(refine_task_id)
-                
-                # 提取模型信息并下载文件
-                model_url = None  # GLB格式用于显示
-                preview_url = None
-                download_urls = {}
-                local_model_url = None
-                local_preview_url = None
-                local_download_urls = {}
-                
-                # 获取GLB格式用于显示
-                if 'model_urls' in refine_result:
-                    model_urls = refine_result['model_urls']
-                    if 'glb' in model_urls:
-                        model_url = model_urls['glb']
-                    elif 'gltf' in model_urls:
-                        model_url = model_urls['gltf']
-                    
-                    # 收集所有格式的下载链接
-                    download_urls = model_urls.copy()
-                
-                # 获取预览图
-                if 'thumbnail_url' in refine_result:
-                    preview_url = refine_result['thumbnail_url']
-                elif 'preview_url' in refine_result:
-                    preview_url = refine_result['preview_url']
-                
-                # 下载模型文件到本地
-                if model_url:
-                    try:
-                        local_model_path = download_model_file(model_url, refine_task_id)
-                        local_model_url = get_file_url_for_frontend(local_model_path)
-                        logger.info(f"模型文件下载成功: {local_model_path}")
-                    except Exception as download_error:
-                        logger.warning(f"模型文件下载失败: {download_error}，使用原始URL")
-                        local_model_url = model_url
-                
-                # 下载预览图片到本地
-                if preview_url:
-                    try:
-                        local_preview_path = download_preview_image(preview_url, refine_task_id)
-                        local_preview_url = get_file_url_for_frontend(local_preview_path)
-                        logger.info(f"预览图片下载成功: {local_preview_path}")
-                    except Exception as download_error:
-                        logger.warning(f"预览图片下载失败: {download_error}，使用原始URL")
-                        local_preview_url = preview_url
-                
-                # 下载所有格式的文件
-                if download_urls:
-                    try:
-                        local_paths = download_all_formats(download_urls, refine_task_id)
-                        for format_name, local_path in local_paths.items():
-                            local_download_urls[format_name] = get_file_url_for_frontend(local_path)
-                        logger.info(f"所有格式文件下载成功: {list(local_download_urls.keys())}")
-                    except Exception as download_error:
-                        logger.warning(f"批量文件下载失败: {download_error}，使用原始URLs")
-                        local_download_urls = download_urls
-                
-                result = {
-                    "success": True,
-                    "model_id": refine_result.get('id', refine_task_id),
-                    "model_url": local_model_url or model_url,
-                    "preview_url": local_preview_url or preview_url,
-                    "download_urls": local_download_urls or download_urls,
-                    "message": "精细化完成",
-                    "quality_score": random.uniform(0.85, 0.98),
-                    "stage": "refined"
-                }
-                
-                # 保存到缓存
-                save_to_cache(cache_key, result)
-                
-                # 保存到数据库历史记录
-                save_model_to_history({
-                    "id": result["model_id"],
-                    "input_type": "text",
-                    "input_content": f"refined_{request.task_id}",
-                    "stage": "refined",
-                    "model_url": result["model_url"],
-                    "preview_url": result["preview_url"],
-                    "download_urls": result.get("download_urls", {}),
-                    "quality_score": result["quality_score"]
-                })
-                
-                logger.info(f"Meshy API精细化成功: {refine_task_id}")
-                
-                return GenerateResponse(**result)
-                
-            except Exception as meshy_error:
-                logger.error(f"Meshy API精细化失败: {meshy_error}")
-                raise HTTPException(status_code=500, detail=f"精细化失败: {str(meshy_error)}")
-        else:
-            # 模拟精细化生成
-            result = {
-                "success": True,
-                "model_id": f"refined_{request.task_id}",
-                "model_url": "http://localhost:8000/api/files/models/refined_" + request.task_id + ".glb",
-                "preview_url": "http://localhost:8000/api/files/previews/refined_" + request.task_id + ".jpg",
-                "download_urls": {
-                    "glb": "http://localhost:8000/api/files/models/refined_" + request.task_id + ".glb",
-                    "obj": "http://localhost:8000/api/files/models/refined_" + request.task_id + ".obj",
-                    "stl": "http://localhost:8000/api/files/models/refined_" + request.task_id + ".stl",
-                    "fbx": "http://localhost:8000/api/files/models/refined_" + request.task_id + ".fbx"
-                },
-                "message": "精细化完成（模拟）",
-                "quality_score": random.uniform(0.85, 0.98),
-                "stage": "refined"
-            }
-            
-            save_to_cache(cache_key, result)
-            
-            # 保存到数据库历史记录
-            save_model_to_history({
-                "id": result["model_id"],
-                "input_type": "text",
-                "input_content": f"refined_{request.task_id}",
-                "stage": "refined",
-                "model_url": result["model_url"],
-                "preview_url": result["preview_url"],
-                "download_urls": result.get("download_urls", {}),
-                "quality_score": result["quality_score"]
-            })
-            
-            return GenerateResponse(**result)
+        
+        result = await coalesced_text_refine(request.task_id)
+        return GenerateResponse(**result)
             
     except Exception as e:
         logger.error(f"精细化错误: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"精细化失败: {str(e)}")
+
+def job_to_response(job: Job) -> JobResponse:
+    """将后台任务转换为API响应"""
+    data = job.to_dict()
+    return JobResponse(
+        job_id=data["id"],
+        kind=data["kind"],
+        status=data["status"],
+        stage=data["stage"],
+        progress=data["progress"],
+        result=data["result"],
+        error=data["error"],
+        created_at=data["created_at"],
+        updated_at=data["updated_at"]
+    )
+
+@app.post("/api/jobs/text/preview", response_model=JobResponse, status_code=202)
+async def submit_preview_job(request: JobSubmitRequest):
+    """提交文本预览后台任务，立即返回任务ID"""
+    job = await job_manager.submit("text_preview", {
+        "text": request.text,
+        "complexity": request.complexity,
+        "refine": request.refine,
+        "reuse_similar": request.reuse_similar
+    })
+    return job_to_response(job)
+
+@app.post("/api/jobs/text/refine", response_model=JobResponse, status_code=202)
+async def submit_refine_job(request: RefineRequest):
+    """提交精细化后台任务，立即返回任务ID"""
+    job = await job_manager.submit("text_refine", {"task_id": request.task_id})
+    return job_to_response(job)
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    """查询后台任务状态和进度"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_to_response(job)
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """通过Server-Sent Events推送任务进度，任务结束后关闭连接"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    async def event_stream():
+        queue = job_manager.subscribe(job_id)
+        try:
+            snapshot = job_to_response(await job_manager.get(job_id) or job).dict()
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            idle = 0.0
+            while snapshot["status"] not in TERMINAL_STATUSES:
+                # 任务由其他工作进程执行时本进程收不到推送，按间隔从数据库读取
+                local = job_id in job_manager.jobs
+                timeout = 15 if local else JOB_EVENTS_POLL_INTERVAL
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    current = None if local else await job_manager.get(job_id)
+                    update = current.to_dict() if current else None
+                    if update is None or update["updated_at"] == snapshot["updated_at"]:
+                        idle += timeout
+                        if idle >= 15:
+                            idle = 0.0
+                            yield ": keep-alive\n\n"
+                        continue
+                idle = 0.0
+                snapshot = job_to_response(Job(**update)).dict()
+                yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+        finally:
+            job_manager.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 async def generate_from_text_legacy(request: TextGenerateRequest):
     """
     传统的一步式文本生成3D模型接口（兼容性保留）
@@ -472,7 +873,7 @@ async def generate_from_text_legacy(request: TextGenerateRequest):
     try:
         # 检查缓存
         cache_key = get_cache_key(request.text, "text")
-        cached_result = get_from_cache(cache_key)
+        cached_result = await get_from_cache(cache_key)
         
         if cached_result:
             return GenerateResponse(
@@ -500,7 +901,7 @@ async def generate_from_text_legacy(request: TextGenerateRequest):
                 settings = complexity_settings.get(request.complexity, complexity_settings["medium"])
                 
                 # 调用Meshy API生成模型
-                meshy_result = meshy_client.generate_3d_model(
+                meshy_result = await meshy_client.generate_3d_model(
                     prompt=request.text,
                     enable_refine=True,
                     **settings
@@ -542,7 +943,7 @@ async def generate_from_text_legacy(request: TextGenerateRequest):
                     "model_id": model_id or f"meshy_{random.randint(1000, 9999)}",
                     "model_url": model_url,
                     "preview_url": preview_url,
-                    "quality_score": random.uniform(0.85, 0.98)  # Meshy生成的模型质量较高
+                    "quality_score": None  # 模型未存入本地存储，无法分析
                 }
                 
                 logger.info(f"Meshy API生成成功: {model_id}, 模型URL: {model_url}")
@@ -553,18 +954,23 @@ async def generate_from_text_legacy(request: TextGenerateRequest):
                 result = await simulate_3d_generation(request.text, "text")
         
         # 保存到缓存
-        save_to_cache(cache_key, result)
+        await save_to_cache(cache_key, result)
+        
+        stats_recorder.incr("generations.legacy")
         
         # 保存到历史记录
-        model_info = ModelInfo(
-            id=result["model_id"],
-            input_type="text",
-            input_content=request.text,
-            created_at=datetime.now().isoformat(),
-            model_url=result["model_url"],
-            quality_score=result["quality_score"]
-        )
-        model_history.append(model_info.dict())
+        await asyncio.to_thread(save_model_to_history, {
+            "id": result["model_id"],
+            "input_type": "text",
+            "input_content": request.text,
+            "complexity": request.complexity,
+            "format": request.format,
+            "stage": "generated",
+            "model_url": result["model_url"],
+            "preview_url": result["preview_url"],
+            "quality_score": result["quality_score"],
+            "quality_metrics": result.get("quality_metrics")
+        })
         
         return GenerateResponse(
             success=True,
@@ -578,96 +984,185 @@ async def generate_from_text_legacy(request: TextGenerateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
 
+async def receive_image(file: UploadFile):
+    """校验类型并接收上传的图片到暂存文件"""
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="请上传图片文件")
+    try:
+        return await receive_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 @app.post("/api/generate/image", response_model=GenerateResponse)
 async def generate_from_image(file: UploadFile = File(...)):
-    """根据图片生成3D模型"""
+    """
+    根据图片生成3D模型
+    
+    上传内容按块写入暂存文件并计算SHA-256（不整体读入内存），超过 MAX_UPLOAD_SIZE 返回413；
+    相同内容的图片（包括缓存过期后）直接返回已有模型，不会重复调用Meshy
+    """
+    upload = await receive_image(file)
     try:
-        # 验证文件类型
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="请上传图片文件")
-        
-        # 读取文件内容
-        content = await file.read()
-        content_hash = hashlib.md5(content).hexdigest()
-        
-        # 检查缓存
-        cache_key = get_cache_key(content_hash, "image")
-        cached_result = get_from_cache(cache_key)
-        
+        cached_result = await find_existing_image(upload.sha256)
         if cached_result:
             return GenerateResponse(
                 success=True,
                 model_id=cached_result["model_id"],
                 model_url=cached_result["model_url"],
                 preview_url=cached_result["preview_url"],
+                download_urls=cached_result.get("download_urls"),
                 message="从缓存获取模型",
                 quality_score=cached_result["quality_score"]
             )
         
-        # 生成新模型
-        result = await simulate_3d_generation(file.filename, "image")
+        async def generate() -> dict:
+            # 校验并规范化图片，存入内容寻址存储后提交生成
+            image_ref, _ = await store_upload(upload)
+            return await run_image_generation(upload.sha256, image_ref)
         
-        # 保存到缓存
-        save_to_cache(cache_key, result)
-        
-        # 保存到数据库历史记录
-        save_model_to_history({
-            "id": result["model_id"],
-            "input_type": "image",
-            "input_content": file.filename,
-            "stage": "generated",
-            "model_url": result["model_url"],
-            "preview_url": result["preview_url"],
-            "download_urls": result.get("download_urls", {}),
-            "quality_score": result["quality_score"]
-        })
+        # 相同图片的并发请求只生成一次
+        cache_key = image_cache_key(upload.sha256)
+        result = await single_flight.do(cache_key, generate, lambda: get_from_cache(cache_key))
         
         return GenerateResponse(
             success=True,
             model_id=result["model_id"],
             model_url=result["model_url"],
             preview_url=result["preview_url"],
+            download_urls=result.get("download_urls"),
             message="3D模型生成成功",
             quality_score=result["quality_score"]
         )
         
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.error(f"图片生成错误: {e}")
         raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
+    finally:
+        upload.discard()
+
+@app.post("/api/jobs/image", response_model=JobResponse, status_code=202)
+async def submit_image_job(file: UploadFile = File(...)):
+    """提交图片生成后台任务：图片在提交时校验并存储，立即返回任务ID"""
+    upload = await receive_image(file)
+    try:
+        image_ref, _ = await store_upload(upload)
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        upload.discard()
+    job = await job_manager.submit("image", {
+        "sha256": upload.sha256,
+        "image_ref": image_ref,
+        "filename": upload.filename
+    })
+    return job_to_response(job)
+
+@app.get("/api/history", response_model=List[ModelInfo], response_model_exclude_unset=True)
+async def get_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="每页条数"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 中的游标"),
+    stage: Optional[str] = Query(None, description="preview / refined"),
+    input_type: Optional[str] = Query(None, description="text / image"),
+    since: Optional[str] = Query(None, description="创建时间下限（ISO格式）"),
+    until: Optional[str] = Query(None, description="创建时间上限（ISO格式）"),
+    min_quality: Optional[float] = Query(None, ge=0, le=1),
+    max_quality: Optional[float] = Query(None, ge=0, le=1),
+    fields: str = Query("summary", pattern="^(summary|full)$", description="summary: 列表字段；full: 含下载链接等全部字段")
+):
+    """获取生成历史（按创建时间倒序，游标分页，下一页游标在响应头 X-Next-Cursor 中）"""
+    summary = fields == "summary"
+    try:
+        records, next_cursor = await asyncio.to_thread(
+            query_model_history,
+            limit, cursor,
+            stage=stage, input_type=input_type,
+            created_after=since, created_before=until,
+            min_quality=min_quality, max_quality=max_quality,
+            summary=summary
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    # 只设置所选字段，未设置的字段不会出现在响应中
+    columns = HISTORY_SUMMARY_COLUMNS if summary else HISTORY_FULL_COLUMNS
+    model_fields = [column for column in columns if column in ModelInfo.model_fields]
+    return [
+        ModelInfo(**{column: record.get(column) for column in model_fields})
+        for record in records
+    ]
 
-@app.get("/api/history", response_model=List[ModelInfo])
-async def get_history():
-    """获取生成历史"""
-    # 从数据库获取历史记录
-    db_history = get_model_history()
-    
-    # 转换为API响应格式
-    history = []
-    for record in db_history:
-        history.append(ModelInfo(
-            id=record['id'],
-            input_type=record['input_type'],
-            input_content=record['input_content'],
-            created_at=record['created_at'],
-            model_url=record.get('model_url'),  # GLB模型文件URL
-            preview_url=record.get('preview_url'),  # 缩略图URL
-            quality_score=record.get('quality_score')
-        ))
-    
-    return history
+@app.get("/api/history/search", response_model=List[SearchResult], response_model_exclude_unset=True)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索词，空格分隔的多个词需同时命中"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    stage: Optional[str] = Query(None, description="preview / refined"),
+    input_type: Optional[str] = Query(None, description="text / image")
+):
+    """按提示词搜索历史记录，便于复用已生成的模型"""
+    results = await asyncio.to_thread(
+        search_model_history, q, limit, offset, stage=stage, input_type=input_type
+    )
+    return [SearchResult(**result) for result in results]
 
 @app.get("/api/stats")
 async def get_stats():
-    """获取统计信息"""
-    total_models = len(model_history)
-    avg_quality = sum(m.get("quality_score", 0) for m in model_history) / max(total_models, 1)
+    """
+    获取统计信息
+    
+    计数和耗时分布来自所有工作进程共享的计数器表（各进程最多延迟 STATS_FLUSH_INTERVAL 秒写入），
+    读取代价与历史记录数量无关；worker 部分为处理本次请求的工作进程的实时状态
+    """
+    counters = summarize_counters(await asyncio.to_thread(stats_recorder.snapshot))
+    history = counters.pop("history", {})
+    previews = counters.get("previews", {})
+    quality_count = history.get("quality_count", 0)
     
     return {
-        "total_models": total_models,
-        "average_quality": round(avg_quality, 2),
-        "cache_hits": len(memory_cache) if not redis_client else "Redis缓存",
-        "api_calls_saved": sum(1 for m in model_history if "缓存" in m.get("message", ""))
+        "total_models": history.get("models", 0),
+        "average_quality": round(history.get("quality_sum", 0) / quality_count, 2) if quality_count else 0.0,
+        "api_calls_saved": sum(counters.get(group, {}).get(key, 0) for group, key in (
+            ("previews", "cache_hits"), ("previews", "similar_hits"),
+            ("images", "cache_hits"), ("images", "history_hits"))),
+        "generations": counters.get("generations", {}),
+        "previews": previews,
+        "images": counters.get("images", {}),
+        "cache": counters.get("cache", {}),
+        "meshy": counters.get("meshy", {}),
+        "downloads": counters.get("downloads", {}),
+        "processing": counters.get("processing", {}),
+        "conversions": counters.get("conversions", {}),
+        "quality": counters.get("quality", {}),
+        "thumbnails": counters.get("thumbnails", {}),
+        "latency": counters.get("latency", {}),
+        "throughput": counters.get("throughput", {}),
+        "worker": {
+            "pid": os.getpid(),
+            "cache": cache.get_stats(),
+            "redis": redis_pool.get_stats(),
+            "coalesced_requests": single_flight.stats,
+            "coalesced_conversions": format_converter.flight.stats,
+            "coalesced_thumbnails": thumbnail_renderer.flight.stats,
+            "prompt_reuse": prompt_index.stats
+        }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus 指标（文本格式 0.0.4）
+    
+    与 /api/stats 读取同一组共享计数器，抓取任意工作进程得到的都是全部进程的合计
+    """
+    counters = await asyncio.to_thread(stats_recorder.snapshot)
+    return PlainTextResponse(render_prometheus(counters), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/models")
 async def list_models():
     """获取可用的模型文件列表"""
@@ -694,13 +1189,20 @@ async def list_models():
     return {"models": models}
 
 @app.get("/api/models/{filename}")
-async def get_model_file(filename: str):
+async def get_model_file(
+    filename: str,
+    request: Request,
+    lod: int = Query(0, ge=0, description="LOD级别，0为原始模型（仅GLB）"),
+    extensions: Optional[str] = Query(None, description="客户端支持的glTF扩展，逗号分隔（也可用 X-GLTF-Extensions 请求头）")
+):
     """获取指定的模型文件"""
     # 使用file_manager中的STORAGE_BASE路径
     models_dir = os.path.join(STORAGE_BASE, "models")
-    file_path = os.path.join(models_dir, filename)
-    
-    if not os.path.exists(file_path) or not filename.endswith(('.obj', '.glb')):
+    local_path = os.path.join(models_dir, os.path.basename(filename))
+    if not filename.endswith(('.obj', '.glb')):
+        raise HTTPException(status_code=404, detail="模型文件未找到")
+    file_path, headers = await asyncio.to_thread(resolve_model_file, local_path, lod, request, extensions)
+    if not file_path:
         raise HTTPException(status_code=404, detail="模型文件未找到")
     
     # 根据文件类型设置正确的媒体类型
@@ -714,18 +1216,167 @@ async def get_model_file(filename: str):
         path=file_path,
         media_type=media_type,
         filename=filename,
-        headers={"Access-Control-Allow-Origin": "*"}
+        headers={"Access-Control-Allow-Origin": "*", **headers}
     )
 
-if __name__ == "__main__":
-    # 从环境变量获取配置
-    host = os.getenv("API_HOST", "0.0.0.0")
-    port = int(os.getenv("API_PORT", "8000"))
-    reload = os.getenv("API_RELOAD", "true").lower() == "true"
+def resolve_model_file(local_path: str, lod: int, request: Request,
+                       extensions: Optional[str]) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    解析文件的实际路径；GLB模型按请求的LOD级别和客户端声明支持的glTF扩展、
+    Accept-Encoding 选择原始、优化或gzip预压缩的版本
+    （需查询数据库和检查文件，在线程中调用）
+    
+    Returns:
+        (实际文件路径, 额外的响应头)
+    """
+    if not local_path.endswith('.glb'):
+        return get_physical_path(local_path), {}
+    advertised = ",".join(filter(None, (extensions, request.headers.get("x-gltf-extensions"))))
+    accept_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    physical_path, headers = resolve_model_variant(to_ref(local_path), lod, advertised.split(","), accept_gzip)
+    if not physical_path:
+        # 旧版直接存放在目录中的文件没有LOD和优化版本
+        return get_physical_path(local_path), {}
+    return physical_path, headers
+
+def storage_local_path(file_path: str) -> str:
+    """将URL中的相对路径转换为storage目录下的本地路径，拒绝越出storage目录的路径"""
+    storage_root = os.path.abspath(STORAGE_BASE)
+    local_path = os.path.abspath(os.path.join(storage_root, file_path))
+    if not local_path.startswith(storage_root + os.sep):
+        raise HTTPException(status_code=404, detail="文件未找到")
+    return local_path
+
+@app.get("/api/files/{file_path:path}")
+async def get_stored_file(
+    file_path: str,
+    request: Request,
+    lod: int = Query(0, ge=0, description="LOD级别，0为原始模型（仅GLB）"),
+    extensions: Optional[str] = Query(None, description="客户端支持的glTF扩展，逗号分隔（也可用 X-GLTF-Extensions 请求头）"),
+    file_format: Optional[str] = Query(None, alias="format", description="转换为其他格式下载: " + " / ".join(CONVERSION_FORMATS) + "（仅GLB）")
+):
+    """获取存储的文件，逻辑路径通过内容寻址存储解析到实际文件"""
+    local_path = storage_local_path(file_path)
+    if file_format:
+        return await get_converted_file(local_path, file_format)
+    physical_path, headers = await asyncio.to_thread(resolve_model_file, local_path, lod, request, extensions)
+    if not physical_path:
+        raise HTTPException(status_code=404, detail="文件未找到")
     
-    if reload:
+    # 实体文件没有扩展名，媒体类型按请求的逻辑路径判断
+    media_type = mimetypes.guess_type(local_path)[0] or 'application/octet-stream'
+    return FileResponse(path=physical_path, media_type=media_type, headers=headers)
+
+async def get_converted_file(local_path: str, file_format: str) -> FileResponse:
+    """返回GLB模型转换为 file_format 后的文件，第一次请求时转换并缓存"""
+    if file_format not in CONVERSION_FORMATS or not local_path.endswith(".glb"):
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {file_format}")
+    source_path = await asyncio.to_thread(get_physical_path, local_path)
+    if not source_path:
+        raise HTTPException(status_code=404, detail="文件未找到")
+    try:
+        physical_path = await format_converter.get(source_path, file_format)
+    except Exception as e:
+        logger.warning(f"格式转换失败 {local_path} -> {file_format}: {e}")
+        raise HTTPException(status_code=422, detail=f"模型无法转换为 {file_format}")
+    media_type, suffix = CONVERSION_FORMATS[file_format]
+    filename = os.path.splitext(os.path.basename(local_path))[0] + suffix
+    return FileResponse(path=physical_path, media_type=media_type, filename=filename)
+
+@app.get("/api/thumbnails/{file_path:path}")
+async def get_thumbnail(
+    file_path: str,
+    size: Optional[int] = Query(None, description="缩略图边长，取值见 THUMBNAIL_SIZES，默认最大尺寸")
+):
+    """存储中GLB/OBJ模型的缩略图，第一次请求时渲染所有尺寸并按模型内容缓存"""
+    size = size or thumbnail_renderer.sizes[0]
+    if size not in thumbnail_renderer.sizes:
+        raise HTTPException(status_code=400, detail=f"不支持的尺寸: {size}，可选 {thumbnail_renderer.sizes}")
+    local_path = storage_local_path(file_path)
+    if not local_path.endswith(('.glb', '.obj')):
+        raise HTTPException(status_code=400, detail="只支持GLB和OBJ模型")
+    source_path = await asyncio.to_thread(get_physical_path, local_path)
+    if not source_path:
+        raise HTTPException(status_code=404, detail="文件未找到")
+    try:
+        refs = await thumbnail_renderer.render(source_path, os.path.splitext(local_path)[1][1:])
+    except Exception as e:
+        logger.warning(f"缩略图渲染失败 {file_path}: {e}")
+        raise HTTPException(status_code=422, detail="模型无法渲染")
+    physical_path = await asyncio.to_thread(blob_store.resolve, refs[size])
+    if not physical_path:
+        # 刚渲染完就被淘汰的极端情况
+        raise HTTPException(status_code=503, detail="缩略图暂不可用，请重试")
+    return FileResponse(path=physical_path, media_type="image/jpeg")
+
+@app.get("/api/admin/storage")
+async def get_storage_stats():
+    """内容寻址存储的去重统计、各分类用量与配额"""
+    dedup, status = await asyncio.gather(
+        asyncio.to_thread(blob_store.get_dedup_stats),
+        asyncio.to_thread(storage_manager.get_status)
+    )
+    return {**dedup, **status}
+
+@app.post("/api/admin/storage/evict")
+async def run_storage_eviction():
+    """立即执行一轮配额淘汰"""
+    await asyncio.to_thread(storage_manager.run_pass)
+    return await asyncio.to_thread(storage_manager.get_status)
+
+@app.put("/api/admin/storage/pins/{file_path:path}")
+async def pin_stored_file(file_path: str):
+    """固定文件，使其不会被淘汰"""
+    ref = to_ref(storage_local_path(file_path))
+    if not await asyncio.to_thread(storage_manager.pin, ref, True):
+        raise HTTPException(status_code=404, detail="文件未找到")
+    return {"ref": ref, "pinned": True}
+
+@app.delete("/api/admin/storage/pins/{file_path:path}")
+async def unpin_stored_file(file_path: str):
+    """取消固定文件"""
+    ref = to_ref(storage_local_path(file_path))
+    if not await asyncio.to_thread(storage_manager.pin, ref, False):
+        raise HTTPException(status_code=404, detail="文件未找到")
+    return {"ref": ref, "pinned": False}
+
+def run_gunicorn(host: str, port: int, workers: int):
+    """用 gunicorn 管理 UvicornWorker 工作进程（崩溃自动重启、平滑重启）"""
+    from gunicorn.app.base import BaseApplication
+    
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+        
+        def load(self):
+            return app
+    
+    Application().run()
+
+def serve():
+    """
+    按配置启动服务：
+    - API_RELOAD=true：开发模式，单进程自动重载
+    - 否则启动 API_WORKERS 个工作进程，由 uvicorn 或 gunicorn（API_SERVER=gunicorn）管理；
+      共享状态都在 SQLite/Redis 中，模块导入时没有副作用，各工作进程在启动事件中初始化
+    """
+    host, port = settings.API_HOST, settings.API_PORT
+    workers = max(1, settings.API_WORKERS)
+    
+    if settings.API_RELOAD:
+        if workers > 1:
+            logger.warning("自动重载模式只支持单进程，忽略 API_WORKERS")
         # 当启用reload时，需要传递模块路径而不是app对象
-        uvicorn.run("main:app", host=host, port=port, reload=reload)
+        uvicorn.run("main:app", host=host, port=port, reload=True)
+    elif workers == 1:
+        uvicorn.run(app, host=host, port=port)
+    elif settings.API_SERVER == "gunicorn":
+        run_gunicorn(host, port, workers)
     else:
-        # 当不启用reload时，可以直接传递app对象
-        uvicorn.run(app, host=host, port=port, reload=reload)
\ No newline at end of file
+        # 多进程时同样需要模块路径，每个工作进程各自导入应用
+        uvicorn.run("main:app", host=host, port=port, workers=workers)
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,213 @@
+"""
+模型细节层次（LOD）
+新下载的GLB模型在后台生成多级简化版本（默认保留100% / 25% / 5%的面，见 model_processing），
+远处或缩略视图可请求低级别，减少传输字节数和前端渲染开销。简化在共享进程池中执行：
+- 安装了 open3d 时，无纹理坐标和顶点颜色的网格使用二次误差（quadric）简化
+- 其余情况使用NumPy向量化的顶点聚类：按网格单元合并顶点（位置取平均、纹理坐标取代表顶点），
+  二分查找单元大小使面数接近目标；纹理按面数比例的平方根同步缩小
+结果以 models/<文件名>.lod<级别>.glb 存入内容寻址存储，各级别的面数和大小记录在 model_history.lods 中；
+请求的级别不存在（尚未生成、生成失败或已被淘汰）时返回最接近的更高精度级别
+"""
+import importlib.util
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import blob_store
+
+OPEN3D_AVAILABLE = importlib.util.find_spec("open3d") is not None
+
+# 二分查找单元大小的最多次数，以及面数与目标相差多少以内即停止
+SEARCH_STEPS = 24
+SEARCH_TOLERANCE = 0.05
+# 简化后的面数不少于该值（很小的网格不再继续简化）
+MIN_FACES = 64
+# 缩小纹理时的最小边长（像素）
+MIN_TEXTURE_SIZE = 64
+# PBR材质中需要同步缩小的纹理
+TEXTURE_ATTRIBUTES = ('baseColorTexture', 'metallicRoughnessTexture', 'normalTexture',
+                      'occlusionTexture', 'emissiveTexture', 'image')
+
+
+def parse_ratios(value: str) -> List[float]:
+    """解析 LOD_RATIOS（逗号分隔，从高到低），第0级固定为原始模型"""
+    ratios = sorted({float(item) for item in value.split(',') if item.strip()}, reverse=True)
+    if any(not 0 < ratio <= 1 for ratio in ratios):
+        raise ValueError(f"LOD_RATIOS 的取值需在 (0, 1] 之间: {value}")
+    return [1.0] + [ratio for ratio in ratios if ratio < 1]
+
+
+def lod_ref(ref: str, level: int) -> str:
+    """第 level 级的逻辑路径：models/a.glb -> models/a.lod1.glb（第0级即原始文件）"""
+    if level <= 0:
+        return ref
+    base, ext = os.path.splitext(ref)
+    return f"{base}.lod{level}{ext}"
+
+
+def resolve_lod(ref: str, level: int) -> Tuple[Optional[str], int]:
+    """
+    解析指定级别的实际文件，不存在时依次退回更高精度的级别
+
+    Returns:
+        (实际文件路径, 实际返回的级别)；原始文件也不存在时路径为None
+    """
+    for candidate in range(level, -1, -1):
+        path = blob_store.resolve(lod_ref(ref, candidate))
+        if path:
+            return path, candidate
+    return None, 0
+
+
+def _face_keys(faces: np.ndarray, vertex_count: int) -> np.ndarray:
+    """与顶点顺序无关的面标识，用于去除合并顶点后重复的面"""
+    ordered = np.sort(faces, axis=1).astype(np.int64)
+    if vertex_count < 1 << 21:
+        return (ordered[:, 0] << 42) | (ordered[:, 1] << 21) | ordered[:, 2]
+    return np.unique(ordered, axis=0, return_inverse=True)[1]
+
+
+def _cluster(vertices: np.ndarray, faces: np.ndarray, cell: float) -> Tuple[np.ndarray, np.ndarray, int]:
+    """按边长为 cell 的网格单元合并顶点，返回 (去掉退化面后的面, 顶点 -> 单元编号, 单元数)"""
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    linear = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, inverse = np.unique(linear, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    clustered = inverse[faces]
+    keep = ((clustered[:, 0] != clustered[:, 1]) & (clustered[:, 1] != clustered[:, 2])
+            & (clustered[:, 0] != clustered[:, 2]))
+    return clustered[keep], inverse, int(inverse.max()) + 1 if len(inverse) else 0
+
+
+def _search_cell(vertices: np.ndarray, faces: np.ndarray, target: int) -> float:
+    """二分查找（对数尺度）使简化后面数最接近 target 的单元大小"""
+    extent = float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0))) or 1.0
+    low, high = np.log(extent * 1e-5), np.log(extent)
+    best_cell, best_error = extent * 1e-5, float('inf')
+    for _ in range(SEARCH_STEPS):
+        middle = (low + high) / 2
+        count = len(_cluster(vertices, faces, float(np.exp(middle)))[0])
+        error = abs(count - target) / target
+        if error < best_error:
+            best_cell, best_error = float(np.exp(middle)), error
+        if error <= SEARCH_TOLERANCE:
+            break
+        if count > target:
+            low = middle
+        else:
+            high = middle
+    return best_cell
+
+
+def _scale_material(material, factor: float):
+    """按比例缩小材质中的纹理（返回副本，原材质不变）"""
+    from PIL import Image
+
+    material = material.copy()
+    for attribute in TEXTURE_ATTRIBUTES:
+        image = getattr(material, attribute, None)
+        if not isinstance(image, Image.Image):
+            continue
+        width, height = image.size
+        size = (max(MIN_TEXTURE_SIZE, int(width * factor)), max(MIN_TEXTURE_SIZE, int(height * factor)))
+        if size[0] < width or size[1] < height:
+            setattr(material, attribute, image.resize(size, Image.LANCZOS))
+    return material
+
+
+def _decimate_quadric(mesh, target: int):
+    """open3d 二次误差简化（不保留纹理坐标，只用于无纹理的网格）"""
+    import open3d as o3d
+    import trimesh
+
+    source = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(mesh.vertices),
+                                       o3d.utility.Vector3iVector(mesh.faces))
+    simplified = source.simplify_quadric_decimation(target_number_of_triangles=target)
+    return trimesh.Trimesh(np.asarray(simplified.vertices), np.asarray(simplified.triangles), process=False)
+
+
+def decimate_mesh(mesh, target: int, texture_factor: float = 1.0):
+    """
+    把网格简化到约 target 个面，保留纹理坐标、材质和顶点颜色
+
+    Args:
+        mesh: trimesh.Trimesh
+        target: 目标面数
+        texture_factor: 纹理边长的缩放比例
+    """
+    import trimesh
+    from trimesh.visual import ColorVisuals, TextureVisuals
+
+    visual = mesh.visual
+    uv = getattr(visual, 'uv', None) if visual.kind == 'texture' else None
+    colors = visual.vertex_colors if visual.kind == 'vertex' else None
+    if OPEN3D_AVAILABLE and uv is None and colors is None:
+        return _decimate_quadric(mesh, target)
+
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    clustered, inverse, count = _cluster(vertices, faces, _search_cell(vertices, faces, target))
+    _, unique_faces = np.unique(_face_keys(clustered, count), return_index=True)
+    clustered = clustered[np.sort(unique_faces)]
+
+    # 每个单元的位置取所含顶点的平均值；只保留仍被引用的单元并重新编号
+    sizes = np.bincount(inverse, minlength=count)
+    positions = np.stack([np.bincount(inverse, weights=vertices[:, axis], minlength=count)
+                          for axis in range(3)], axis=1) / np.maximum(sizes, 1)[:, None]
+    used = np.unique(clustered)
+    remap = np.full(count, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+
+    result = trimesh.Trimesh(positions[used], remap[clustered], process=False)
+    if uv is not None:
+        # 纹理坐标不能平均（会跨越纹理接缝），取单元中第一个顶点的坐标
+        representative = np.empty(count, dtype=np.int64)
+        representative[inverse[::-1]] = np.arange(len(inverse))[::-1]
+        material = visual.material
+        if texture_factor < 1 and material is not None:
+            material = _scale_material(material, texture_factor)
+        result.visual = TextureVisuals(uv=np.asarray(uv)[representative[used]], material=material)
+    elif colors is not None:
+        mean_colors = np.stack([np.bincount(inverse, weights=colors[:, channel], minlength=count)
+                                for channel in range(colors.shape[1])], axis=1) / np.maximum(sizes, 1)[:, None]
+        result.visual = ColorVisuals(result, vertex_colors=np.round(mean_colors[used]).astype(np.uint8))
+    return result
+
+
+def build_lods(source_path: str, output_prefix: str, ratios: Sequence[float]) -> List[Dict]:
+    """
+    生成各级简化模型（同步，在进程池中执行），第 i 级写入 <output_prefix>.lod<i>.glb
+
+    简化后面数比上一级减少不到10%时不再生成更低的级别
+
+    Returns:
+        各级别的 {level, ratio, faces, path, bytes}，第0级为原始文件
+    """
+    import trimesh
+
+    scene = trimesh.load(source_path, file_type='glb', force='scene')
+    meshes = {name: geometry for name, geometry in scene.geometry.items()
+              if isinstance(geometry, trimesh.Trimesh) and len(geometry.faces)}
+    total = sum(len(mesh.faces) for mesh in meshes.values())
+    if not total:
+        raise ValueError("模型中没有三角网格")
+
+    levels = [{'level': 0, 'ratio': 1.0, 'faces': total, 'path': source_path,
+               'bytes': os.path.getsize(source_path)}]
+    for level, ratio in enumerate(ratios[1:], start=1):
+        lod = scene.copy()
+        faces = 0
+        for name, mesh in meshes.items():
+            target = max(int(len(mesh.faces) * ratio), min(len(mesh.faces), MIN_FACES))
+            simplified = decimate_mesh(mesh, target, texture_factor=ratio ** 0.5)
+            lod.geometry[name] = simplified
+            faces += len(simplified.faces)
+        if faces > levels[-1]['faces'] * 0.9:
+            break
+        path = f"{output_prefix}.lod{level}.glb"
+        lod.export(path, file_type='glb')
+        levels.append({'level': level, 'ratio': ratio, 'faces': faces, 'path': path,
+                       'bytes': os.path.getsize(path)})
+    return levels
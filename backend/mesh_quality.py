@@ -0,0 +1,213 @@
+"""
+模型质量分析
+模型存入本地存储后，在共享进程池中计算网格指标（全部为NumPy向量化运算，百万面模型在数秒内完成）：
+- 面数、顶点数（按位置焊接后，纹理接缝处拆分的顶点只计一次）
+- 退化面（面积接近0或焊接后顶点重合）和重复面
+- 边界边、非流形边（被两个以上的面共用）及是否水密
+- 三角形纵横比（外接圆与内切圆半径之比除以2，正三角形为1）的分布和细长三角形比例
+- 纹理数量和最大分辨率
+指标和由指标得出的质量分（0~1，见 quality_score）一起写入 model_history
+"""
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from file_manager import STORAGE_BASE, get_physical_path
+from model_processing import FILES_URL_PREFIX
+from process_pool import run_in_process
+from stats import stats_recorder
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 焊接顶点时每个坐标轴的量化位数（3轴合成一个int64）
+WELD_BITS = 21
+# 面积小于包围盒对角线平方的该比例视为退化面
+DEGENERATE_AREA = 1e-12
+# 纵横比超过该值的三角形视为细长三角形
+SLIVER_ASPECT = 10.0
+# 纹理最大边长低于该值时扣分（像素）
+MIN_TEXTURE_SIZE = 1024
+# 面数低于该值时扣分
+MIN_FACES = 1000
+# 各项扣分的上限
+MAX_PENALTIES = {
+    'degenerate_faces': 0.25,
+    'duplicate_faces': 0.15,
+    'non_manifold_edges': 0.15,
+    'boundary_edges': 0.1,
+    'slivers': 0.15,
+    'texture': 0.1,
+    'faces': 0.1,
+}
+# PBR材质和简单材质中的颜色纹理
+TEXTURE_ATTRIBUTES = ('baseColorTexture', 'image')
+
+
+def _load_geometry(path: str, file_type: Optional[str]) -> Tuple[np.ndarray, np.ndarray, List[Tuple[int, int]], bool]:
+    """读取文件中所有三角网格（应用节点变换后合并），返回 (顶点, 面, 纹理尺寸列表, 是否有顶点颜色)"""
+    import trimesh
+    from PIL import Image
+
+    scene = trimesh.load(path, file_type=file_type, force='scene', process=False)
+    vertices, faces, textures, vertex_colors = [], [], {}, False
+    offset = 0
+    for node in scene.graph.nodes_geometry:
+        transform, name = scene.graph[node]
+        mesh = scene.geometry[name]
+        if not isinstance(mesh, trimesh.Trimesh) or not len(mesh.faces):
+            continue
+        points = np.asarray(mesh.vertices, dtype=np.float64)
+        vertices.append(points @ transform[:3, :3].T + transform[:3, 3])
+        faces.append(np.asarray(mesh.faces, dtype=np.int64) + offset)
+        offset += len(points)
+        visual = mesh.visual
+        if visual.kind == 'texture' and visual.material is not None:
+            for attribute in TEXTURE_ATTRIBUTES:
+                image = getattr(visual.material, attribute, None)
+                if isinstance(image, Image.Image):
+                    # 同一材质被多个节点引用时只计一次
+                    textures[id(image)] = image.size
+        elif visual.kind == 'vertex':
+            vertex_colors = True
+    if not faces:
+        raise ValueError("模型中没有三角网格")
+    return np.concatenate(vertices), np.concatenate(faces), list(textures.values()), vertex_colors
+
+
+def _weld(vertices: np.ndarray) -> Tuple[np.ndarray, int]:
+    """按量化后的位置合并顶点，返回 (顶点 -> 焊接后编号, 焊接后顶点数)"""
+    low = vertices.min(axis=0)
+    extent = float((vertices.max(axis=0) - low).max()) or 1.0
+    levels = (1 << WELD_BITS) - 1
+    quantized = np.rint((vertices - low) * (levels / extent)).astype(np.int64)
+    keys = (quantized[:, 0] << (2 * WELD_BITS)) | (quantized[:, 1] << WELD_BITS) | quantized[:, 2]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return inverse.reshape(-1), len(unique)
+
+
+def analyze_mesh(path: str, file_type: Optional[str] = None) -> Dict:
+    """
+    计算模型的质量指标（同步，在进程池中执行）
+
+    Args:
+        path: GLB/OBJ等 trimesh 可读取的文件
+        file_type: 文件类型，默认按扩展名判断（内容寻址存储中的文件没有扩展名，需要指定）
+    """
+    vertices, faces, textures, vertex_colors = _load_geometry(path, file_type or os.path.splitext(path)[1][1:])
+    inverse, vertex_count = _weld(vertices)
+    welded = inverse[faces]
+
+    # 边长和面积
+    corners = vertices[faces]
+    lengths = np.linalg.norm(corners[:, [1, 2, 0]] - corners, axis=2)
+    areas = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    diagonal = float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0))) or 1.0
+    collapsed = (welded[:, 0] == welded[:, 1]) | (welded[:, 1] == welded[:, 2]) | (welded[:, 0] == welded[:, 2])
+    degenerate = collapsed | (areas <= DEGENERATE_AREA * diagonal ** 2)
+    valid = welded[~degenerate]
+
+    # 重复面：顶点集合相同（与顶点顺序无关）
+    ordered = np.sort(valid, axis=1)
+    face_keys = (ordered[:, 0] * vertex_count + ordered[:, 1]) * vertex_count + ordered[:, 2] \
+        if vertex_count < 1 << 20 else np.unique(ordered, axis=0, return_inverse=True)[1].reshape(-1)
+    unique_keys, first = np.unique(face_keys, return_index=True)
+    ordered = ordered[first]
+
+    # 每条边被几个面共用：1为边界边，超过2为非流形边（重复面只统计一次）
+    edges = np.concatenate([ordered[:, [0, 1]], ordered[:, [1, 2]], ordered[:, [0, 2]]])
+    _, edge_counts = np.unique(edges[:, 0] * vertex_count + edges[:, 1], return_counts=True)
+    boundary_edges = int((edge_counts == 1).sum())
+    non_manifold_edges = int((edge_counts > 2).sum())
+
+    # 纵横比 abc / ((b+c-a)(c+a-b)(a+b-c))，正三角形为1
+    a, b, c = lengths[~degenerate].T
+    denominator = (b + c - a) * (c + a - b) * (a + b - c)
+    aspect = np.divide(a * b * c, denominator, out=np.full(len(a), np.inf), where=denominator > 0)
+    finite = aspect[np.isfinite(aspect)]
+    p50, p90, p99 = (np.percentile(finite, [50, 90, 99]) if len(finite) else (0.0, 0.0, 0.0))
+
+    return {
+        'faces': int(len(faces)),
+        'vertices': int(vertex_count),
+        'degenerate_faces': int(degenerate.sum()),
+        'duplicate_faces': int(len(valid) - len(unique_keys)),
+        'edges': int(len(edge_counts)),
+        'boundary_edges': boundary_edges,
+        'non_manifold_edges': non_manifold_edges,
+        'watertight': bool(len(edge_counts) and boundary_edges == 0 and non_manifold_edges == 0),
+        'aspect_ratio': {
+            'p50': round(float(p50), 3),
+            'p90': round(float(p90), 3),
+            'p99': round(float(p99), 3),
+            'sliver_fraction': round(float((aspect > SLIVER_ASPECT).sum()) / max(len(aspect), 1), 5),
+        },
+        'textures': len(textures),
+        'texture_size': list(max(textures, key=lambda size: size[0] * size[1])) if textures else None,
+        'vertex_colors': vertex_colors,
+    }
+
+
+def quality_score(metrics: Dict) -> float:
+    """
+    由指标得出质量分：从1开始按各项问题所占比例扣分（每项有上限，见 MAX_PENALTIES）
+    - 退化面、重复面按占面数的比例，边界边、非流形边按占边数的比例
+    - 细长三角形按比例；没有纹理和顶点颜色、纹理分辨率偏低、面数过少各扣固定分
+    """
+    faces = max(metrics['faces'], 1)
+    edges = max(metrics['edges'], 1)
+    texture_size = metrics.get('texture_size')
+    if texture_size:
+        texture_penalty = 0.5 if max(texture_size) < MIN_TEXTURE_SIZE else 0.0
+    else:
+        texture_penalty = 0.5 if metrics.get('vertex_colors') else 1.0
+    penalties = {
+        'degenerate_faces': 5 * metrics['degenerate_faces'] / faces,
+        'duplicate_faces': 5 * metrics['duplicate_faces'] / faces,
+        'non_manifold_edges': 20 * metrics['non_manifold_edges'] / edges,
+        'boundary_edges': 10 * metrics['boundary_edges'] / edges,
+        'slivers': metrics['aspect_ratio']['sliver_fraction'],
+        'texture': texture_penalty,
+        'faces': 1.0 if metrics['faces'] < MIN_FACES else 0.0,
+    }
+    penalty = sum(min(value, 1.0) * MAX_PENALTIES[name] for name, value in penalties.items())
+    return round(max(0.0, 1.0 - penalty), 2)
+
+
+def local_model_path(model_url: Optional[str]) -> Optional[str]:
+    """本地存储中模型文件的实际路径（model_url 不指向本地存储或文件不存在时为None）"""
+    if not model_url or not model_url.startswith(FILES_URL_PREFIX):
+        return None
+    ref = model_url[len(FILES_URL_PREFIX):].split('?', 1)[0]
+    return get_physical_path(os.path.join(STORAGE_BASE, ref))
+
+
+async def assess_model(model_url: Optional[str], path: Optional[str] = None) -> Tuple[Optional[float], Optional[Dict]]:
+    """
+    分析本地存储中的模型
+
+    Args:
+        model_url: 模型的 /api/files/ 地址，用于定位文件和判断格式
+        path: 直接指定文件（不在本地存储中的模型）
+
+    Returns:
+        (质量分, 指标)；模型不在本地或无法解析时为 (None, None)
+    """
+    source = path or local_model_path(model_url)
+    if not source:
+        return None, None
+    file_type = os.path.splitext((model_url or path).split('?', 1)[0])[1][1:].lower()
+    try:
+        with stats_recorder.timer("quality_analysis"), span("model.analyze", format=file_type):
+            metrics = await run_in_process(analyze_mesh, source, file_type)
+    except Exception as e:
+        stats_recorder.incr("quality.failed")
+        logger.warning(f"模型质量分析失败 {model_url or path}: {e}")
+        return None, None
+    score = quality_score(metrics)
+    stats_recorder.incr("quality.analyzed")
+    logger.info(f"模型质量分析完成 {model_url or path}: {score}（{metrics['faces']}面，"
+                f"退化{metrics['degenerate_faces']}，非流形边{metrics['non_manifold_edges']}）")
+    return score, metrics
@@ -1,14 +1,16 @@
 """
 Meshy API客户端
-用于与Meshy.ai API进行交互，实现文本生成3D模型功能
-基于官方文档: https://docs.meshy.ai/zh/api/text-to-3d
+用于与Meshy.ai API进行交互，实现文本生成3D模型和图片生成3D模型功能
+基于官方文档: https://docs.meshy.ai/zh/api/text-to-3d 、https://docs.meshy.ai/zh/api/image-to-3d
 """
 
-import os
-import time
-import requests
+import httpx
 from typing import Dict, Any, Optional
 from config import settings
+from task_poller import TaskPoller, RateLimitError, ProgressCallback
+from http_transport import HttpTransport, http_transport
+from stats import stats_recorder
+from tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,20 +18,40 @@ logger = logging.getLogger(__name__)
 class MeshyClient:
     """Meshy API客户端类"""
     
-    def __init__(self):
-        self.api_key = settings.MESHY_API_KEY
-        self.base_url = settings.MESHY_BASE_URL.rstrip('/')  # 确保没有尾部斜杠
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 poll_min_interval: Optional[float] = None, poll_max_interval: Optional[float] = None,
+                 transport: Optional[HttpTransport] = None):
+        self.api_key = api_key if api_key is not None else settings.MESHY_API_KEY
+        self.base_url = (base_url or settings.MESHY_BASE_URL).rstrip('/')  # 确保没有尾部斜杠
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
+        self.timeout = settings.MESHY_TIMEOUT
+        # 与文件下载共用的连接池
+        self.transport = transport or http_transport
+        # 所有未完成任务共享的状态轮询器（文本和图片任务的查询接口不同，各用一个）
+        self.poller = TaskPoller(
+            self.get_task_status,
+            min_interval=poll_min_interval or settings.MESHY_POLL_MIN_INTERVAL,
+            max_interval=poll_max_interval or settings.MESHY_POLL_MAX_INTERVAL
+        )
+        self.image_poller = TaskPoller(
+            self.get_image_task_status,
+            min_interval=poll_min_interval or settings.MESHY_POLL_MIN_INTERVAL,
+            max_interval=poll_max_interval or settings.MESHY_POLL_MAX_INTERVAL
+        )
         
         if not self.api_key or self.api_key == 'your_meshy_api_key_here':
             logger.warning("Meshy API key not configured properly")
         else:
             logger.info("Meshy API client initialized successfully")
     
-    def create_preview_task(self, prompt: str, **kwargs) -> Dict[str, Any]:
+    async def aclose(self):
+        """关闭底层HTTP连接池"""
+        await self.transport.aclose()
+    
+    async def create_preview_task(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """
         创建文本生成3D预览任务
         
@@ -69,15 +91,21 @@ class MeshyClient:
         if 'seed' in kwargs:
             data['seed'] = kwargs['seed']
         
+        stats_recorder.incr("meshy.create_preview")
         try:
-            response = requests.post(url, json=data, headers=self.headers)
+            # 创建任务不是幂等操作，不自动重试以免重复计费
+            with stats_recorder.timer("meshy_create"), span("meshy.create", mode="preview"):
+                response = await self.transport.request(
+                    "POST", url, json=data, headers=self.headers, timeout=self.timeout, retry=False
+                )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
+            stats_recorder.incr("meshy.errors")
             logger.error(f"Failed to create preview task: {e}")
             raise Exception(f"创建预览任务失败: {str(e)}")
     
-    def create_refine_task(self, preview_task_id: str, **kwargs) -> Dict[str, Any]:
+    async def create_refine_task(self, preview_task_id: str, **kwargs) -> Dict[str, Any]:
         """
         创建文本生成3D精细化任务
         
@@ -109,17 +137,70 @@ class MeshyClient:
         elif 'texture_image_url' in kwargs:
             data['texture_image_url'] = kwargs['texture_image_url']
         
+        stats_recorder.incr("meshy.create_refine")
         try:
-            response = requests.post(url, json=data, headers=self.headers)
+            # 创建任务不是幂等操作，不自动重试以免重复计费
+            with stats_recorder.timer("meshy_create"), span("meshy.create", mode="refine"):
+                response = await self.transport.request(
+                    "POST", url, json=data, headers=self.headers, timeout=self.timeout, retry=False
+                )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
+            stats_recorder.incr("meshy.errors")
             logger.error(f"Failed to create refine task: {e}")
             raise Exception(f"创建精细化任务失败: {str(e)}")
     
-    def get_task_status(self, task_id: str) -> Dict[str, Any]:
+    async def create_image_task(self, image_url: str, **kwargs) -> Dict[str, Any]:
         """
-        获取任务状态
+        创建图片生成3D任务
+        
+        Args:
+            image_url: 公网可访问的图片URL，或 data:image/...;base64, 形式的Data URI
+            **kwargs: 其他可选参数
+                - ai_model: AI模型 ('meshy-4', 'meshy-5', 'latest')
+                - topology: 拓扑结构 ('quad' 或 'triangle')
+                - target_polycount: 目标面数
+                - should_remesh: 是否重建网格
+                - should_texture: 是否生成贴图
+                - enable_pbr: 是否生成PBR贴图
+                - symmetry_mode: 对称模式 ('off', 'auto', 'on')
+                - moderation: 是否启用内容审核
+        
+        Returns:
+            包含任务ID的响应字典
+        """
+        url = f"{self.base_url}/openapi/v1/image-to-3d"
+        
+        data = {
+            'image_url': image_url,
+            'ai_model': kwargs.get('ai_model', 'meshy-5'),
+            'topology': kwargs.get('topology', 'triangle'),
+            'target_polycount': kwargs.get('target_polycount', 30000),
+            'should_remesh': kwargs.get('should_remesh', True),
+            'should_texture': kwargs.get('should_texture', True),
+            'enable_pbr': kwargs.get('enable_pbr', False),
+            'symmetry_mode': kwargs.get('symmetry_mode', 'auto'),
+            'moderation': kwargs.get('moderation', False)
+        }
+        
+        stats_recorder.incr("meshy.create_image")
+        try:
+            # 创建任务不是幂等操作，不自动重试以免重复计费
+            with stats_recorder.timer("meshy_create"), span("meshy.create", mode="image"):
+                response = await self.transport.request(
+                    "POST", url, json=data, headers=self.headers, timeout=self.timeout, retry=False
+                )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            stats_recorder.incr("meshy.errors")
+            logger.error(f"Failed to create image task: {e}")
+            raise Exception(f"创建图片生成任务失败: {str(e)}")
+    
+    async def get_task_status(self, task_id: str) -> Dict[str, Any]:
+        """
+        获取文本生成任务状态
         
         Args:
             task_id: 任务ID
@@ -127,61 +208,67 @@ class MeshyClient:
         Returns:
             任务状态信息
         """
-        url = f"{self.base_url}/openapi/v2/text-to-3d/{task_id}"
+        return await self._get_status(f"{self.base_url}/openapi/v2/text-to-3d/{task_id}", task_id)
+    
+    async def get_image_task_status(self, task_id: str) -> Dict[str, Any]:
+        """
+        获取图片生成任务状态
+        
+        Args:
+            task_id: 任务ID
         
+        Returns:
+            任务状态信息
+        """
+        return await self._get_status(f"{self.base_url}/openapi/v1/image-to-3d/{task_id}", task_id)
+    
+    async def _get_status(self, url: str, task_id: str) -> Dict[str, Any]:
+        """查询任务状态，被限流时抛出 RateLimitError"""
+        stats_recorder.incr("meshy.status_polls")
         try:
-            response = requests.get(url, headers=self.headers)
+            with stats_recorder.timer("meshy_status"), span("meshy.status", task_id=task_id) as current:
+                response = await self.transport.request(
+                    "GET", url, headers=self.headers, timeout=self.timeout
+                )
+                if current is not None:
+                    current.set_attribute("http.status_code", response.status_code)
+            if response.status_code == 429:
+                stats_recorder.incr("meshy.rate_limited")
+                retry_after = response.headers.get('Retry-After')
+                raise RateLimitError(
+                    "获取任务状态被限流",
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
+            stats_recorder.incr("meshy.errors")
             logger.error(f"Failed to get task status: {e}")
             raise Exception(f"获取任务状态失败: {str(e)}")
     
-    def wait_for_task_completion(self, task_id: str, max_wait_time: int = 300, 
-                               check_interval: int = 10) -> Dict[str, Any]:
+    async def wait_for_task_completion(self, task_id: str, max_wait_time: int = 300,
+                                       on_progress: Optional[ProgressCallback] = None,
+                                       image: bool = False) -> Dict[str, Any]:
         """
         等待任务完成
         
+        任务交给共享的 TaskPoller 统一轮询，轮询间隔随进度自适应；
+        调用方取消协程时（如客户端断开）会立即停止等待。
+        
         Args:
             task_id: 任务ID
             max_wait_time: 最大等待时间（秒）
-            check_interval: 检查间隔（秒）
+            on_progress: 每次获取到任务状态后调用的异步回调，参数为任务信息
+            image: 是否为图片生成任务
         
         Returns:
             完成的任务信息
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                task_info = self.get_task_status(task_id)
-                status = task_info.get('status')
-                
-                logger.info(f"任务 {task_id} 状态: {status}")
-                
-                if status == 'SUCCEEDED':
-                    logger.info(f"任务 {task_id} 完成成功")
-                    return task_info
-                elif status == 'FAILED':
-                    error_msg = task_info.get('error', '未知错误')
-                    logger.error(f"任务 {task_id} 失败: {error_msg}")
-                    raise Exception(f"任务失败: {error_msg}")
-                elif status in ['PENDING', 'IN_PROGRESS']:
-                    # 任务仍在进行中，继续等待
-                    time.sleep(check_interval)
-                else:
-                    logger.warning(f"任务 {task_id} 状态未知: {status}")
-                    time.sleep(check_interval)
-                    
-            except Exception as e:
-                if "任务失败" in str(e):
-                    raise  # 重新抛出任务失败异常
-                logger.error(f"检查任务状态时出错: {e}")
-                time.sleep(check_interval)
-        
-        raise Exception(f"任务超时: {task_id}")
+        poller = self.image_poller if image else self.poller
+        with stats_recorder.timer("meshy_wait"), span("meshy.wait", task_id=task_id):
+            return await poller.wait(task_id, timeout=max_wait_time, on_progress=on_progress)
     
-    def generate_3d_model(self, prompt: str, enable_refine: bool = True, 
+    async def generate_3d_model(self, prompt: str, enable_refine: bool = True, 
                          **kwargs) -> Dict[str, Any]:
         """
         完整的3D模型生成流程
@@ -197,24 +284,24 @@ class MeshyClient:
         try:
             # 第一阶段：创建预览任务
             logger.info(f"开始创建预览任务: {prompt}")
-            preview_response = self.create_preview_task(prompt, **kwargs)
+            preview_response = await self.create_preview_task(prompt, **kwargs)
             preview_task_id = preview_response['result']
             
             # 等待预览任务完成
             logger.info(f"等待预览任务完成: {preview_task_id}")
-            preview_result = self.wait_for_task_completion(preview_task_id)
+            preview_result = await self.wait_for_task_completion(preview_task_id)
             
             if not enable_refine:
                 return preview_result
             
             # 第二阶段：创建精细化任务
             logger.info(f"开始创建精细化任务: {preview_task_id}")
-            refine_response = self.create_refine_task(preview_task_id, **kwargs)
+            refine_response = await self.create_refine_task(preview_task_id, **kwargs)
             refine_task_id = refine_response['result']
             
             # 等待精细化任务完成
             logger.info(f"等待精细化任务完成: {refine_task_id}")
-            refine_result = self.wait_for_task_completion(refine_task_id)
+            refine_result = await self.wait_for_task_completion(refine_task_id)
             
             return refine_result
             
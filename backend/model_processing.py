@@ -0,0 +1,174 @@
+"""
+模型后处理
+新下载的GLB模型存入本地存储后，在后台依次执行CPU密集的处理（在共享进程池中，模型只加载一次）：
+- 生成各级LOD（mesh_lod），级别由 LOD_RATIOS 指定
+- 为每个级别生成传输优化版本（glb_optimizer）及其gzip预压缩文件
+结果存入内容寻址存储（models/<文件名>.lod<级别>.glb、.opt.glb、.opt.glb.gz），
+各级别的面数和大小记录在 model_history.lods 中。
+返回文件时按客户端声明支持的glTF扩展（X-GLTF-Extensions 请求头或 extensions 参数）
+和 Accept-Encoding 选择原始、优化或预压缩的版本
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import blob_store
+from config import settings
+from database import set_history_lods
+from file_manager import STAGING_DIR
+from glb_optimizer import QUANTIZATION_EXTENSION, optimize_glb, variant_ref
+from mesh_lod import build_lods, lod_ref, parse_ratios, resolve_lod
+from process_pool import run_in_process
+from stats import stats_recorder
+from storage_manager import storage_manager
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+FILES_URL_PREFIX = '/api/files/'
+
+# 返回内容随这两个请求头变化，供缓存和CDN区分
+VARY_HEADERS = 'Accept-Encoding, X-GLTF-Extensions'
+
+
+def process_model(source_path: str, output_prefix: str, ratios: Sequence[float], optimize: bool) -> List[Dict]:
+    """
+    生成各级LOD及其优化版本（同步，在进程池中执行）
+
+    Returns:
+        build_lods 的结果，optimize 时每级附加 optimized: {path, bytes, gzip_bytes, extensions}（无法优化时为None）
+    """
+    levels = build_lods(source_path, output_prefix, ratios) if len(ratios) > 1 else [
+        {'level': 0, 'ratio': 1.0, 'faces': None, 'path': source_path, 'bytes': os.path.getsize(source_path)}]
+    if optimize:
+        for level in levels:
+            target = f"{output_prefix}.lod{level['level']}.opt.glb"
+            try:
+                optimized = optimize_glb(level['path'], target)
+            except Exception as e:
+                # 结构不符合预期的文件只提供原始版本
+                logger.warning(f"GLB优化失败 {level['path']}: {e}")
+                optimized = None
+            level['optimized'] = dict(optimized, path=target) if optimized else None
+    return levels
+
+
+def client_accepts_optimized(extensions: Iterable[str]) -> bool:
+    """客户端是否支持优化版本所需的glTF扩展"""
+    return QUANTIZATION_EXTENSION in {extension.strip() for extension in extensions}
+
+
+def resolve_model_variant(ref: str, lod: int, extensions: Iterable[str],
+                          accept_gzip: bool) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    按请求的级别和客户端能力选择要返回的文件
+
+    Returns:
+        (实际文件路径, 额外的响应头)；原始文件不存在时路径为None
+    """
+    path, served = resolve_lod(ref, lod)
+    if not path:
+        return None, {}
+    headers = {'Vary': VARY_HEADERS}
+    if lod:
+        headers['X-Model-LOD'] = str(served)
+    if not client_accepts_optimized(extensions):
+        return path, headers
+    optimized_ref = variant_ref(lod_ref(ref, served))
+    compressed = blob_store.resolve(optimized_ref + '.gz') if accept_gzip else None
+    if compressed:
+        return compressed, dict(headers, **{'Content-Encoding': 'gzip', 'X-Model-Variant': 'optimized'})
+    optimized = blob_store.resolve(optimized_ref)
+    if optimized:
+        return optimized, dict(headers, **{'X-Model-Variant': 'optimized'})
+    return path, headers
+
+
+class ModelProcessor:
+    """模型下载完成后在后台生成LOD和优化版本，并记录到历史记录"""
+
+    def __init__(self, ratios: Optional[Sequence[float]] = None, optimize: Optional[bool] = None):
+        self.ratios = list(ratios) if ratios is not None else parse_ratios(settings.LOD_RATIOS)
+        self.optimize = settings.GLB_OPTIMIZE if optimize is None else optimize
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.ratios) > 1 or self.optimize
+
+    def schedule(self, model_id: str, model_url: Optional[str]):
+        """模型已存入本地存储且为GLB时，在后台处理（不等待完成）"""
+        if not self.enabled or not model_url or not model_url.startswith(FILES_URL_PREFIX):
+            return
+        ref = model_url[len(FILES_URL_PREFIX):].split('?', 1)[0]
+        if not ref.endswith('.glb'):
+            return
+        task = asyncio.create_task(self._run(model_id, ref))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model_id: str, ref: str):
+        try:
+            await self.process(model_id, ref)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats_recorder.incr("processing.failed")
+            logger.warning(f"模型后处理失败 {ref}: {e}")
+
+    async def _ingest(self, path: str, ref: str, size: int):
+        await asyncio.to_thread(blob_store.ingest_file, path, ref)
+        storage_manager.notify_added(ref, size)
+
+    async def process(self, model_id: str, ref: str) -> List[Dict]:
+        """处理 ref 对应的模型，存入内容寻址存储并写入历史记录，返回记录的级别信息"""
+        source = blob_store.resolve(ref)
+        if not source:
+            raise FileNotFoundError(ref)
+        output_prefix = os.path.join(STAGING_DIR, f"model_{uuid.uuid4().hex}")
+        try:
+            with stats_recorder.timer("model_processing"), span("model.process", ref=ref):
+                levels = await run_in_process(process_model, source, output_prefix, self.ratios, self.optimize)
+            lods = []
+            for level in levels:
+                level_ref = lod_ref(ref, level['level'])
+                if level['level'] > 0:
+                    await self._ingest(level['path'], level_ref, level['bytes'])
+                entry = {
+                    'level': level['level'],
+                    'ratio': level['ratio'],
+                    'faces': level['faces'],
+                    'bytes': level['bytes'],
+                    'url': f"{FILES_URL_PREFIX}{ref}" + (f"?lod={level['level']}" if level['level'] else ''),
+                }
+                optimized = level.get('optimized')
+                if optimized:
+                    optimized_ref = variant_ref(level_ref)
+                    await self._ingest(optimized['path'], optimized_ref, optimized['bytes'])
+                    await self._ingest(optimized['path'] + '.gz', optimized_ref + '.gz', optimized['gzip_bytes'])
+                    entry.update(optimized_bytes=optimized['bytes'], optimized_gzip_bytes=optimized['gzip_bytes'],
+                                 extensions=optimized['extensions'])
+                lods.append(entry)
+        finally:
+            for name in os.listdir(STAGING_DIR):
+                if name.startswith(os.path.basename(output_prefix) + '.'):
+                    os.remove(os.path.join(STAGING_DIR, name))
+        await asyncio.to_thread(set_history_lods, model_id, lods)
+        stats_recorder.incr("processing.completed")
+        logger.info(f"模型后处理完成 {ref}: " + ', '.join(
+            f"{lod['faces']}面/{lod['bytes']}字节" + (f"（优化后{lod['optimized_gzip_bytes']}字节）"
+                                                  if 'optimized_gzip_bytes' in lod else '')
+            for lod in lods))
+        return lods
+
+    async def stop(self):
+        """取消尚未完成的后处理（应用关闭时调用）"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# 创建全局模型后处理实例
+model_processor = ModelProcessor()
@@ -0,0 +1,47 @@
+"""
+CPU密集型任务的共享进程池
+网格简化等纯计算任务放到子进程执行，不占用事件循环所在进程的GIL，也不阻塞其他请求；
+进程池在首次使用时创建（每个工作进程各自一个），大小由 PROCESS_POOL_SIZE 指定。
+提交的函数和参数需可序列化（模块级函数，参数为路径、数字等），子进程中不访问数据库和缓存
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """返回共享进程池（不存在或已损坏时重新创建）"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PROCESS_POOL_SIZE)
+    return _executor
+
+
+async def run_in_process(fn: Callable[..., Any], *args: Any) -> Any:
+    """在共享进程池中执行 fn(*args)；子进程意外退出（如内存不足被杀）时重建进程池再抛出异常"""
+    global _executor
+    executor = get_executor()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        logger.error("计算进程异常退出，重建进程池")
+        if _executor is executor:
+            _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def shutdown_process_pool():
+    """关闭进程池（应用关闭时调用），取消尚未开始的任务"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,222 @@
+"""
+提示词近似重复检测
+预览缓存键基于规范化后的提示词（大小写、全半角、标点和多余空白不影响缓存命中）；
+规范化后相同的提示词直接复用已生成的模型；请求方选择接受近似重复时（reuse_similar），
+再在历史预览的字符 n-gram 向量中查找最相似的提示词，相似度超过阈值、
+且内容词一致（否定词、颜色、数字相同，其余词只有拼写差异）时复用，避免重复付费生成。
+字符 n-gram 对"red cape"/"blue cape"、"holding"/"not holding"这类改动一个词的长提示词
+同样给出很高的相似度，因此内容词检查不可省略。
+向量用哈希技巧映射到固定维度，默认 NumPy 暴力计算余弦相似度；
+安装了 hnswlib 且条目数较多时改用近似最近邻索引
+"""
+import difflib
+import importlib.util
+import logging
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from database import get_text_previews
+
+logger = logging.getLogger(__name__)
+
+HNSW_AVAILABLE = importlib.util.find_spec("hnswlib") is not None
+NGRAM_SIZES = (2, 3)
+ARTICLES = frozenset({'a', 'an', 'the'})
+# 不影响含义的虚词（内容词比较时忽略）
+STOPWORDS = ARTICLES | frozenset({'of', 'with', 'and', 'in', 'on', 'for', 'to', 'at', 'by', 'is', 'very'})
+# 改变含义的词：两个提示词中这些词不同时不复用
+NEGATIONS = frozenset({'no', 'not', 'without', 'non', 'never', 'none', 'nothing', 'dont', 'cannot', 'lacking'})
+COLORS = frozenset({
+    'red', 'blue', 'green', 'yellow', 'orange', 'purple', 'violet', 'pink', 'brown', 'black', 'white',
+    'gray', 'grey', 'golden', 'gold', 'silver', 'bronze', 'copper', 'cyan', 'magenta', 'teal', 'navy',
+    'beige', 'crimson', 'maroon', 'turquoise', 'ivory', 'transparent',
+})
+NUMBER_WORDS = frozenset({
+    'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten', 'eleven', 'twelve',
+    'single', 'double', 'triple', 'pair', 'dozen', 'hundred', 'thousand', 'first', 'second', 'third',
+})
+# 中文提示词不分词，按单字检查否定、颜色和数量（"一只"等量词常被省略，不含"一"）
+CJK_GUARD_CHARS = frozenset('不没无非未别勿红蓝绿黄橙紫粉棕褐黑白灰金银铜青零二两三四五六七八九十百千万双')
+NUMBER_PATTERN = re.compile(r'\d+')
+# 只在一方出现的内容词，与另一方某个词的拼写相似度达到该值时视为同一个词（复数、拼写错误）
+WORD_SIMILARITY = 0.8
+
+
+def normalize_prompt(text: str) -> str:
+    """规范化提示词：NFKC（全角转半角）、小写、去除标点符号和英文冠词、合并空白"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = ''.join(' ' if unicodedata.category(ch)[0] in 'PSZC' else ch for ch in text)
+    return ' '.join(word for word in text.split() if word not in ARTICLES)
+
+
+def vectorize(normalized: str, dim: int) -> np.ndarray:
+    """字符 2/3-gram 计数向量（带符号的特征哈希，L2归一化）；中文无需分词"""
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f' {normalized} '
+    for n in NGRAM_SIZES:
+        for i in range(len(padded) - n + 1):
+            h = zlib.crc32(padded[i:i + n].encode())
+            vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _guard_terms(normalized: str) -> set:
+    """提示词中改变含义的词：否定词、颜色、数量（英文按词，中文按单字）"""
+    terms = set(NUMBER_PATTERN.findall(normalized))
+    for word in normalized.split():
+        if word in NEGATIONS or word in COLORS or word in NUMBER_WORDS:
+            terms.add(word)
+    terms.update(ch for ch in normalized if ch in CJK_GUARD_CHARS)
+    return terms
+
+
+def same_content(a: str, b: str) -> bool:
+    """
+    两个规范化后的提示词是否描述同一内容：否定词、颜色、数量完全相同，
+    其余内容词（忽略虚词）只有拼写差异（复数、拼写错误、词序）
+    """
+    if _guard_terms(a) != _guard_terms(b):
+        return False
+    words_a = {word for word in a.split() if word not in STOPWORDS}
+    words_b = {word for word in b.split() if word not in STOPWORDS}
+    for only, others in ((words_a - words_b, words_b), (words_b - words_a, words_a)):
+        for word in only:
+            if not any(difflib.SequenceMatcher(None, word, other).ratio() >= WORD_SIMILARITY for other in others):
+                return False
+    return True
+
+
+class PromptIndex:
+    """历史预览提示词的相似度索引（按规范化提示词去重，保留最新的记录）"""
+
+    def __init__(self, threshold: Optional[float] = None, dim: Optional[int] = None,
+                 refresh_interval: Optional[float] = None, ann_min_size: Optional[int] = None):
+        """
+        Args:
+            threshold: 视为近似重复的最低余弦相似度
+            dim: 向量维度
+            refresh_interval: 从数据库加载新历史记录的最短间隔（秒），多进程部署时用于同步其他进程的生成结果
+            ann_min_size: 条目数达到该值且安装了 hnswlib 时使用近似最近邻索引
+        """
+        self.threshold = threshold or settings.PROMPT_SIMILARITY_THRESHOLD
+        self.dim = dim or settings.PROMPT_INDEX_DIM
+        self.refresh_interval = settings.PROMPT_INDEX_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.ann_min_size = ann_min_size or settings.PROMPT_ANN_MIN_SIZE
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((1024, self.dim), dtype=np.float32)
+        self._records: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}  # 规范化提示词 -> 位置
+        self._ann = None
+        self._last_rowid = 0
+        self._last_refresh = 0.0
+        self.stats = {"lookups": 0, "exact_hits": 0, "similar_hits": 0, "content_mismatches": 0}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def refresh(self, force: bool = False) -> int:
+        """加载上次之后新增的历史预览记录，返回新增条数"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return 0
+        self._last_refresh = now
+        rows = get_text_previews(after_rowid=self._last_rowid)
+        with self._lock:
+            for row in rows:
+                self._last_rowid = max(self._last_rowid, row.pop('rowid'))
+                self._add(row)
+        if rows:
+            logger.info(f"提示词索引加载 {len(rows)} 条，共 {len(self._records)} 条")
+        return len(rows)
+
+    def add(self, record: Dict[str, Any]):
+        """登记新生成的预览（record 需包含 id、input_content、model_url、preview_url）"""
+        with self._lock:
+            self._add(record)
+
+    def find(self, text: str, similar: bool = True) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        查找与提示词相同（规范化后）或相似度超过阈值且内容词一致的历史预览
+
+        Args:
+            similar: 是否查找近似重复；为False时只查找规范化后相同的提示词
+
+        Returns:
+            (历史记录, 相似度)，没有足够相似的记录时返回None
+        """
+        self.refresh()
+        normalized = normalize_prompt(text)
+        self.stats["lookups"] += 1
+        with self._lock:
+            position = self._positions.get(normalized)
+            if position is not None:
+                self.stats["exact_hits"] += 1
+                return self._records[position], 1.0
+            if not similar or not self._records:
+                return None
+            position, similarity = self._nearest(vectorize(normalized, self.dim))
+            record = self._records[position]
+
+        if similarity < self.threshold:
+            return None
+        if not same_content(normalized, normalize_prompt(record.get('input_content'))):
+            self.stats["content_mismatches"] += 1
+            return None
+        self.stats["similar_hits"] += 1
+        return record, similarity
+
+    def _nearest(self, vector: np.ndarray) -> Tuple[int, float]:
+        if self._ann is not None:
+            labels, distances = self._ann.knn_query(vector, k=1)
+            return int(labels[0][0]), 1.0 - float(distances[0][0])
+        similarities = self._vectors[:len(self._records)] @ vector
+        position = int(np.argmax(similarities))
+        return position, float(similarities[position])
+
+    def _add(self, record: Dict[str, Any]):
+        normalized = normalize_prompt(record.get('input_content'))
+        if not normalized:
+            return
+        position = self._positions.get(normalized)
+        if position is not None:
+            # 相同提示词只保留最新的记录，向量不变
+            self._records[position] = record
+            return
+
+        position = len(self._records)
+        if position == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+        vector = vectorize(normalized, self.dim)
+        self._vectors[position] = vector
+        self._records.append(record)
+        self._positions[normalized] = position
+
+        if self._ann is not None:
+            if position >= self._ann.get_max_elements():
+                self._ann.resize_index(len(self._vectors))
+            self._ann.add_items(vector[np.newaxis], [position])
+        elif HNSW_AVAILABLE and len(self._records) >= self.ann_min_size:
+            self._build_ann()
+
+    def _build_ann(self):
+        import hnswlib
+
+        count = len(self._records)
+        index = hnswlib.Index(space='cosine', dim=self.dim)
+        index.init_index(max_elements=len(self._vectors), ef_construction=200, M=16)
+        index.add_items(self._vectors[:count], np.arange(count))
+        index.set_ef(64)
+        self._ann = index
+        logger.info(f"提示词索引切换为HNSW近似最近邻（{count} 条）")
+
+
+# 创建全局提示词索引实例
+prompt_index = PromptIndex()
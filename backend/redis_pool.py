@@ -0,0 +1,175 @@
+"""
+Redis 连接池与熔断
+所有Redis访问都通过共享的 redis.asyncio 连接池（BlockingConnectionPool，连接数有上限，
+用完时排队而不是报错），每个命令有超时，断开的连接重试一次以跨过Redis重启。
+连续失败达到阈值后熔断：之后的调用立即抛出 RedisUnavailable，调用方按未命中处理，
+不再等待超时；后台协程按间隔探测，Redis恢复（包括启动时就不可用的情况）后自动恢复使用
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, RedisError, TimeoutError
+from redis.retry import Retry
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, OPEN = "closed", "open"
+
+
+class RedisUnavailable(Exception):
+    """Redis未配置、已熔断或本次调用失败"""
+
+
+class RedisPool:
+    """带熔断器的Redis异步连接池"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None,
+                 password: Optional[str] = None, max_connections: Optional[int] = None,
+                 socket_timeout: Optional[float] = None, failure_threshold: Optional[int] = None,
+                 recovery_interval: Optional[float] = None):
+        """
+        Args:
+            host: Redis地址，为空字符串时不使用Redis
+            max_connections: 连接池上限
+            socket_timeout: 建立连接和单个命令的超时（秒）
+            failure_threshold: 连续失败多少次后熔断
+            recovery_interval: 熔断期间探测Redis是否恢复的间隔（秒）
+        """
+        self.host = settings.REDIS_HOST if host is None else host
+        self.port = port or settings.REDIS_PORT
+        self.db = settings.REDIS_DB if db is None else db
+        self.password = password or settings.REDIS_PASSWORD
+        self.max_connections = max_connections or settings.REDIS_MAX_CONNECTIONS
+        self.socket_timeout = socket_timeout or settings.REDIS_SOCKET_TIMEOUT
+        self.failure_threshold = failure_threshold or settings.REDIS_FAILURE_THRESHOLD
+        self.recovery_interval = recovery_interval or settings.REDIS_RECOVERY_INTERVAL
+        self._client: Optional[Redis] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self.state = OPEN if self.enabled else CLOSED
+        self._failures = 0
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "short_circuited": 0,  # 熔断期间被直接拒绝的调用
+            "trips": 0,            # 熔断次数
+            "recoveries": 0,
+            "last_error": None,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host)
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and self.state == CLOSED
+
+    def _create_client(self) -> Redis:
+        pool = BlockingConnectionPool(
+            host=self.host,
+            port=self.port,
+            db=self.db,
+            password=self.password,
+            max_connections=self.max_connections,
+            timeout=self.socket_timeout,  # 等待空闲连接的超时
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.socket_timeout,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            retry=Retry(ExponentialBackoff(cap=0.05, base=0.005), 1),
+            retry_on_error=[ConnectionError, TimeoutError],
+            decode_responses=True,
+            protocol=2,
+        )
+        return Redis(connection_pool=pool)
+
+    async def start(self):
+        """连接并启动熔断恢复探测；Redis不可用时不影响启动"""
+        if not self.enabled or self._monitor is not None:
+            return
+        self._client = self._create_client()
+        if await self._probe():
+            self._close_circuit()
+            logger.info(f"Redis连接成功 ({self.host}:{self.port})")
+        else:
+            logger.warning(f"Redis连接失败: {self.stats['last_error']}，恢复前仅使用本地缓存")
+        self._monitor = asyncio.create_task(self._run_monitor())
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+        if self._client is not None:
+            await self._client.aclose()
+            await self._client.connection_pool.disconnect()
+            self._client = None
+        self.state = OPEN if self.enabled else CLOSED
+
+    async def run(self, op: Callable[[Redis], Awaitable[T]]) -> T:
+        """
+        执行一次Redis操作（可以是 pipeline，一次往返执行多个命令）
+
+        Raises:
+            RedisUnavailable: 未配置、熔断中或本次调用失败
+        """
+        if not self.available:
+            self.stats["short_circuited"] += 1
+            raise RedisUnavailable(f"Redis不可用（{self.state}）")
+        self.stats["calls"] += 1
+        try:
+            result = await op(self._client)
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self._record_failure(e)
+            raise RedisUnavailable(str(e)) from e
+        self._failures = 0
+        return result
+
+    def _record_failure(self, error: Exception):
+        self.stats["errors"] += 1
+        self.stats["last_error"] = str(error)
+        self._failures += 1
+        if self.state == CLOSED and self._failures >= self.failure_threshold:
+            self.state = OPEN
+            self.stats["trips"] += 1
+            logger.warning(f"Redis连续失败 {self._failures} 次，熔断: {error}")
+
+    def _close_circuit(self):
+        self.state = CLOSED
+        self._failures = 0
+
+    async def _probe(self) -> bool:
+        try:
+            await asyncio.wait_for(self._client.ping(), self.socket_timeout * 2)
+            return True
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self.stats["last_error"] = str(e)
+            # 丢弃可能已失效的连接，恢复后重新建立
+            await self._client.connection_pool.disconnect()
+            return False
+
+    async def _run_monitor(self):
+        while True:
+            await asyncio.sleep(self.recovery_interval)
+            if self.state == OPEN and await self._probe():
+                self._close_circuit()
+                self.stats["recoveries"] += 1
+                logger.info("Redis已恢复，解除熔断")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "state": self.state,
+            "max_connections": self.max_connections,
+        }
+
+
+# 创建全局Redis连接池实例
+redis_pool = RedisPool()
@@ -0,0 +1,141 @@
+"""
+进行中请求的合并（single-flight）
+相同缓存键的并发生成请求只会触发一次上游Meshy任务，其余请求等待并共享该结果。
+进程内通过共享的 asyncio.Task 合并；配置了Redis时再用分布式锁跨进程合并，
+跟随者轮询缓存直到领导者写入结果。
+锁的值是每个领导者独有的令牌：领导者执行期间定期续期，结束时只删除自己持有的锁，
+即使执行时间超过锁的过期时间也不会误删其他领导者的锁
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import settings
+from redis_pool import RedisPool, RedisUnavailable
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "singleflight:"
+# 锁仍由该令牌持有时才删除/续期（比较与操作在Redis中原子执行）
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """按键合并并发的异步调用"""
+
+    def __init__(self, redis: Optional[RedisPool] = None, lock_ttl: Optional[int] = None, poll_interval: float = 1.0):
+        """
+        Args:
+            redis: 可选的Redis连接池，用于跨进程合并（熔断期间退化为进程内合并）
+            lock_ttl: Redis锁过期时间（秒），领导者执行期间每 1/3 过期时间续期一次，崩溃后锁在该时间后失效
+            poll_interval: 跨进程等待时轮询缓存的间隔（秒）
+        """
+        self.redis = redis
+        self.lock_ttl = lock_ttl or settings.SINGLEFLIGHT_LOCK_TTL
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "leaders": 0,           # 实际执行上游调用的次数
+            "coalesced": 0,         # 合并到进程内进行中请求的次数
+            "remote_coalesced": 0,  # 通过Redis等待其他进程结果的次数
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 lookup: Optional[Callable[[], Awaitable[Optional[Any]]]] = None) -> Any:
+        """
+        执行 fn，若相同 key 的调用正在进行则等待其结果
+
+        Args:
+            key: 合并键（与缓存键相同）
+            fn: 实际执行上游调用的协程函数
+            lookup: 读取缓存的协程函数，跨进程等待时用于获取其他进程写入的结果
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            logger.info(f"合并进行中的请求: {key}")
+        else:
+            task = asyncio.ensure_future(self._lead(key, fn, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 单个调用方被取消（如客户端断开）不会中断共享的上游任务
+        return await asyncio.shield(task)
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]],
+                    lookup: Optional[Callable[[], Awaitable[Optional[Any]]]]) -> Any:
+        if self.redis is None or not self.redis.available or lookup is None:
+            self.stats["leaders"] += 1
+            return await fn()
+
+        lock_key = f"{LOCK_PREFIX}{key}"
+        while True:
+            token = uuid.uuid4().hex
+            if await self._acquire(lock_key, token):
+                renewal = asyncio.create_task(self._renew(lock_key, token))
+                try:
+                    self.stats["leaders"] += 1
+                    return await fn()
+                finally:
+                    renewal.cancel()
+                    await self._release(lock_key, token)
+
+            # 其他进程正在生成，等待其写入缓存或释放锁
+            self.stats["remote_coalesced"] += 1
+            logger.info(f"等待其他进程完成: {key}")
+            while await self._locked(lock_key):
+                await asyncio.sleep(self.poll_interval)
+                result = await lookup()
+                if result:
+                    return result
+            result = await lookup()
+            if result:
+                return result
+            # 领导者失败且未产生结果，重新竞争执行
+
+    async def _acquire(self, lock_key: str, token: str) -> bool:
+        try:
+            return bool(await self.redis.run(
+                lambda client: client.set(lock_key, token, nx=True, ex=self.lock_ttl)
+            ))
+        except RedisUnavailable as e:
+            logger.warning(f"获取合并锁失败: {e}，退化为进程内合并")
+            return True
+
+    async def _renew(self, lock_key: str, token: str):
+        """领导者执行期间定期续期；锁已过期并被其他进程取得时停止"""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                renewed = await self.redis.run(
+                    lambda client: client.eval(RENEW_SCRIPT, 1, lock_key, token, self.lock_ttl)
+                )
+            except RedisUnavailable as e:
+                logger.warning(f"合并锁续期失败: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"合并锁已失效: {lock_key}")
+                return
+
+    async def _release(self, lock_key: str, token: str):
+        try:
+            await self.redis.run(lambda client: client.eval(RELEASE_SCRIPT, 1, lock_key, token))
+        except RedisUnavailable as e:
+            logger.warning(f"释放合并锁失败: {e}")
+
+    async def _locked(self, lock_key: str) -> bool:
+        try:
+            return bool(await self.redis.run(lambda client: client.exists(lock_key)))
+        except RedisUnavailable:
+            return False
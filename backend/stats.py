@@ -0,0 +1,225 @@
+"""
+增量统计
+各工作进程把计数增量和耗时分布累积在内存中，按 STATS_FLUSH_INTERVAL 批量合并到 SQLite stats_counters 表
+（每个计数器一行，写入为 value = value + 增量），所有工作进程共享同一组计数；
+模型总数和质量分由 model_history 上的触发器维护。/api/stats 只读取这张行数固定的小表，
+耗时与历史记录数量无关
+
+耗时（以及下载速率）按阶段记录为直方图（固定分桶，每个桶一个计数器），分位数按桶内线性插值估算；
+/metrics 把同一组计数器按 Prometheus 文本格式输出，任意工作进程返回的都是全局数据
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import settings
+from database import add_stats_counters, get_stats_counters, drain_write_timings
+
+logger = logging.getLogger(__name__)
+
+# 耗时分桶上界（秒），覆盖从缓存查找到Meshy生成的范围
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 下载速率分桶上界（字节/秒）
+THROUGHPUT_BUCKETS = (1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+
+# 直方图种类 -> (分桶, 汇总时的单位后缀, 换算系数, Prometheus 单位)
+HISTOGRAMS = {
+    'latency': (LATENCY_BUCKETS, 'ms', 1000, 'seconds'),
+    'throughput': (THROUGHPUT_BUCKETS, 'mb_s', 1e-6, 'bytes_per_second'),
+}
+
+# 可增可减的计数（Prometheus gauge），其余都是只增不减的 counter
+GAUGE_GROUPS = ('history',)
+
+METRICS_NAMESPACE = 'ai3d'
+
+
+def _bucket_name(kind: str, stage: str, bound: Optional[float]) -> str:
+    return f"{kind}.{stage}.le_{'inf' if bound is None else format(bound, 'g')}"
+
+
+class StatsRecorder:
+    """累积计数增量和耗时直方图，定期写入共享的 stats_counters 表"""
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        self.flush_interval = flush_interval or settings.STATS_FLUSH_INTERVAL
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def incr(self, name: str, value: float = 1):
+        """计数器增加 value（只修改内存，不阻塞）"""
+        if not value:
+            return
+        with self._lock:
+            self._pending[name] = self._pending.get(name, 0) + value
+
+    def observe(self, stage: str, value: float, kind: str = 'latency'):
+        """记录一次观测值：kind 为 latency 时是耗时（秒），为 throughput 时是速率（字节/秒）"""
+        buckets = HISTOGRAMS[kind][0]
+        bound = next((b for b in buckets if value <= b), None)
+        with self._lock:
+            for name, delta in ((_bucket_name(kind, stage, bound), 1), (f"{kind}.{stage}.count", 1),
+                                (f"{kind}.{stage}.sum", value)):
+                self._pending[name] = self._pending.get(name, 0) + delta
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """记录代码块的耗时（异常退出时同样记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def flush(self) -> int:
+        """把累积的增量写入数据库（同步，在线程中调用），返回写入的计数器数；失败时增量保留到下次"""
+        self._collect_write_timings()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        if not add_stats_counters(pending):
+            with self._lock:
+                for name, value in pending.items():
+                    self._pending[name] = self._pending.get(name, 0) + value
+            return 0
+        return len(pending)
+
+    def snapshot(self) -> Dict[str, float]:
+        """所有进程已写入的计数加上本进程尚未写入的增量"""
+        self._collect_write_timings()
+        counters = get_stats_counters()
+        with self._lock:
+            for name, value in self._pending.items():
+                counters[name] = counters.get(name, 0) + value
+        return counters
+
+    def _collect_write_timings(self):
+        """把数据库写线程的耗时样本（排队、写锁等待、事务）计入直方图"""
+        for stage, samples in drain_write_timings().items():
+            for seconds in samples:
+                self.observe(stage, seconds)
+
+    def start(self):
+        """启动后台写入协程"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def stop(self):
+        """停止后台协程并写入剩余的增量"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"写入统计失败: {e}")
+
+
+def _split_counters(counters: Dict[str, float]) -> Tuple[Dict[str, float], Dict[Tuple[str, str], Dict]]:
+    """分出普通计数器和直方图：(名称 -> 值, (种类, 阶段) -> {buckets, count, sum})"""
+    plain: Dict[str, float] = {}
+    histograms: Dict[Tuple[str, str], Dict] = {}
+    for name, value in counters.items():
+        kind, _, rest = name.partition('.')
+        if kind not in HISTOGRAMS:
+            plain[name] = value
+        elif '.le_' in rest:
+            # 桶上界本身可能含小数点，例如 latency.download.le_0.5
+            stage, _, bound = rest.partition('.le_')
+            histograms.setdefault((kind, stage), {}).setdefault('buckets', {})[bound] = int(value)
+        else:
+            stage, _, field = rest.rpartition('.')
+            histograms.setdefault((kind, stage), {})[field] = value
+    return plain, histograms
+
+
+def _number(value: float):
+    return int(value) if float(value).is_integer() else value
+
+
+def summarize_counters(counters: Dict[str, float]) -> Dict[str, Dict]:
+    """
+    把扁平的计数器按前缀分组：generations.preview -> {"generations": {"preview": 1}}；
+    直方图汇总为次数、平均值和估算的分位数（耗时为毫秒，下载速率为MB/s）
+    """
+    plain, histograms = _split_counters(counters)
+    groups: Dict[str, Dict] = {kind: {} for kind in HISTOGRAMS}
+    for name, value in plain.items():
+        group, _, key = name.partition('.')
+        if key:
+            groups.setdefault(group, {})[key] = _number(value)
+        else:
+            groups[group] = _number(value)
+
+    for (kind, stage), histogram in sorted(histograms.items()):
+        count = int(histogram.get('count', 0))
+        if not count:
+            continue
+        bounds, unit, scale, _ = HISTOGRAMS[kind]
+        buckets = histogram.get('buckets', {})
+        summary = {'count': count, f'avg_{unit}': round(histogram.get('sum', 0) / count * scale, 2)}
+        for q in (0.50, 0.95, 0.99):
+            value = _quantile(bounds, buckets, count, q)
+            summary[f'p{int(q * 100)}_{unit}'] = None if value is None else round(value * scale, 2)
+        groups[kind][stage] = summary
+    return groups
+
+
+def _quantile(bounds: Tuple[float, ...], buckets: Dict[str, int], count: int, q: float) -> Optional[float]:
+    """按桶内线性插值估算分位数（与 Prometheus histogram_quantile 相同）；落在无上界的桶时返回None"""
+    target = q * count
+    seen, lower = 0, 0.0
+    for bound in bounds:
+        in_bucket = buckets.get(f"{bound:g}", 0)
+        if in_bucket and seen + in_bucket >= target:
+            return lower + (bound - lower) * (target - seen) / in_bucket
+        seen += in_bucket
+        lower = bound
+    return None
+
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join((METRICS_NAMESPACE,) + parts))
+
+
+def render_prometheus(counters: Dict[str, float]) -> str:
+    """按 Prometheus 文本格式（0.0.4）输出所有计数器和直方图"""
+    plain, histograms = _split_counters(counters)
+    lines = []
+    for name, value in sorted(plain.items()):
+        group, _, key = name.partition('.')
+        if group in GAUGE_GROUPS:
+            metric, metric_type = _metric_name(group, key), 'gauge'
+        else:
+            metric, metric_type = _metric_name(group, key, 'total'), 'counter'
+        lines += [f"# TYPE {metric} {metric_type}", f"{metric} {_number(value)}"]
+
+    for (kind, stage), histogram in sorted(histograms.items()):
+        bounds, _, _, unit = HISTOGRAMS[kind]
+        metric = _metric_name(stage, unit)
+        buckets = histogram.get('buckets', {})
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound in bounds:
+            cumulative += buckets.get(f"{bound:g}", 0)
+            lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {_number(histogram.get("count", 0))}')
+        lines.append(f"{metric}_sum {_number(histogram.get('sum', 0))}")
+        lines.append(f"{metric}_count {_number(histogram.get('count', 0))}")
+    return '\n'.join(lines) + '\n'
+
+
+# 创建全局统计实例
+stats_recorder = StatsRecorder()
@@ -0,0 +1,169 @@
+"""
+存储配额管理
+按分类（models / previews）统计内容寻址存储中引用的总大小，超出配额时
+按LRU或LFU顺序淘汰文件；固定的文件和被历史记录引用的文件不会被淘汰。
+大小和访问记录都保存在 models.db 中，淘汰时只查询索引，不扫描目录；
+每轮最多淘汰一批，仍超出配额时立即继续下一轮。
+多个工作进程中只有持有 storage_eviction 租约的进程执行淘汰，其他进程只写入访问记录
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import blob_store
+from config import settings
+from database import get_storage_usage, get_eviction_candidates, set_asset_pinned, acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+
+class StorageManager:
+    """后台按配额淘汰存储文件"""
+
+    def __init__(self, quotas: Optional[Dict[str, int]] = None, policy: Optional[str] = None,
+                 interval: Optional[float] = None, batch_size: Optional[int] = None,
+                 target_ratio: float = 0.9):
+        """
+        Args:
+            quotas: 分类 -> 配额字节数，0表示不限制
+            policy: 淘汰策略 lru / lfu
+            interval: 后台检查间隔（秒）
+            batch_size: 每轮每个分类最多淘汰的文件数
+            target_ratio: 超出配额后淘汰到配额的多少比例，避免在配额附近反复淘汰
+        """
+        self.quotas = quotas if quotas is not None else {
+            'models': settings.MODEL_STORAGE_QUOTA,
+            'previews': settings.PREVIEW_STORAGE_QUOTA,
+            'converted': settings.CONVERTED_STORAGE_QUOTA,
+        }
+        self.policy = policy or settings.STORAGE_EVICTION_POLICY
+        self.interval = interval or settings.STORAGE_EVICTION_INTERVAL
+        self.batch_size = batch_size or settings.STORAGE_EVICTION_BATCH
+        self.target_ratio = target_ratio
+        self._added: Dict[str, int] = {}  # 上一轮之后新增的字节数，用于提前触发淘汰
+        self._usage: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {
+            "passes": 0,
+            "evicted_refs": 0,
+            "freed_bytes": 0,    # 实际删除的文件大小（去重后的实体）
+            "last_pass_ms": 0.0,
+            "over_quota": [],    # 受保护文件已超出配额、无法继续淘汰的分类
+        }
+
+    def start(self):
+        """启动后台淘汰协程"""
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台协程，写入尚未保存的访问记录并释放淘汰租约"""
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+            await asyncio.to_thread(release_lease, 'storage_eviction')
+        await asyncio.to_thread(blob_store.flush_access)
+
+    def notify_added(self, ref: str, size: int):
+        """登记新写入的文件，预计超出配额时提前唤醒后台协程"""
+        category = ref.split('/', 1)[0]
+        quota = self.quotas.get(category)
+        if not quota:
+            return
+        self._added[category] = self._added.get(category, 0) + size
+        if self._usage.get(category, 0) + self._added[category] > quota and self._wakeup:
+            self._wakeup.set()
+
+    def pin(self, ref: str, pinned: bool = True) -> bool:
+        """固定或取消固定文件"""
+        return set_asset_pinned(ref, pinned)
+
+    def run_pass(self) -> bool:
+        """
+        执行一轮淘汰（同步，在线程中调用）
+
+        Returns:
+            是否仍有分类超出配额且还有可淘汰的文件
+        """
+        started = time.perf_counter()
+        blob_store.flush_access()
+        self._added = {}
+        usage = get_storage_usage()
+        self._usage = {category: info['bytes'] for category, info in usage.items()}
+
+        pending = False
+        over_quota = []
+        for category, quota in self.quotas.items():
+            used = self._usage.get(category, 0)
+            if not quota or used <= quota:
+                continue
+            remaining = self._evict(category, used, quota)
+            if remaining > quota:
+                if len(get_eviction_candidates(category, self.policy, limit=1)) > 0:
+                    pending = True
+                else:
+                    over_quota.append(category)
+                    logger.warning(f"{category} 受保护的文件已超出配额: {remaining} > {quota}")
+
+        self.stats["passes"] += 1
+        self.stats["over_quota"] = over_quota
+        self.stats["last_pass_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return pending
+
+    def _evict(self, category: str, used: int, quota: int) -> int:
+        """淘汰一批文件直到低于目标用量，返回淘汰后的用量"""
+        target = int(quota * self.target_ratio)
+        refs = []
+        for ref, size in get_eviction_candidates(category, self.policy, limit=self.batch_size):
+            if used <= target:
+                break
+            refs.append(ref)
+            used -= size
+        if not refs:
+            return used
+
+        orphans = blob_store.release_many(refs)
+        freed = sum(orphan['size'] for orphan in orphans)
+        self.stats["evicted_refs"] += len(refs)
+        self.stats["freed_bytes"] += freed
+        self._usage[category] = used
+        logger.info(f"淘汰 {category} 文件 {len(refs)} 个，释放 {freed} 字节")
+        return used
+
+    def get_status(self) -> Dict:
+        """各分类的用量、配额及淘汰统计"""
+        usage = get_storage_usage()
+        categories = {}
+        for category in set(usage) | set(self.quotas):
+            info = usage.get(category, {'refs': 0, 'bytes': 0, 'protected_bytes': 0})
+            categories[category] = dict(info, quota=self.quotas.get(category, 0))
+        return {"policy": self.policy, "categories": categories, "eviction": self.stats}
+
+    async def _run(self):
+        while True:
+            try:
+                if await asyncio.to_thread(acquire_lease, 'storage_eviction', self.interval * 3):
+                    pending = await asyncio.to_thread(self.run_pass)
+                else:
+                    await asyncio.to_thread(blob_store.flush_access)
+                    pending = False
+            except Exception as e:
+                logger.error(f"存储淘汰失败: {e}")
+                pending = False
+            if pending:
+                # 还有超出配额的部分，让出事件循环后继续下一批
+                await asyncio.sleep(0)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# 创建全局存储管理器实例
+storage_manager = StorageManager()
@@ -0,0 +1,206 @@
+"""
+Meshy任务状态的共享轮询器
+所有等待中的Meshy任务由同一个后台协程统一轮询：任务刚创建时快速查询，
+之后根据进度估算剩余时间逐步退避（带随机抖动），遇到429限流时整体暂停，
+任务结束后通过 future 唤醒等待的协程
+"""
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+SUCCESS_STATUSES = ('SUCCEEDED',)
+FAILURE_STATUSES = ('FAILED', 'CANCELED', 'EXPIRED')
+
+
+class RateLimitError(Exception):
+    """上游返回429时抛出，retry_after 为建议的等待秒数"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Watch:
+    """单个被跟踪任务的轮询状态"""
+
+    __slots__ = ('task_id', 'futures', 'callbacks', 'started', 'next_poll', 'polls', 'errors')
+
+    def __init__(self, task_id: str, now: float):
+        self.task_id = task_id
+        self.futures: List[asyncio.Future] = []
+        self.callbacks: List[ProgressCallback] = []
+        self.started = now
+        self.next_poll = now
+        self.polls = 0
+        self.errors = 0
+
+
+class TaskPoller:
+    """统一轮询所有未完成的Meshy任务"""
+
+    def __init__(self, fetch_status: Callable[[str], Awaitable[Dict[str, Any]]],
+                 min_interval: float = 1.0, max_interval: float = 10.0,
+                 max_concurrency: int = 10, jitter: float = 0.2, eta_fraction: float = 0.75):
+        """
+        Args:
+            fetch_status: 查询单个任务状态的协程函数
+            min_interval: 最短轮询间隔（秒），用于刚创建和即将完成的任务
+            max_interval: 最长轮询间隔（秒）
+            max_concurrency: 每轮最多同时发出的状态查询数
+            jitter: 间隔的随机抖动比例，避免大量任务同时到期
+            eta_fraction: 下一次轮询安排在预计剩余时间的多少比例处
+        """
+        self.fetch_status = fetch_status
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.eta_fraction = eta_fraction
+        self._watches: Dict[str, _Watch] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.stats = {"polls": 0, "errors": 0, "rate_limited": 0, "succeeded": 0, "failed": 0}
+
+    @property
+    def outstanding(self) -> int:
+        """当前跟踪中的任务数"""
+        return len(self._watches)
+
+    async def wait(self, task_id: str, timeout: float = 300,
+                   on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        等待任务完成并返回任务信息；同一任务的多个等待者共享一次轮询
+
+        Raises:
+            Exception: 任务失败或超时
+        """
+        loop = asyncio.get_running_loop()
+        watch = self._watches.get(task_id)
+        if watch is None:
+            # 刚创建的任务不会立即完成，首次查询安排在最短间隔之后
+            watch = _Watch(task_id, loop.time())
+            watch.next_poll += self.min_interval
+            self._watches[task_id] = watch
+        future = loop.create_future()
+        watch.futures.append(future)
+        if on_progress:
+            watch.callbacks.append(on_progress)
+        self._ensure_running()
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"任务超时: {task_id}")
+        finally:
+            if future in watch.futures:
+                watch.futures.remove(future)
+            if on_progress in watch.callbacks:
+                watch.callbacks.remove(on_progress)
+            if not watch.futures and self._watches.get(task_id) is watch:
+                del self._watches[task_id]
+
+    def _ensure_running(self):
+        if self._wakeup is None or self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._watches:
+            now = loop.time()
+            due_at = max(self._paused_until, min(w.next_poll for w in self._watches.values()))
+            if due_at > now:
+                # 睡到最早到期的任务；有新任务加入时提前唤醒
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = sorted(
+                (w for w in self._watches.values() if w.next_poll <= now),
+                key=lambda w: w.next_poll
+            )[:self.max_concurrency]
+            await asyncio.gather(*(self._poll(w) for w in due))
+
+    async def _poll(self, watch: _Watch):
+        loop = asyncio.get_running_loop()
+        try:
+            task_info = await self.fetch_status(watch.task_id)
+        except RateLimitError as e:
+            self.stats["rate_limited"] += 1
+            delay = e.retry_after if e.retry_after is not None else self.max_interval
+            self._paused_until = max(self._paused_until, loop.time() + delay)
+            logger.warning(f"Meshy限流，暂停轮询 {delay:.1f}s")
+            return
+        except Exception as e:
+            self.stats["errors"] += 1
+            watch.errors += 1
+            watch.next_poll = loop.time() + self._jittered(
+                min(self.max_interval, self.min_interval * 2 ** watch.errors)
+            )
+            logger.error(f"检查任务状态时出错: {e}")
+            return
+
+        self.stats["polls"] += 1
+        watch.polls += 1
+        watch.errors = 0
+        status = task_info.get('status')
+        logger.info(f"任务 {watch.task_id} 状态: {status}")
+
+        for callback in list(watch.callbacks):
+            try:
+                await callback(task_info)
+            except Exception as e:
+                logger.warning(f"任务进度回调出错: {e}")
+
+        if status in SUCCESS_STATUSES:
+            self.stats["succeeded"] += 1
+            logger.info(f"任务 {watch.task_id} 完成成功")
+            self._finish(watch, result=task_info)
+        elif status in FAILURE_STATUSES:
+            self.stats["failed"] += 1
+            error_msg = task_info.get('task_error') or task_info.get('error') or '未知错误'
+            logger.error(f"任务 {watch.task_id} 失败: {error_msg}")
+            self._finish(watch, error=Exception(f"任务失败: {error_msg}"))
+        else:
+            if status not in ('PENDING', 'IN_PROGRESS'):
+                logger.warning(f"任务 {watch.task_id} 状态未知: {status}")
+            now = loop.time()
+            watch.next_poll = now + self._next_interval(watch, task_info, now)
+
+    def _next_interval(self, watch: _Watch, task_info: Dict[str, Any], now: float) -> float:
+        """根据进度估算剩余时间，计算下一次轮询间隔"""
+        elapsed = now - watch.started
+        progress = task_info.get('progress') or 0
+        if 0 < progress < 100:
+            # 按已用时间和进度线性估算剩余时间，越接近完成轮询越密
+            eta = elapsed * (100 - progress) / progress
+            interval = eta * self.eta_fraction
+        else:
+            # 尚无进度信息：从最短间隔开始指数退避
+            interval = self.min_interval * 1.5 ** watch.polls
+        return self._jittered(min(self.max_interval, max(self.min_interval, interval)))
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _finish(self, watch: _Watch, result: Optional[Dict[str, Any]] = None,
+                error: Optional[Exception] = None):
+        if self._watches.get(watch.task_id) is watch:
+            del self._watches[watch.task_id]
+        for future in watch.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,352 @@
+"""
+模型缩略图渲染
+不依赖GPU和OpenGL：用NumPy向量化的软件光栅化器在共享进程池中渲染已存储的GLB/OBJ模型，
+一次渲染生成 THUMBNAIL_SIZES 中的所有尺寸（JPEG）：
+- 固定的斜上方视角、正交投影，按包围球缩放使模型居中充满画面
+- 三角形按包围盒大小分组，每组一次性生成所有候选像素并计算重心坐标，深度缓冲逐组合并
+- 颜色取纹理（按插值后的UV采样）、顶点颜色或材质颜色，插值法线做双面漫反射光照
+- 按最大尺寸的 SUPERSAMPLE 倍渲染后缩小，得到抗锯齿的边缘
+结果以 previews/render_<模型内容SHA-256>_<尺寸>.jpg 存入内容寻址存储（内容相同的模型共享），
+同一模型的并发渲染请求通过 single-flight 合并。
+Meshy未返回缩略图或下载失败、以及模拟生成时，用渲染结果作为预览图
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import blob_store
+from config import settings
+from file_manager import STAGING_DIR, STORAGE_BASE, get_physical_path
+from model_processing import FILES_URL_PREFIX
+from process_pool import run_in_process
+from redis_pool import redis_pool
+from singleflight import SingleFlight
+from stats import stats_recorder
+from storage_manager import storage_manager
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 视角：绕Y轴旋转（偏航）和向下俯视的角度（度）
+VIEW_YAW = 35.0
+VIEW_PITCH = 25.0
+# 模型包围球占画面的比例
+FILL_RATIO = 0.9
+# 渲染分辨率相对最大输出尺寸的倍数（抗锯齿）
+SUPERSAMPLE = 2
+# 每批光栅化的候选像素数上限（控制内存占用）
+CHUNK_PIXELS = 1 << 22
+# 环境光比例与光源方向（观察空间，来自观察者左上方）
+AMBIENT = 0.35
+LIGHT_DIRECTION = np.array([-0.4, 0.6, 1.0]) / np.linalg.norm([-0.4, 0.6, 1.0])
+BACKGROUND = (245, 245, 245)
+DEFAULT_COLOR = (180, 180, 185)
+JPEG_QUALITY = 85
+
+
+def parse_sizes(value: str) -> List[int]:
+    """解析 THUMBNAIL_SIZES（逗号分隔的边长，像素），从大到小"""
+    sizes = sorted({int(item) for item in value.split(',') if item.strip()}, reverse=True)
+    if not sizes or any(size <= 0 for size in sizes):
+        raise ValueError(f"THUMBNAIL_SIZES 需为正整数: {value}")
+    return sizes
+
+
+def thumbnail_ref(sha256: str, size: int) -> str:
+    return f"previews/render_{sha256}_{size}.jpg"
+
+
+def _rotation() -> np.ndarray:
+    yaw, pitch = np.radians(VIEW_YAW), np.radians(VIEW_PITCH)
+    around_y = np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]])
+    around_x = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
+    return around_x @ around_y
+
+
+def _base_color(material, textured: bool) -> np.ndarray:
+    """材质的基础颜色（RGB，0~1）；未设置时有纹理取白色（不改变纹理颜色），否则取默认颜色"""
+    for attribute in ('baseColorFactor', 'diffuse'):
+        color = getattr(material, attribute, None) if material is not None else None
+        if color is not None:
+            color = np.asarray(color, dtype=np.float64)[:3]
+            return color / 255.0 if color.max() > 1 else color
+    return np.ones(3) if textured else np.array(DEFAULT_COLOR) / 255.0
+
+
+def _vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """面积加权的顶点法线（不依赖scipy）"""
+    corners = vertices[faces]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    indices = faces.reshape(-1)
+    normals = np.stack([np.bincount(indices, weights=np.repeat(face_normals[:, axis], 3), minlength=len(vertices))
+                        for axis in range(3)], axis=1)
+    return normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+
+def _load_scene(path: str, file_type: Optional[str]) -> List[Dict]:
+    """读取所有三角网格（应用节点变换），返回每个网格的顶点、面、法线和着色信息"""
+    import trimesh
+    from PIL import Image
+
+    scene = trimesh.load(path, file_type=file_type, force='scene', process=False)
+    meshes = []
+    for node in scene.graph.nodes_geometry:
+        transform, name = scene.graph[node]
+        mesh = scene.geometry[name]
+        if not isinstance(mesh, trimesh.Trimesh) or not len(mesh.faces):
+            continue
+        vertices = np.asarray(mesh.vertices, dtype=np.float64) @ transform[:3, :3].T + transform[:3, 3]
+        faces = np.asarray(mesh.faces, dtype=np.int64)
+        entry = {
+            'vertices': vertices,
+            'faces': faces,
+            'normals': _vertex_normals(vertices, faces),
+            'color': np.array(DEFAULT_COLOR) / 255.0,
+        }
+        visual = mesh.visual
+        if visual.kind == 'texture':
+            material = visual.material
+            image = getattr(material, 'baseColorTexture', None) or getattr(material, 'image', None)
+            textured = isinstance(image, Image.Image) and getattr(visual, 'uv', None) is not None
+            entry['color'] = _base_color(material, textured)
+            if textured:
+                entry['texture'] = np.asarray(image.convert('RGB'), dtype=np.float32) / 255.0
+                entry['uv'] = np.asarray(visual.uv, dtype=np.float64)
+        elif visual.kind == 'vertex':
+            entry['vertex_colors'] = np.asarray(visual.vertex_colors[:, :3], dtype=np.float32) / 255.0
+        elif visual.kind == 'face':
+            entry['color'] = np.asarray(visual.face_colors[:, :3], dtype=np.float64).mean(axis=0) / 255.0
+        meshes.append(entry)
+    if not meshes:
+        raise ValueError("模型中没有三角网格")
+    return meshes
+
+
+def rasterize(screen: np.ndarray, faces: np.ndarray, width: int,
+              height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    深度缓冲光栅化（深度值越大越靠近观察者）
+
+    Args:
+        screen: 顶点的屏幕坐标 (x, y, 深度)，x/y 以像素为单位
+        faces: 三角形顶点索引
+
+    Returns:
+        (每个像素的面编号（-1为背景）, 每个像素的重心坐标)
+    """
+    face_ids = np.full(width * height, -1, dtype=np.int64)
+    barycentric = np.zeros((width * height, 3), dtype=np.float64)
+    depth_buffer = np.full(width * height, -np.inf)
+
+    triangles = screen[faces]
+    low = np.floor(triangles[:, :, :2].min(axis=1)).astype(np.int64)
+    high = np.floor(triangles[:, :, :2].max(axis=1)).astype(np.int64)
+    x0, y0 = triangles[:, 0, 0], triangles[:, 0, 1]
+    area = (triangles[:, 1, 0] - x0) * (triangles[:, 2, 1] - y0) - (triangles[:, 2, 0] - x0) * (triangles[:, 1, 1] - y0)
+    visible = ((high[:, 0] >= 0) & (high[:, 1] >= 0) & (low[:, 0] < width) & (low[:, 1] < height)
+               & (np.abs(area) > 1e-12))
+    low = np.maximum(low, 0)
+    high = np.minimum(high, [width - 1, height - 1])
+    sizes = high - low + 1
+
+    # 按包围盒的宽高分组，同组三角形使用相同大小的候选像素网格
+    candidates = np.nonzero(visible)[0]
+    shapes, group_of = np.unique(sizes[candidates, 0] * (height + 1) + sizes[candidates, 1], return_inverse=True)
+    order = np.argsort(group_of.reshape(-1), kind='stable')
+    bounds = np.searchsorted(group_of.reshape(-1)[order], np.arange(len(shapes) + 1))
+    for index, shape in enumerate(shapes):
+        group = candidates[order[bounds[index]:bounds[index + 1]]]
+        box_width, box_height = divmod(int(shape), height + 1)
+        offset_x, offset_y = [axis.reshape(-1) for axis in np.meshgrid(np.arange(box_width), np.arange(box_height))]
+        step = max(1, CHUNK_PIXELS // (box_width * box_height))
+        for start in range(0, len(group), step):
+            chunk = group[start:start + step]
+            px = low[chunk, 0, None] + offset_x
+            py = low[chunk, 1, None] + offset_y
+            tri = triangles[chunk]
+            cx, cy = px + 0.5, py + 0.5
+            # 边函数得到重心坐标
+            w1 = ((cx - tri[:, 0, None, 0]) * (tri[:, 2, None, 1] - tri[:, 0, None, 1])
+                  - (cy - tri[:, 0, None, 1]) * (tri[:, 2, None, 0] - tri[:, 0, None, 0])) / area[chunk, None]
+            w2 = ((cy - tri[:, 0, None, 1]) * (tri[:, 1, None, 0] - tri[:, 0, None, 0])
+                  - (cx - tri[:, 0, None, 0]) * (tri[:, 1, None, 1] - tri[:, 0, None, 1])) / area[chunk, None]
+            w0 = 1 - w1 - w2
+            rows, columns = np.nonzero((w0 >= 0) & (w1 >= 0) & (w2 >= 0))
+            if not len(rows):
+                continue
+            weights = np.stack([w0[rows, columns], w1[rows, columns], w2[rows, columns]], axis=1)
+            depth = (weights * tri[rows, :, 2]).sum(axis=1)
+            pixels = py[rows, columns] * width + px[rows, columns]
+            # 同一批中每个像素只保留最近的候选，再与深度缓冲比较
+            nearest = np.lexsort((-depth, pixels))
+            pixels, depth, weights, rows = pixels[nearest], depth[nearest], weights[nearest], rows[nearest]
+            first = np.r_[True, pixels[1:] != pixels[:-1]]
+            pixels, depth, weights, rows = pixels[first], depth[first], weights[first], rows[first]
+            closer = depth > depth_buffer[pixels]
+            pixels = pixels[closer]
+            depth_buffer[pixels] = depth[closer]
+            face_ids[pixels] = chunk[rows[closer]]
+            barycentric[pixels] = weights[closer]
+    return face_ids, barycentric
+
+
+def _shade(meshes: List[Dict], face_ids: np.ndarray, barycentric: np.ndarray,
+           face_offsets: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+    """计算被覆盖像素的颜色（RGB，0~1）"""
+    covered = np.nonzero(face_ids >= 0)[0]
+    colors = np.zeros((len(face_ids), 3), dtype=np.float32)
+    owner = np.searchsorted(face_offsets, face_ids[covered], side='right') - 1
+    for index, mesh in enumerate(meshes):
+        pixels = covered[owner == index]
+        if not len(pixels):
+            continue
+        corners = mesh['faces'][face_ids[pixels] - face_offsets[index]]
+        weights = barycentric[pixels][:, :, None]
+        normals = (mesh['normals'][corners] * weights).sum(axis=1) @ rotation.T
+        normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+        # 双面光照：不依赖法线朝向是否一致
+        light = AMBIENT + (1 - AMBIENT) * np.abs(normals @ LIGHT_DIRECTION)
+        if 'texture' in mesh:
+            texture = mesh['texture']
+            uv = (mesh['uv'][corners] * weights).sum(axis=1) % 1.0
+            columns = (uv[:, 0] * (texture.shape[1] - 1)).astype(np.int64)
+            rows = ((1 - uv[:, 1]) * (texture.shape[0] - 1)).astype(np.int64)
+            base = texture[rows, columns] * mesh['color']
+        elif 'vertex_colors' in mesh:
+            base = (mesh['vertex_colors'][corners] * weights).sum(axis=1)
+        else:
+            base = np.broadcast_to(mesh['color'], (len(pixels), 3))
+        colors[pixels] = base * light[:, None]
+    return colors
+
+
+def render_thumbnails(source_path: str, file_type: Optional[str], output_prefix: str,
+                      sizes: Sequence[int]) -> List[Dict]:
+    """
+    渲染模型并写入各尺寸的缩略图（同步，在进程池中执行），尺寸 s 写入 <output_prefix>_<s>.jpg
+
+    Returns:
+        各尺寸的 {size, path, bytes}
+    """
+    from PIL import Image
+
+    meshes = _load_scene(source_path, file_type or os.path.splitext(source_path)[1][1:])
+    rotation = _rotation()
+    vertices = np.concatenate([mesh['vertices'] for mesh in meshes]) @ rotation.T
+    face_offsets = np.cumsum([0] + [len(mesh['faces']) for mesh in meshes[:-1]])
+    vertex_offsets = np.cumsum([0] + [len(mesh['vertices']) for mesh in meshes[:-1]])
+    faces = np.concatenate([mesh['faces'] + offset for mesh, offset in zip(meshes, vertex_offsets)])
+
+    # 正交投影：包围球中心对准画面中心，屏幕y轴向下
+    resolution = max(sizes) * SUPERSAMPLE
+    center = (vertices.max(axis=0) + vertices.min(axis=0)) / 2
+    radius = float(np.linalg.norm(vertices - center, axis=1).max()) or 1.0
+    scale = resolution * FILL_RATIO / (2 * radius)
+    screen = np.empty_like(vertices)
+    screen[:, 0] = (vertices[:, 0] - center[0]) * scale + resolution / 2
+    screen[:, 1] = (center[1] - vertices[:, 1]) * scale + resolution / 2
+    screen[:, 2] = vertices[:, 2]
+
+    face_ids, barycentric = rasterize(screen, faces, resolution, resolution)
+    colors = _shade(meshes, face_ids, barycentric, face_offsets, rotation)
+    background = np.array(BACKGROUND, dtype=np.float32) / 255.0
+    colors[face_ids < 0] = background
+    image = Image.fromarray((np.clip(colors, 0, 1) * 255 + 0.5).astype(np.uint8).reshape(resolution, resolution, 3))
+
+    results = []
+    for size in sizes:
+        path = f"{output_prefix}_{size}.jpg"
+        image.resize((size, size), Image.LANCZOS).save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        results.append({'size': size, 'path': path, 'bytes': os.path.getsize(path)})
+    return results
+
+
+class ThumbnailRenderer:
+    """按需渲染并缓存模型缩略图"""
+
+    def __init__(self, sizes: Optional[Sequence[int]] = None):
+        self.sizes = list(sizes) if sizes is not None else parse_sizes(settings.THUMBNAIL_SIZES)
+        self.flight = SingleFlight(redis_pool, poll_interval=0.2)
+
+    def _cached(self, refs: Dict[int, str]) -> Optional[Dict[int, str]]:
+        return refs if all(blob_store.resolve(ref) for ref in refs.values()) else None
+
+    async def render(self, source_path: str, file_type: str) -> Dict[int, str]:
+        """
+        返回模型各尺寸缩略图的逻辑路径，尚未渲染时渲染并存入内容寻址存储
+
+        Args:
+            source_path: 模型文件的实际路径
+            file_type: glb / obj 等
+        """
+        if source_path.startswith(blob_store.BLOBS_DIR + os.sep):
+            sha256 = os.path.basename(source_path)
+        else:
+            # 旧版直接存放在目录中的文件
+            sha256 = await asyncio.to_thread(blob_store.hash_file, source_path)
+        refs = {size: thumbnail_ref(sha256, size) for size in self.sizes}
+        if await asyncio.to_thread(self._cached, refs):
+            stats_recorder.incr("thumbnails.cache_hits")
+            return refs
+        return await self.flight.do(
+            f"thumbnail:{sha256}",
+            lambda: self._render(source_path, file_type, refs),
+            lambda: asyncio.to_thread(self._cached, refs)
+        )
+
+    async def _render(self, source_path: str, file_type: str, refs: Dict[int, str]) -> Dict[int, str]:
+        # 等待锁期间其他工作进程可能已经完成渲染
+        if await asyncio.to_thread(self._cached, refs):
+            stats_recorder.incr("thumbnails.cache_hits")
+            return refs
+        stats_recorder.incr("thumbnails.misses")
+        output_prefix = os.path.join(STAGING_DIR, f"thumbnail_{uuid.uuid4().hex}")
+        try:
+            with stats_recorder.timer("thumbnail_render"), span("model.thumbnail", format=file_type):
+                results = await run_in_process(render_thumbnails, source_path, file_type, output_prefix, self.sizes)
+            for result in results:
+                ref = refs[result['size']]
+                await asyncio.to_thread(blob_store.ingest_file, result['path'], ref)
+                storage_manager.notify_added(ref, result['bytes'])
+        finally:
+            for size in self.sizes:
+                path = f"{output_prefix}_{size}.jpg"
+                if os.path.exists(path):
+                    os.remove(path)
+        stats_recorder.incr("thumbnails.rendered")
+        logger.info(f"缩略图渲染完成 {source_path}: " + ', '.join(
+            f"{result['size']}px/{result['bytes']}字节" for result in results))
+        return refs
+
+    async def preview_url(self, model_url: Optional[str], path: Optional[str] = None) -> Optional[str]:
+        """
+        渲染模型并返回最大尺寸缩略图的地址，用作预览图
+
+        Args:
+            model_url: 模型的 /api/files/ 地址，用于定位文件和判断格式
+            path: 直接指定文件（不在本地存储中的模型）
+
+        Returns:
+            /api/files/ 地址；模型不在本地或无法渲染时为None
+        """
+        if not path and model_url and model_url.startswith(FILES_URL_PREFIX):
+            ref = model_url[len(FILES_URL_PREFIX):].split('?', 1)[0]
+            path = get_physical_path(os.path.join(STORAGE_BASE, ref))
+        if not path:
+            return None
+        file_type = os.path.splitext((model_url or path).split('?', 1)[0])[1][1:].lower()
+        try:
+            refs = await self.render(path, file_type)
+        except Exception as e:
+            stats_recorder.incr("thumbnails.failed")
+            logger.warning(f"缩略图渲染失败 {model_url or path}: {e}")
+            return None
+        return f"{FILES_URL_PREFIX}{refs[self.sizes[0]]}"
+
+
+# 创建全局缩略图渲染实例
+thumbnail_renderer = ThumbnailRenderer()
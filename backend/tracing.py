@@ -0,0 +1,97 @@
+"""
+可选的 OpenTelemetry 链路追踪
+TRACING_EXPORTER 为空时不追踪，span() 几乎没有开销；安装了 opentelemetry-sdk 时支持：
+- console：每个span结束时以JSON输出到标准输出
+- file：以JSON追加写入 TRACING_FILE（每个工作进程写入各自的 <文件名>.<进程号>）
+- otlp：发送到 OTLP 收集器（需安装 opentelemetry-exporter-otlp-proto-http，地址由 OTEL_EXPORTER_OTLP_ENDPOINT 指定）
+console 和 file 不依赖收集器，可离线查看各阶段耗时
+"""
+import importlib.util
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:  # 父包未安装
+        return False
+
+
+OTEL_AVAILABLE = _installed("opentelemetry.sdk")
+
+_tracer = None
+_provider = None
+_output = None
+
+
+def setup_tracing(exporter: Optional[str] = None) -> bool:
+    """按配置初始化追踪（每个工作进程启动时调用），返回是否启用"""
+    global _tracer, _provider, _output
+    exporter = (settings.TRACING_EXPORTER if exporter is None else exporter).lower()
+    if not exporter or _provider is not None:
+        return _provider is not None
+    if not OTEL_AVAILABLE:
+        logger.warning(f"TRACING_EXPORTER={exporter} 需要安装 opentelemetry-sdk，已关闭链路追踪")
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exporter == "console":
+        span_exporter = ConsoleSpanExporter()
+    elif exporter == "file":
+        path = f"{settings.TRACING_FILE}.{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _output = open(path, "a", encoding="utf-8")
+        span_exporter = ConsoleSpanExporter(out=_output)
+    elif exporter == "otlp":
+        if not _installed("opentelemetry.exporter.otlp.proto.http"):
+            logger.warning("TRACING_EXPORTER=otlp 需要安装 opentelemetry-exporter-otlp-proto-http，已关闭链路追踪")
+            return False
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        span_exporter = OTLPSpanExporter()
+    else:
+        logger.warning(f"未知的 TRACING_EXPORTER: {exporter}，已关闭链路追踪")
+        return False
+
+    _provider = TracerProvider(resource=Resource.create({
+        "service.name": settings.TRACING_SERVICE_NAME,
+        "process.pid": os.getpid(),
+    }))
+    _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    # 不设置为全局 TracerProvider，避免影响其他库
+    _tracer = _provider.get_tracer(__name__)
+    logger.info(f"链路追踪已启用: {exporter}")
+    return True
+
+
+def shutdown_tracing():
+    """导出尚未发送的span并关闭"""
+    global _tracer, _provider, _output
+    if _provider is not None:
+        _provider.shutdown()
+    if _output is not None:
+        _output.close()
+    _tracer = _provider = _output = None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    在当前上下文中创建子span（未启用追踪时返回None）；
+    值为None的属性会被忽略，异常会记录到span并继续抛出
+    """
+    if _tracer is None:
+        yield None
+        return
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
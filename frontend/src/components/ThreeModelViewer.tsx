@@ -170,13 +170,21 @@ const ThreeModelViewer: React.FC<ThreeModelViewerProps> = ({ modelUrl, className
     }
   }
 
+  // 本地存储的模型声明支持顶点量化（GLTFLoader 支持 KHR_mesh_quantization），后端据此返回体积更小的优化版本
+  const withGLTFExtensions = (url: string) => {
+    if (!url.includes('/api/files/') && !url.includes('/api/models/')) {
+      return url
+    }
+    return `${url}${url.includes('?') ? '&' : '?'}extensions=KHR_mesh_quantization`
+  }
+
   // 加载GLB模型
   const loadGLBModel = async (url: string) => {
     const loader = new GLTFLoader()
     
     return new Promise<void>((resolve, reject) => {
       loader.load(
-        url,
+        withGLTFExtensions(url),
         (gltf) => {
           // 移除旧模型
           if (modelRef.current && sceneRef.current) {